@@ -0,0 +1,213 @@
+import argparse
+import datetime
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Advisory Thresholds
+# -----------------------------
+# Simplified crop water requirement factors (mm/week)
+CROP_WATER_REQUIREMENT = {
+    "Wheat": 35,
+    "Rice": 50,
+    "Cotton": 40,
+    "Sugarcane": 55
+}
+
+# Threshold for flood risk (you can tune this value)
+FLOOD_THRESHOLD = 70  # mm in 7 days
+FLOOD_WATCH_FRACTION = 0.5  # above half the threshold -> "Moderate"
+
+HEAT_STRESS_TEMP = 40  # °C daily max
+SEVERE_HEAT_TEMP = 45
+
+SOWING_WINDOWS = {
+    "Wheat": [11, 12],       # Nov-Dec
+    "Rice": [6, 7],          # Jun-Jul
+    "Cotton": [4, 5],        # Apr-May
+    "Sugarcane": [2, 3]      # Feb-Mar
+}
+
+# Forecast variables stacked along the last axis of the advisory array
+VARIABLES = ["temperature_2m_max", "temperature_2m_min", "precipitation_sum"]
+TMAX, TMIN, RAIN = range(len(VARIABLES))
+
+
+# -----------------------------
+# Forecast Array
+# -----------------------------
+def forecast_array(forecasts, days=7):
+    """
+    Stack {district: open-meteo response} into a (districts × days × variables)
+    float array. Missing districts or values are NaN.
+    """
+    names = list(forecasts)
+    arr = np.full((len(names), days, len(VARIABLES)), np.nan)
+    for i, name in enumerate(names):
+        daily = (forecasts[name] or {}).get("daily", {})
+        for v, var in enumerate(VARIABLES):
+            values = np.asarray(daily.get(var) or [], dtype=float)[:days]
+            arr[i, :len(values), v] = values
+    return names, arr
+
+
+# -----------------------------
+# Vectorized Advisory Engine
+# -----------------------------
+def advisory_table(names, arr, crop_need=CROP_WATER_REQUIREMENT, flood_threshold=FLOOD_THRESHOLD,
+                   rows=None):
+    """
+    Irrigation deficit, flood risk and heat stress for every district × crop
+    in one pass over the forecast array. Returns a tidy DataFrame; with
+    `rows` (the gdf row of each district) it carries a "Row" column too.
+    """
+    total_rain = np.nansum(arr[:, :, RAIN], axis=1)                    # (D,)
+    has_data = ~np.all(np.isnan(arr[:, :, RAIN]), axis=1)
+    with warnings.catch_warnings():   # all-NaN rows are dropped below
+        warnings.simplefilter("ignore", RuntimeWarning)
+        avg_temp = np.nanmean(arr[:, :, TMAX], axis=1)
+        max_temp = np.nanmax(arr[:, :, TMAX], axis=1)
+    heat_days = np.sum(arr[:, :, TMAX] >= HEAT_STRESS_TEMP, axis=1)
+
+    flood_risk = np.select(
+        [total_rain > flood_threshold, total_rain > flood_threshold * FLOOD_WATCH_FRACTION],
+        ["High", "Moderate"], "Low",
+    )
+    heat_stress = np.select(
+        [max_temp >= SEVERE_HEAT_TEMP, max_temp >= HEAT_STRESS_TEMP],
+        ["Severe", "Moderate"], "None",
+    )
+
+    crops = list(crop_need)
+    need = np.array([crop_need[c] for c in crops], dtype=float)      # (C,)
+    deficit = np.clip(need[None, :] - total_rain[:, None], 0, None)   # (D, C)
+
+    n_d, n_c = len(names), len(crops)
+    df = pd.DataFrame({
+        "District": np.repeat(np.asarray(names, dtype=object), n_c),
+        "Crop": np.tile(np.asarray(crops, dtype=object), n_d),
+        "Rain 7d (mm)": np.repeat(total_rain, n_c),
+        "Crop Need (mm)": np.tile(need, n_d),
+        "Irrigation Deficit (mm)": deficit.ravel(),
+        "Irrigation Needed": deficit.ravel() > 0,
+        "Avg Temp Max (°C)": np.repeat(avg_temp, n_c),
+        "Max Temp (°C)": np.repeat(max_temp, n_c),
+        "Heat Days": np.repeat(heat_days, n_c),
+        "Heat Stress": np.repeat(heat_stress, n_c),
+        "Flood Risk": np.repeat(flood_risk, n_c),
+    })
+    if rows is not None:
+        df.insert(1, "Row", np.repeat(np.asarray(rows, dtype=int), n_c))
+    return df[np.repeat(has_data, n_c)].reset_index(drop=True)
+
+
+def apply_grid_flood_risk(table, flood_df):
+    """
+    Replace the point-based Flood Risk with the gridded one where a district
+    has it, matched on "Row" when both tables have it (names can repeat).
+    """
+    if flood_df is None or flood_df.empty or table.empty:
+        return table
+    on = "Row" if "Row" in table and "Row" in flood_df else "District"
+    grid = flood_df.set_index(on)
+    table = table.copy()
+    table["Flood Risk"] = table[on].map(grid["Flood Risk"]).fillna(table["Flood Risk"])
+    table["Flood Score"] = table[on].map(grid["Flood Score"])
+    return table
+
+
+def sowing_status(crop, today=None):
+    """Whether `crop` is in its sowing window this month, and when the next window opens."""
+    today = today or datetime.date.today()
+    months = SOWING_WINDOWS[crop]
+    status = {"crop": crop, "window": months, "in_season": today.month in months}
+    if not status["in_season"]:
+        later = [m for m in months if m > today.month]
+        status["next_month"] = later[0] if later else months[0]
+        status["next_year"] = today.year if later else today.year + 1
+    return status
+
+
+FLOOD_RANK = {"High": 2, "Moderate": 1, "Low": 0}
+HEAT_RANK = {"Severe": 2, "Moderate": 1, "None": 0}
+
+
+def ranked_alerts(table, crop):
+    """Province-wide view for one crop, most urgent districts first."""
+    df = table[table["Crop"] == crop].copy()
+    df["_flood"] = df["Flood Risk"].map(FLOOD_RANK)
+    df["_heat"] = df["Heat Stress"].map(HEAT_RANK)
+    df = df.sort_values(["_flood", "_heat", "Irrigation Deficit (mm)"], ascending=False)
+    return df.drop(columns=["_flood", "_heat", "Crop"]).reset_index(drop=True)
+
+
+# -----------------------------
+# Benchmark: per-district pandas path vs. vectorized engine
+# -----------------------------
+def synthetic_forecasts(n, days=7, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = [f"2025-07-{d + 1:02d}" for d in range(days)]
+    return {
+        f"Loc-{i}": {"daily": {
+            "time": dates,
+            "temperature_2m_max": rng.uniform(30, 48, days).round(1).tolist(),
+            "temperature_2m_min": rng.uniform(20, 30, days).round(1).tolist(),
+            "precipitation_sum": rng.gamma(0.5, 12, days).round(1).tolist(),
+        }}
+        for i in range(n)
+    }
+
+
+def per_district_advisories(forecasts):
+    """The previous path: one DataFrame and scalar comparisons per district and crop."""
+    rows = []
+    for city, forecast in forecasts.items():
+        daily = forecast["daily"]
+        df_weather = pd.DataFrame({
+            "Date": daily["time"],
+            "Temp Max (°C)": daily["temperature_2m_max"],
+            "Temp Min (°C)": daily["temperature_2m_min"],
+            "Rain (mm)": daily["precipitation_sum"]
+        }).dropna()
+        avg_temp = df_weather["Temp Max (°C)"].mean()
+        total_rain = df_weather["Rain (mm)"].sum()
+        for crop, crop_need in CROP_WATER_REQUIREMENT.items():
+            rows.append((city, crop, avg_temp, total_rain < crop_need, total_rain > FLOOD_THRESHOLD))
+    return rows
+
+
+def benchmark(n=1000, repeat=3):
+    """Best-of-`repeat` seconds for each advisory path at `n` synthetic locations."""
+    forecasts = synthetic_forecasts(n)
+    names, arr = forecast_array(forecasts)
+    cases = {
+        "per_district": lambda: per_district_advisories(forecasts),
+        "vectorized": lambda: advisory_table(*forecast_array(forecasts)),
+        "vectorized_engine_only": lambda: advisory_table(names, arr),
+    }
+    return {label: min(_timed(fn) for _ in range(repeat)) for label, fn in cases.items()}
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Advisory engine benchmark")
+    parser.add_argument("--locations", type=int, nargs="+", default=[13, 1000, 5000])
+    args = parser.parse_args(argv)
+    for n in args.locations:
+        res = benchmark(n)
+        speedup = res["per_district"] / res["vectorized"]
+        print(f"{n:>6} locations: per-district {res['per_district'] * 1000:8.1f} ms | "
+              f"vectorized {res['vectorized'] * 1000:7.1f} ms "
+              f"(engine only {res['vectorized_engine_only'] * 1000:6.1f} ms) | {speedup:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
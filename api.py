@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+# -----------------------------
+# Headless Advisory API (asyncio, no web framework)
+# -----------------------------
+# GET /advisories?crop=Rice&district=Thatta   irrigation / heat / flood + sowing, JSON
+# GET /sowing?crop=Rice                       sowing window only
+# GET /health                                 liveness
+# GET /metrics                                span / cache totals, Prometheus text
+HOST, PORT = "127.0.0.1", 8502
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024   # request bodies are read and discarded (GET only)
+KEEPALIVE_TIMEOUT = 15   # seconds an idle connection is kept open
+WORKERS = 8              # threads for snapshot builds (network / EE work)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class AdvisoryAPI:
+    """
+    HTTP/1.1 keep-alive server on asyncio streams. Advisory lookups run on a
+    small thread pool, since any of them may have to rebuild the snapshot
+    (forecast and Earth Engine calls); memoized responses return from the pool
+    at once, so hundreds of concurrent requests are answered from one process
+    without a thread per request or a blocked event loop.
+    """
+
+    def __init__(self, service, workers=WORKERS):
+        self.service = service
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="advisory")
+        self.stats = {"requests": 0, "errors": 0, "connections": 0}
+
+    async def route(self, method, target):
+        if method != "GET":
+            return 405, {"error": "only GET is supported"}
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if url.path == "/health":
+            return 200, {"status": "ok", **self.stats, **self.service.stats}
+        if url.path == "/metrics":
+            from instrument import prometheus_text
+            return 200, prometheus_text()
+        if url.path == "/sowing":
+            from advisory import SOWING_WINDOWS, sowing_status
+            crop = query.get("crop")
+            if crop not in SOWING_WINDOWS:
+                return 400, {"error": f"crop must be one of {sorted(SOWING_WINDOWS)}"}
+            return 200, sowing_status(crop)
+        if url.path == "/advisories":
+            crop, district = query.get("crop"), query.get("district")
+            loop = asyncio.get_running_loop()
+            try:
+                # Never on the loop: the snapshot can expire between a freshness check and the call
+                body = await loop.run_in_executor(self.pool, self.service.advisories_json, crop, district)
+            except ValueError as e:
+                return 400, {"error": str(e)}
+            except LookupError as e:
+                return 404, {"error": str(e)}
+            return 200, body
+        return 404, {"error": f"no route {url.path}"}
+
+    async def handle(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, 400, {"error": "headers too large"}, keep_alive=False)
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    await self._send(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    return
+                headers = {k.strip().lower(): v.strip()
+                           for k, _, v in (line.partition(":") for line in lines[1:] if line)}
+                length = headers.get("content-length", "0") or "0"
+                if not length.isdecimal() or int(length) > MAX_BODY_BYTES:
+                    await self._send(writer, 400, {"error": "invalid content-length"}, keep_alive=False)
+                    return
+                if int(length):
+                    await reader.readexactly(int(length))
+
+                self.stats["requests"] += 1
+                try:
+                    status, payload = await self.route(method, target)
+                except Exception as e:
+                    status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                if status >= 500:
+                    self.stats["errors"] += 1
+                keep_alive = (headers.get("connection", "").lower() != "close"
+                              and version == "HTTP/1.1")
+                await self._send(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, status, payload, keep_alive=True):
+        if isinstance(payload, bytes):    # pre-serialized JSON
+            body, ctype = payload, "application/json"
+        elif isinstance(payload, str):    # Prometheus text
+            body, ctype = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, ctype = json.dumps(payload).encode(), "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {ctype}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+    async def serve(self, host=HOST, port=PORT, ready=None):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES, backlog=1024)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+
+def build_service(project=None, forecast_url=None):
+    """AdvisoryService on the shared caches; optional EE project and Open-Meteo URL override."""
+    from core import AdvisoryService
+    from ee_cache import get_cache
+    from forecast import ForecastCache, fetch_forecasts, forecast_cache
+
+    fetch = forecast_cache.get_many
+    if forecast_url:
+        fetch = ForecastCache(fetcher=lambda locs: fetch_forecasts(locs, url=forecast_url)).get_many
+
+    def ee_available():
+        if not project:
+            return False
+        from bootstrap import init_ee
+        try:
+            init_ee(project)
+            return True
+        except Exception:
+            return False
+
+    return AdvisoryService(fetch=fetch, cache=get_cache(), ee_available=ee_available)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless advisory JSON API")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--project", default=os.environ.get("GEE_PROJECT_ID"),
+                        help="Earth Engine project for soil moisture not in the archive")
+    parser.add_argument("--forecast-url", default=None, help="Open-Meteo compatible endpoint")
+    args = parser.parse_args(argv)
+
+    api = AdvisoryAPI(build_service(args.project, args.forecast_url))
+    print(f"serving advisories on http://{args.host}:{args.port}/advisories", flush=True)
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import argparse
+import datetime
+import os
+import time
+
+import pandas as pd
+
+from ee_cache import CACHE_DIR, geometry_hash
+from ee_stats import (
+    district_means, districts_fc, NDVI_COLLECTION, NDVI_BAND, NDVI_SCALE_FACTOR,
+    ERA5_MONTHLY, SOIL_MOISTURE_BAND, ERA5_MONTHLY_AGGR, PRECIP_BAND,
+)
+
+# -----------------------------
+# Historical District Archive (Parquet, partitioned by variable/year)
+# -----------------------------
+ARCHIVE_DIR = os.path.join(CACHE_DIR, "archive")
+LAYOUT = 2          # v2: rows are tagged with the unit name column (v1 held NAME_2 divisions only)
+FIRST_YEAR = 2001
+COLUMNS = ["geom_hash", "name_col", "row", "district", "month", "value"]
+
+# variable -> (collection, band, scale, factor to display units)
+VARIABLES = {
+    "ndvi": (NDVI_COLLECTION, NDVI_BAND, 500, 1 / NDVI_SCALE_FACTOR),
+    "soil_moisture": (ERA5_MONTHLY, SOIL_MOISTURE_BAND, 10000, 1),   # m³/m³
+    "precipitation": (ERA5_MONTHLY_AGGR, PRECIP_BAND, 10000, 1000),  # mm
+}
+
+
+def partition_path(variable, year, root=ARCHIVE_DIR):
+    return os.path.join(root, f"v{LAYOUT}", f"variable={variable}", f"year={year}", "part.parquet")
+
+
+def _filters(geom_hash=None, name_col=None, month=None):
+    filters = [(col, "=", value) for col, value in
+               (("geom_hash", geom_hash), ("name_col", name_col), ("month", month)) if value is not None]
+    return filters or None
+
+
+def read_year(variable, year, geom_hash=None, root=ARCHIVE_DIR, name_col=None):
+    """One variable/year partition via a memory-mapped Arrow read (empty if absent)."""
+    path = partition_path(variable, year, root)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=COLUMNS)
+    import pyarrow.parquet as pq
+
+    return pq.read_table(path, memory_map=True, filters=_filters(geom_hash, name_col)).to_pandas()
+
+
+def read_month(variable, year, month, geom_hash, root=ARCHIVE_DIR, name_col=None):
+    """
+    Archived unit values for one month, or None if that month is not
+    archived (for `name_col`'s units, when given).
+    """
+    path = partition_path(variable, year, root)
+    if not os.path.exists(path):
+        return None
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, memory_map=True, filters=_filters(geom_hash, name_col, month))
+    if table.num_rows == 0:
+        return None
+    return table.to_pandas().sort_values("row").reset_index(drop=True)
+
+
+def read_history(variable, geom_hash, start_year=FIRST_YEAR, end_year=None, root=ARCHIVE_DIR, name_col=None):
+    """(row, district, date, value) of every archived month in [start_year, end_year], one partition per year."""
+    end_year = end_year or datetime.date.today().year
+    parts = [read_year(variable, year, geom_hash, root, name_col).assign(year=year)
+             for year in range(start_year, end_year + 1)]
+    parts = [p for p in parts if not p.empty]
+    if not parts:
+        return pd.DataFrame({"row": pd.Series(dtype="int64"), "district": pd.Series(dtype=object),
+                             "date": pd.Series(dtype="datetime64[ns]"), "value": pd.Series(dtype="float64")})
+    df = pd.concat(parts, ignore_index=True)
+    df["row"] = df["row"].astype(int)
+    df["date"] = pd.to_datetime(dict(year=df["year"], month=df["month"].astype(int), day=1))
+    return df[["row", "district", "date", "value"]].sort_values(["row", "date"]).reset_index(drop=True)
+
+
+def write_year(df, variable, year, root=ARCHIVE_DIR):
+    """Replace a partition atomically so readers never see a half-written file."""
+    path = partition_path(variable, year, root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    df[COLUMNS].sort_values(["geom_hash", "name_col", "month", "row"]).to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def closed_months(year, today=None):
+    """Months of `year` that have fully ended."""
+    today = today or datetime.date.today()
+    return [m for m in range(1, 13) if datetime.date(year + (m == 12), m % 12 + 1, 1) <= today]
+
+
+def missing_months(variable, year, geom_hash, root=ARCHIVE_DIR, name_col=None):
+    have = set(read_year(variable, year, geom_hash, root, name_col)["month"].astype(int))
+    return [m for m in closed_months(year) if m not in have]
+
+
+def ingest(gdf, variables=None, start_year=FIRST_YEAR, end_year=None, name_col=None,
+           root=ARCHIVE_DIR, backend=None, log=print):
+    """
+    Fill the archive with every closed month that is not there yet. Each
+    missing month is one reduceRegions over all units (named by `name_col`,
+    the app's unit column by default); its year partition is rewritten as
+    soon as the month is fetched, so an interrupted run keeps every month
+    fetched before it.
+    """
+    from units import unit_column
+
+    end_year = end_year or datetime.date.today().year
+    name_col = name_col or unit_column(gdf)
+    ghash = geometry_hash(gdf)
+    fc = districts_fc(gdf, name_col, backend=backend)
+    fetched = 0
+
+    for variable in variables or VARIABLES:
+        collection, band, scale, factor = VARIABLES[variable]
+        for year in range(start_year, end_year + 1):
+            months = missing_months(variable, year, ghash, root, name_col)
+            if not months:
+                continue
+            parts = [read_year(variable, year, root=root)]
+            for month in months:
+                t0 = time.perf_counter()
+                df = district_means(gdf, collection, band, year, month, scale,
+                                    name_col=name_col, fc=fc, backend=backend)
+                parts.append(pd.DataFrame({
+                    "geom_hash": ghash,
+                    "name_col": name_col,
+                    "row": df["row"].astype(int).values,
+                    "district": df.index.values,
+                    "month": month,
+                    "value": df[band].values * factor,
+                }))
+                write_year(pd.concat(parts, ignore_index=True), variable, year, root)
+                fetched += 1
+                log(f"{variable} {year}-{month:02d}: {time.perf_counter() - t0:.2f}s")
+    return fetched
+
+
+def info(root=ARCHIVE_DIR):
+    """{variable: {year: archived months}} of the archive on disk."""
+    out = {}
+    for variable in VARIABLES:
+        for year in range(FIRST_YEAR, datetime.date.today().year + 1):
+            df = read_year(variable, year, root=root)
+            if not df.empty:
+                out.setdefault(variable, {})[year] = sorted(set(df["month"].astype(int)))
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Historical per-district archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("ingest", help="fetch missing closed months from Earth Engine")
+    run.add_argument("--start-year", type=int, default=FIRST_YEAR)
+    run.add_argument("--end-year", type=int, default=None)
+    run.add_argument("--variables", nargs="*", default=None, help=", ".join(VARIABLES))
+    run.add_argument("--geojson", default="sindh_with_indus_sea.geojson")
+    run.add_argument("--name-col", default=None, help="unit name column (default: the app's unit column)")
+    run.add_argument("--project", default=os.environ.get("GEE_PROJECT_ID"))
+    sub.add_parser("info", help="list archived months per variable/year")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        for variable, years in info().items():
+            for year, months in years.items():
+                print(f"{variable:<14} {year}: {len(months):>2} months")
+        return
+
+    from bootstrap import init_ee, load_geometries
+
+    init_ee(args.project)
+    gdf = load_geometries(args.geojson)["sindh"]
+    n = ingest(gdf, args.variables, args.start_year, args.end_year, name_col=args.name_col)
+    print(f"fetched {n} district-months")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import argparse
+import json
+import math
+import os
+import shutil
+
+from geo_layers import SINDH_PATH, RIVER_PATH, file_hash, load_layer
+
+# -----------------------------
+# Pre-rendered Boundary Tile Pyramid
+# -----------------------------
+# Streamlit serves ./static at /app/static when server.enableStaticServing is on
+STATIC_DIR = "static"
+TILE_ROOT = os.path.join(STATIC_DIR, "tiles")
+TILE_URL_PREFIX = "/app/static/tiles"
+MANIFEST = os.path.join(TILE_ROOT, "manifest.json")
+TILE_SIZE = 256
+MIN_ZOOM, MAX_ZOOM = 6, 11
+
+# layer -> (source file, line colour, line width at MIN_ZOOM)
+STYLES = {
+    "districts": (SINDH_PATH, (0, 0, 0, 255), 1),
+    "river": (RIVER_PATH, (0, 0, 255, 204), 2),
+}
+
+
+def lonlat_to_pixel(lon, lat, zoom):
+    """Global Web Mercator pixel coordinates at `zoom`."""
+    scale = TILE_SIZE * 2 ** zoom
+    x = (lon + 180.0) / 360.0 * scale
+    siny = min(max(math.sin(math.radians(lat)), -0.9999), 0.9999)
+    y = (0.5 - math.log((1 + siny) / (1 - siny)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def _lines(geom):
+    """Every boundary/line of a geometry as a coordinate sequence."""
+    kind = geom.geom_type
+    if kind == "Polygon":
+        yield geom.exterior.coords
+        for ring in geom.interiors:
+            yield ring.coords
+    elif kind == "LineString":
+        yield geom.coords
+    elif kind.startswith("Multi") or kind == "GeometryCollection":
+        for part in geom.geoms:
+            yield from _lines(part)
+
+
+def render_layer(gdf, out_dir, color, width, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Draw `gdf` into {z}/{x}/{y}.png tiles; empty tiles are not written."""
+    from PIL import Image, ImageDraw
+
+    count = 0
+    lines = [list(c) for geom in gdf.geometry if geom is not None for c in _lines(geom)]
+    for zoom in range(min_zoom, max_zoom + 1):
+        line_width = max(1, width + (zoom - min_zoom) // 2)
+        tiles = {}
+        for coords in lines:
+            pixels = [lonlat_to_pixel(lon, lat, zoom) for lon, lat, *_ in coords]
+            xs = [p[0] for p in pixels]
+            ys = [p[1] for p in pixels]
+            for tx in range(int(min(xs)) // TILE_SIZE, int(max(xs)) // TILE_SIZE + 1):
+                for ty in range(int(min(ys)) // TILE_SIZE, int(max(ys)) // TILE_SIZE + 1):
+                    tiles.setdefault((tx, ty), []).append(pixels)
+
+        for (tx, ty), shapes in tiles.items():
+            img = Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(img)
+            ox, oy = tx * TILE_SIZE, ty * TILE_SIZE
+            for pixels in shapes:
+                draw.line([(x - ox, y - oy) for x, y in pixels], fill=color, width=line_width)
+            if img.getbbox() is None:
+                continue
+            path = os.path.join(out_dir, str(zoom), str(tx))
+            os.makedirs(path, exist_ok=True)
+            img.save(os.path.join(path, f"{ty}.png"), optimize=True)
+            count += 1
+    return count
+
+
+def load_manifest():
+    if os.path.exists(MANIFEST):
+        with open(MANIFEST) as f:
+            return json.load(f)
+    return {}
+
+
+def build(layers=None, force=False, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """
+    Render each layer into static/tiles/<layer>-<source hash>/. Layers whose
+    source file hash and zoom range match the manifest are skipped.
+    """
+    manifest = load_manifest()
+    for name in layers or STYLES:
+        source, color, width = STYLES[name]
+        if not os.path.exists(source):
+            print(f"{name}: {source} not found, skipped")
+            continue
+        version = f"{name}-{file_hash(source)}"
+        entry = manifest.get(name, {})
+        if not force and entry.get("version") == version and entry.get("zoom") == [min_zoom, max_zoom]:
+            print(f"{name}: up to date ({version})")
+            continue
+
+        out_dir = os.path.join(TILE_ROOT, version)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        count = render_layer(load_layer(source), out_dir, color, width, min_zoom, max_zoom)
+        if entry.get("version") and entry["version"] != version:
+            shutil.rmtree(os.path.join(TILE_ROOT, entry["version"]), ignore_errors=True)
+        manifest[name] = {"version": version, "zoom": [min_zoom, max_zoom], "tiles": count}
+        print(f"{name}: rendered {count} tiles -> {out_dir}")
+
+    os.makedirs(TILE_ROOT, exist_ok=True)
+    with open(MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def tile_url(name):
+    """Leaflet url template of a built layer, or None if it has not been built."""
+    entry = load_manifest().get(name)
+    if not entry:
+        return None
+    return f"{TILE_URL_PREFIX}/{entry['version']}/{{z}}/{{x}}/{{y}}.png"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-render district/river boundary tiles")
+    parser.add_argument("layers", nargs="*", help=f"subset of: {', '.join(STYLES)} (default all)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if sources are unchanged")
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    args = parser.parse_args(argv)
+    build(args.layers or None, args.force, args.min_zoom, args.max_zoom)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,604 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+# -----------------------------
+# Offline Benchmark: fake Earth Engine + stub Open-Meteo
+# -----------------------------
+SIZES = [13, 100, 1000]
+HTTP_LATENCY = 0.05      # seconds per Open-Meteo request
+EE_LATENCY = 0.3         # seconds per getInfo round trip
+MAP_LATENCY = 0.2        # seconds per getMapId round trip
+SINDH_BOUNDS = (66.6, 23.6, 71.2, 28.5)
+FIXED_DATE = datetime.date(2025, 7, 1)   # first forecast day, so runs are comparable
+PAGE_DISTRICTS = [
+    "Karachi", "Hyderabad", "Sukkur", "Larkana", "Thatta", "Nawabshah", "Mirpurkhas",
+    "Badin", "Jacobabad", "Shikarpur", "Kashmore", "Umerkot", "Sanghar",
+]
+CROP_DISTRICTS = {
+    "Wheat": ["Thatta", "Nawabshah", "Sukkur"],
+    "Rice": ["Thatta", "Badin", "Larkana"],
+    "Cotton": ["Mirpurkhas", "Hyderabad", "Nawabshah"],
+    "Sugarcane": ["Badin", "Thatta", "Sanghar", "Nawabshah"],
+}
+
+
+def _unit(*parts):
+    """Deterministic pseudo-random number in [0, 1) for the given key."""
+    return zlib.crc32("|".join(str(p) for p in parts).encode()) / 2 ** 32
+
+
+# -----------------------------
+# Stub Open-Meteo server
+# -----------------------------
+def canned_forecast(lat, lon, days):
+    dates = [(FIXED_DATE + datetime.timedelta(days=d)).isoformat() for d in range(days)]
+    tmax = [round(30 + 15 * _unit("tmax", lat, lon, d), 1) for d in range(days)]
+    return {
+        "latitude": lat,
+        "longitude": lon,
+        "daily": {
+            "time": dates,
+            "temperature_2m_max": tmax,
+            "temperature_2m_min": [round(t - 8 - 4 * _unit("tmin", lat, lon, d), 1)
+                                   for d, t in enumerate(tmax)],
+            "precipitation_sum": [round(max(0.0, 40 * _unit("rain", lat, lon, d) - 25), 1)
+                                  for d in range(days)],
+            "windspeed_10m_max": [round(5 + 20 * _unit("wind", lat, lon, d), 1) for d in range(days)],
+        },
+    }
+
+
+class StubForecastServer:
+    """
+    Local HTTP server that answers Open-Meteo style forecast queries with
+    canned JSON after `latency` seconds. Batched coordinates get a list,
+    a single coordinate a plain object, as the real API does. A share
+    `error_rate` of requests is answered with `error_status` instead
+    (seeded, so runs repeat); `batch_status`, if set, answers every
+    multi-location request with that status.
+    """
+
+    def __init__(self, latency=HTTP_LATENCY, error_rate=0.0, error_status=503, seed=0, batch_status=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.batch_status = batch_status
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        lock = threading.Lock()
+        rng = random.Random(seed)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                lats = [float(v) for v in query["latitude"][0].split(",")]
+                lons = [float(v) for v in query["longitude"][0].split(",")]
+                days = int(query.get("forecast_days", ["7"])[0])
+                time.sleep(server.latency)
+                with lock:
+                    failed = rng.random() < server.error_rate
+                    batch_failed = server.batch_status is not None and len(lats) > 1
+                    server.requests += failed or batch_failed
+                    server.errors += failed or batch_failed
+                if failed or batch_failed:
+                    self.send_response(server.batch_status if batch_failed else server.error_status)
+                    self.send_header("Retry-After", "0")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                payload = [canned_forecast(lat, lon, days) for lat, lon in zip(lats, lons)]
+                body = json.dumps(payload if len(payload) > 1 else payload[0]).encode()
+                with lock:
+                    server.requests += 1
+                    server.bytes += len(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}/v1/forecast"
+
+    def __enter__(self):
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+# -----------------------------
+# Fake Earth Engine
+# -----------------------------
+def _to_date(value):
+    if isinstance(value, _Date):
+        return value.date
+    return datetime.date.fromisoformat(str(value)[:10])
+
+
+class _Date:
+    def __init__(self, date):
+        self.date = date
+
+    def advance(self, n, unit):
+        if unit != "month":
+            return _Date(self.date + datetime.timedelta(days=n))
+        month = self.date.month - 1 + n
+        return _Date(self.date.replace(year=self.date.year + month // 12, month=month % 12 + 1))
+
+    def format(self, fmt=None):
+        return self.date.isoformat()
+
+
+class _Feature:
+    def __init__(self, props):
+        self.props = dict(props)
+
+    def set(self, key, value):
+        return _Feature({**self.props, key: value})
+
+
+class _FeatureCollection:
+    def __init__(self, ee, features):
+        self._ee = ee
+        self.features = list(features)
+
+    def map(self, fn):
+        return _FeatureCollection(self._ee, [fn(f) for f in self.features])
+
+    def select(self, names, retainGeometry=True):
+        return _FeatureCollection(
+            self._ee, [_Feature({k: f.props.get(k) for k in names}) for f in self.features])
+
+    def getInfo(self):
+        self._ee.round_trip("getInfo", self._ee.latency)
+        return {"type": "FeatureCollection",
+                "features": [{"type": "Feature", "properties": f.props} for f in self.features]}
+
+
+class _Value:
+    def __init__(self, ee, value):
+        self._ee = ee
+        self.value = value
+
+    def getInfo(self):
+        self._ee.round_trip("getInfo", self._ee.latency)
+        return self.value
+
+
+class _Image:
+    def __init__(self, ee, collection, band=None, date=None):
+        self._ee = ee
+        self.collection = collection
+        self.band = band
+        self._date = date
+
+    def _with(self, **changes):
+        return _Image(self._ee, changes.get("collection", self.collection),
+                      changes.get("band", self.band), changes.get("date", self._date))
+
+    def select(self, band, new_names=None):
+        band = band[0] if isinstance(band, list) else band
+        return self._with(band=new_names[0] if new_names else band)
+
+    def clip(self, geom):
+        return self
+
+    def toFloat(self):
+        return self
+
+    def unmask(self, value=None):
+        return self
+
+    def rename(self, name):
+        return self._with(band=name)
+
+    def subtract(self, other):
+        return self._with(collection=f"{self.collection}-anomaly")
+
+    def visualize(self, **vis):
+        return self
+
+    def date(self):
+        return _Date(self._date)
+
+    def value(self, *key):
+        """Plausible raw value for this band, stable across runs."""
+        u = _unit(self.collection, self.band, self._date, *key)
+        if self.band == "NDVI":
+            return 1000 + 6000 * u
+        if "soil" in str(self.band):
+            return 0.05 + 0.4 * u
+        return 0.15 * u   # precipitation, metres
+
+    def reduceRegions(self, collection, reducer=None, scale=None):
+        return _FeatureCollection(
+            self._ee,
+            [f.set("mean", self.value(f.props.get("row"))) for f in collection.features])
+
+    def reduceRegion(self, reducer=None, geometry=None, scale=None, maxPixels=None):
+        lo, hi = sorted((self.value("p5"), self.value("p95")))
+        return _Value(self._ee, {f"{self.band}_p5": lo, f"{self.band}_p95": hi})
+
+    def getMapId(self):
+        self._ee.round_trip("getMapId", self._ee.map_latency)
+        token = zlib.crc32(f"{self.collection}{self.band}{self._date}".encode())
+        return {"tile_fetcher": SimpleNamespace(
+            url_format=f"https://fake-ee.invalid/{token:08x}/{{z}}/{{x}}/{{y}}")}
+
+
+class _ImageCollection:
+    def __init__(self, ee, collection, band=None, start=None, end=None):
+        self._ee = ee
+        self.collection = collection
+        self.band = band
+        self.start = start
+        self.end = end
+
+    def filterDate(self, start, end):
+        return _ImageCollection(self._ee, self.collection, self.band, _to_date(start), _to_date(end))
+
+    def filter(self, flt):
+        return self
+
+    def select(self, band):
+        return _ImageCollection(self._ee, self.collection, band, self.start, self.end)
+
+    def mean(self):
+        return _Image(self._ee, self.collection, self.band, self.start)
+
+    def map(self, fn):
+        """16-day composites over the filtered range, as MOD13Q1 has."""
+        dates, day = [], self.start
+        while day < self.end:
+            dates.append(day)
+            day += datetime.timedelta(days=16)
+        return _Mapped(self._ee, [fn(_Image(self._ee, self.collection, self.band, d)) for d in dates])
+
+
+class _Mapped:
+    def __init__(self, ee, collections):
+        self._ee = ee
+        self.collections = collections
+
+    def flatten(self):
+        return _FeatureCollection(self._ee, [f for fc in self.collections for f in fc.features])
+
+
+class FakeEE:
+    """
+    Stand-in for the `ee` module covering what this app calls. Images are
+    lazy descriptions; only getInfo/getMapId "go to the server", where they
+    sleep for the configured latency and are counted. Values are
+    deterministic, so reports from two runs are comparable.
+    """
+
+    def __init__(self, latency=EE_LATENCY, map_latency=MAP_LATENCY):
+        self.latency = latency
+        self.map_latency = map_latency
+        self.calls = {"getInfo": 0, "getMapId": 0, "computePixels": 0}
+        self._lock = threading.Lock()
+        ee = self
+        self.Date = SimpleNamespace(fromYMD=lambda y, m, d: _Date(datetime.date(y, m, d)))
+        self.Filter = SimpleNamespace(calendarRange=lambda *a: None)
+        self.Reducer = SimpleNamespace(mean=lambda: "mean", percentile=lambda p: f"percentile{p}")
+        self.data = SimpleNamespace(getInfo=lambda asset_id: ee.round_trip("getInfo", ee.latency),
+                                    computePixels=self.compute_pixels)
+
+    def round_trip(self, kind, latency):
+        with self._lock:
+            self.calls[kind] += 1
+        time.sleep(latency)
+
+    def compute_pixels(self, request):
+        """Smooth field between the image's p5/p95, as a one-band structured array."""
+        import numpy as np
+
+        self.round_trip("computePixels", self.map_latency)
+        image = request["expression"]
+        dims = request["grid"]["dimensions"]
+        lo, hi = sorted((image.value("p5"), image.value("p95")))
+        y, x = np.mgrid[0:dims["height"], 0:dims["width"]]
+        out = np.zeros(x.shape, dtype=[(image.band, "<f4")])
+        out[image.band] = lo + (hi - lo) * (0.5 + 0.5 * np.sin(x / 17) * np.cos(y / 23))
+        return out
+
+    def Geometry(self, geojson):
+        return geojson
+
+    def Feature(self, geometry, props):
+        return _Feature(props)
+
+    def FeatureCollection(self, features):
+        return _FeatureCollection(self, features)
+
+    def Image(self, asset_id):
+        return _Image(self, asset_id)
+
+    def ImageCollection(self, collection_id):
+        return _ImageCollection(self, collection_id)
+
+
+# -----------------------------
+# Synthetic districts + page replay
+# -----------------------------
+def synthetic_districts(n, bounds=SINDH_BOUNDS):
+    """
+    n rectangular districts tiling the Sindh bounding box. The first 13 carry
+    the page's district names so crop and forecast lookups behave as in the app.
+    """
+    import math
+
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    cols = math.ceil(math.sqrt(n))
+    rows = math.ceil(n / cols)
+    w = (bounds[2] - bounds[0]) / cols
+    h = (bounds[3] - bounds[1]) / rows
+    names = PAGE_DISTRICTS[:n] + [f"District-{i:04d}" for i in range(len(PAGE_DISTRICTS), n)]
+    geoms = [box(bounds[0] + (i % cols) * w, bounds[1] + (i // cols) * h,
+                 bounds[0] + (i % cols + 1) * w, bounds[1] + (i // cols + 1) * h)
+             for i in range(n)]
+    return gpd.GeoDataFrame({"NAME_2": names}, geometry=geoms, crs=4326)
+
+
+class OfflinePage:
+    """
+    The page's data path (sections 5–13 and the NDVI trend) wired to the
+    stub backends. Caches live in `workdir` and persist across renders the
+    way the process-wide caches persist across Streamlit reruns. Plotly
+    figures and Streamlit widgets are not built.
+    """
+
+    def __init__(self, gdf, server, ee, workdir, overlays=("ndvi",)):
+        import requests
+
+        from details import DetailCache
+        from ee_cache import EECache, geometry_hash
+        from forecast import ForecastCache, fetch_forecasts
+        from layers import LayerRegistry
+        from ndvi_series import NDVISeriesStore
+
+        session = requests.Session()
+        self.gdf = gdf
+        self.ee = ee
+        self.workdir = workdir
+        self.overlays = overlays
+        self.geom_hash = geometry_hash(gdf)
+        self.forecast_cache = ForecastCache(
+            fetcher=lambda locs: fetch_forecasts(locs, url=server.url, session=session))
+        self.ee_cache = EECache(path=os.path.join(workdir, "ee_results.sqlite"))
+        self.details = DetailCache()
+        self.ndvi_store = NDVISeriesStore(path=os.path.join(workdir, "ndvi_series.parquet"))
+        self.registry = LayerRegistry(ee.Geometry(gdf.geometry.union_all().__geo_interface__),
+                                      self.geom_hash, cache=self.ee_cache, backend=ee)
+
+    def month_ndvi(self, year, month):
+        from archive import read_month
+        from ee_stats import district_ndvi
+
+        archived = read_month("ndvi", year, month, self.geom_hash,
+                              root=os.path.join(self.workdir, "archive"))
+        if archived is not None:
+            return dict(zip(archived["row"], archived["value"]))
+        ndvi_df = district_ndvi(self.gdf, year, month, cache=self.ee_cache, backend=self.ee)
+        return dict(zip(ndvi_df["row"], ndvi_df["NDVI"]))
+
+    def render(self, year, month, crop="Rice", click=None):
+        """One rerun of the page; `click` is the gdf row clicked on the map, if any."""
+        import folium
+
+        from advisory import ranked_alerts
+        from core import district_advisories
+        from climatology import district_anomaly
+        from details import district_detail
+        from geo_layers import districts_geojson
+        from instrument import finish_render, section, start_render
+        from chart_data import downsample
+        from ndvi_series import last_year_range, smooth_and_normalize
+        from units import get_unit_index, grid_forecasts
+
+        start_render()
+        section("4. Locations Dictionary")
+        unit_index = get_unit_index(self.gdf)
+        section("5. Weather Forecast API")
+        forecasts = grid_forecasts(unit_index, self.forecast_cache.get_many)
+
+        section("8. Map Setup")
+        bounds = self.gdf.total_bounds
+        m = folium.Map(location=[25.5, 68.5], zoom_start=6, min_zoom=6, max_bounds=True,
+                       max_lat=bounds[3], min_lat=bounds[1], max_lon=bounds[2], min_lon=bounds[0],
+                       prefer_canvas=True)
+        for name in self.overlays:
+            folium.TileLayer(tiles=self.registry.tile_url(name, year, month), attr=name,
+                             overlay=True, opacity=0.8).add_to(m)
+
+        section("9. District Polygons + Popups + Forecast Data")
+        folium.GeoJson(data=districts_geojson(self.gdf), name="Districts",
+                       tooltip=folium.GeoJsonTooltip(fields=["name"], labels=False)).add_to(m)
+
+        section("10. Show Map")
+        html = m.get_root().render()
+        if click is not None:
+            section("District details")
+            district_detail(unit_index, click, year, month, forecasts, self.month_ndvi,
+                            cache=self.details)
+
+        section("12. Irrigation Advisory")
+        advisories = district_advisories(unit_index, forecasts, self.gdf, geom_hash=self.geom_hash,
+                                         fetch=self.forecast_cache.get_many, cache=self.ee_cache,
+                                         ee_available=lambda: True, backend=self.ee)
+        section("13. Flood Risk Advisory")
+        ranked_alerts(advisories["table"], crop)
+        if "flood_anomaly" in self.overlays:
+            district_anomaly(self.gdf, year, month, cache=self.ee_cache, backend=self.ee)
+
+        section("NDVI Growth Trend (12 months)")
+        start, end = last_year_range(FIXED_DATE)
+        rows = [row for row, name in enumerate(self.gdf["NAME_2"]) if name in CROP_DISTRICTS[crop]]
+        trend = self.ndvi_store.get(self.gdf, rows, start, end, name_col="NAME_2", backend=self.ee)
+        if not trend.empty:
+            downsample(smooth_and_normalize(trend), "date", "NDVI_Normalized")
+
+        return finish_render(), len(html)
+
+
+def _rss_mb():
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_size(n, http_latency=HTTP_LATENCY, ee_latency=EE_LATENCY, map_latency=MAP_LATENCY,
+             overlays=("ndvi",), renders=("cold", "warm", "click")):
+    """
+    Render the page for n synthetic districts: once against empty caches
+    ("cold"), again as a rerun would ("warm"), and a rerun after clicking a
+    district ("click"). Run this in a fresh interpreter (see `benchmark`)
+    so process-wide caches start empty.
+    """
+    gdf = synthetic_districts(n)
+    ee = FakeEE(ee_latency, map_latency)
+    result = {"districts": n, "rss_before_mb": round(_rss_mb(), 1)}
+    year, month = FIXED_DATE.year, FIXED_DATE.month - 1
+
+    with StubForecastServer(http_latency) as server, tempfile.TemporaryDirectory() as workdir:
+        page = OfflinePage(gdf, server, ee, workdir, overlays)
+        for run in renders:
+            calls_before = {**ee.calls, "open_meteo": server.requests, "open_meteo_bytes": server.bytes}
+            t0 = time.perf_counter()
+            click = 0 if run == "click" else None   # gdf row of the clicked unit
+            spans, html_bytes = page.render(year, month, click=click)
+            seconds = time.perf_counter() - t0
+            result[run] = {
+                "seconds": round(seconds, 4),
+                "sections": {sp.name: round(sp.seconds, 4) for sp in spans if sp.kind == "section"},
+                "external_calls": {
+                    "open_meteo": server.requests - calls_before["open_meteo"],
+                    "ee_getInfo": ee.calls["getInfo"] - calls_before["getInfo"],
+                    "ee_getMapId": ee.calls["getMapId"] - calls_before["getMapId"],
+                },
+                "forecast_bytes": server.bytes - calls_before["open_meteo_bytes"],
+                "map_html_bytes": html_bytes,
+            }
+    result["peak_rss_mb"] = round(_rss_mb(), 1)
+    return result
+
+
+def benchmark(sizes=SIZES, **config):
+    """One fresh interpreter per size; returns the report dict."""
+    results = []
+    for n in sizes:
+        code = (f"import json, benchmark; "
+                f"print(json.dumps(benchmark.run_size({n}, **{config!r})))")
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)) or ".")
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "config": {"sizes": list(sizes), "http_latency": HTTP_LATENCY, "ee_latency": EE_LATENCY,
+                   "map_latency": MAP_LATENCY, "overlays": ["ndvi"], **config},
+        "results": results,
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)) or ".")
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+# -----------------------------
+# Report comparison
+# -----------------------------
+METRICS = [
+    ("cold s", lambda r: r["cold"]["seconds"]),
+    ("warm s", lambda r: r["warm"]["seconds"]),
+    ("cold calls", lambda r: sum(r["cold"]["external_calls"].values())),
+    ("warm calls", lambda r: sum(r["warm"]["external_calls"].values())),
+    ("peak MB", lambda r: r["peak_rss_mb"]),
+]
+
+
+def compare(old, new):
+    """Rows of (districts, metric, old, new, change %) for sizes present in both reports."""
+    before = {r["districts"]: r for r in old["results"]}
+    rows = []
+    for r in new["results"]:
+        if r["districts"] not in before:
+            continue
+        for label, get in METRICS:
+            a, b = get(before[r["districts"]]), get(r)
+            change = 100 * (b - a) / a if a else None
+            rows.append((r["districts"], label, a, b, change))
+    return rows
+
+
+def print_report(report):
+    for r in report["results"]:
+        for run in ("cold", "warm", "click"):
+            if run not in r:
+                continue
+            calls = ", ".join(f"{k} {v}" for k, v in r[run]["external_calls"].items())
+            print(f"{r['districts']:>5} districts {run:<4} {r[run]['seconds']:7.3f} s   {calls}")
+        print(f"{'':>5}           peak RSS {r['peak_rss_mb']:.0f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline page benchmark with fake EE / Open-Meteo")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SIZES)
+    parser.add_argument("--http-latency", type=float, default=HTTP_LATENCY)
+    parser.add_argument("--ee-latency", type=float, default=EE_LATENCY)
+    parser.add_argument("--map-latency", type=float, default=MAP_LATENCY)
+    parser.add_argument("--overlays", nargs="*", default=["ndvi"],
+                        help="ndvi, soil_moisture, flood_anomaly")
+    parser.add_argument("--out", default="benchmark_report.json")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.sizes, http_latency=args.http_latency, ee_latency=args.ee_latency,
+                       map_latency=args.map_latency, overlays=tuple(args.overlays))
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report)
+    print(f"wrote {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print(f"\nvs {args.compare} ({old.get('commit')}):")
+        for n, label, a, b, change in compare(old, report):
+            delta = f"{change:+.1f}%" if change is not None else "n/a"
+            print(f"{n:>5} {label:<11} {a:>9.3f} -> {b:>9.3f}  {delta}")
+
+
+if __name__ == "__main__":
+    main()
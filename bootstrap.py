@@ -0,0 +1,192 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+# -----------------------------
+# Lazy Imports
+# -----------------------------
+class LazyModule:
+    """Stand-in that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def lazy_module(name):
+    return sys.modules.get(name) or LazyModule(name)
+
+
+# -----------------------------
+# Earth Engine: initialized once per process, on first use
+# -----------------------------
+_ee_lock = threading.Lock()
+_ee_state = {"project": None, "error": None}
+
+
+def init_ee(project):
+    """Run ee.Initialize at most once per process; re-raises a cached failure."""
+    with _ee_lock:
+        if _ee_state["project"] == project:
+            return
+        if _ee_state["error"] is not None:
+            raise _ee_state["error"]
+        import ee
+        try:
+            ee.Initialize(project=project)
+        except Exception as e:
+            _ee_state["error"] = e
+            raise
+        _ee_state["project"] = project
+
+
+_ee_geoms = {}
+
+
+def ee_geometry(key, geom):
+    """ee.Geometry for a shapely geometry, built once per process."""
+    if key not in _ee_geoms:
+        import ee
+        _ee_geoms[key] = ee.Geometry(geom.__geo_interface__)
+    return _ee_geoms[key]
+
+
+# -----------------------------
+# Geometries: parsed once, cached as GeoParquet + WKB
+# -----------------------------
+_geometries = {}
+
+
+def _cached_layer(path):
+    import geopandas as gpd
+    from geo_layers import GEO_CACHE_DIR, file_hash, load_layer
+
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    cached = os.path.join(GEO_CACHE_DIR, f"{stem}-{file_hash(path)}.parquet")
+    if os.path.exists(cached):
+        return gpd.read_parquet(cached), cached
+    gdf = load_layer(path)
+    try:
+        os.makedirs(GEO_CACHE_DIR, exist_ok=True)
+        gdf.to_parquet(cached)
+    except ImportError:   # pyarrow missing: keep parsing the source each process
+        pass
+    return gdf, cached
+
+
+def load_geometries(sindh_path=None, river_path=None):
+    """
+    {"sindh": GeoDataFrame, "river": GeoDataFrame or None, "sindh_union": shapely}
+    loaded once per process from a compact GeoParquet/WKB cache of the sources.
+    """
+    from geo_layers import SINDH_PATH, RIVER_PATH
+
+    sindh_path = sindh_path or SINDH_PATH
+    river_path = river_path or RIVER_PATH
+    key = (sindh_path, river_path)
+    if key in _geometries:
+        return _geometries[key]
+
+    import shapely
+
+    sindh, cached = _cached_layer(sindh_path)
+    union_path = cached.replace(".parquet", "-union.wkb")
+    if os.path.exists(union_path):
+        with open(union_path, "rb") as f:
+            union = shapely.from_wkb(f.read())
+    else:
+        union = sindh.geometry.union_all()
+        if os.path.isdir(os.path.dirname(union_path)):
+            with open(union_path, "wb") as f:
+                f.write(shapely.to_wkb(union))
+
+    try:
+        river, _ = _cached_layer(river_path)
+    except Exception:
+        river = None
+
+    _geometries[key] = {"sindh": sindh, "river": river, "sindh_union": union}
+    return _geometries[key]
+
+
+# -----------------------------
+# Startup Benchmark
+# -----------------------------
+def _parse_source():
+    from geo_layers import SINDH_PATH, load_layer
+    return load_layer(SINDH_PATH)
+
+
+PHASES = [
+    ("import streamlit", lambda: importlib.import_module("streamlit")),
+    ("import pandas", lambda: importlib.import_module("pandas")),
+    ("import geopandas", lambda: importlib.import_module("geopandas")),
+    ("import folium", lambda: importlib.import_module("folium")),
+    ("import plotly.express", lambda: importlib.import_module("plotly.express")),
+    ("import ee", lambda: importlib.import_module("ee")),
+    ("parse geojson source", _parse_source),
+    ("load geometries", load_geometries),
+]
+
+
+def _phase_timings(project=None):
+    """Each phase run twice in this process: cold (first) and warm (second)."""
+    phases = list(PHASES)
+    if project:
+        phases.append(("ee.Initialize", lambda: init_ee(project)))
+    results = []
+    for name, fn in phases:
+        row = {"phase": name}
+        for run in ("cold", "warm"):
+            t0 = time.perf_counter()
+            try:
+                fn()
+            except Exception as e:
+                row["error"] = f"{type(e).__name__}: {e}"
+                break
+            row[run] = time.perf_counter() - t0
+        results.append(row)
+    return results
+
+
+def benchmark(project=None):
+    """Time startup phases in a fresh interpreter so 'cold' really is cold."""
+    code = (f"import json, bootstrap; "
+            f"print(json.dumps(bootstrap._phase_timings({project!r})))")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)) or ".")
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup cost of each phase (cold vs warm)")
+    parser.add_argument("--project", default=os.environ.get("GEE_PROJECT_ID"),
+                        help="also time ee.Initialize")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args.project)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        if "error" in row:
+            print(f"{row['phase']:<24} {row['error']}")
+        else:
+            print(f"{row['phase']:<24} cold {row['cold'] * 1000:8.1f} ms   warm {row['warm'] * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
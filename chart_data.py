@@ -0,0 +1,155 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# -----------------------------
+# Chart Data: downsampling to the plot's pixel width
+# -----------------------------
+# A line chart cannot show more than one point per horizontal pixel, so long
+# series are reduced to about CHART_WIDTH points per trace before they are
+# sent to the browser. Payload and render time then depend on the chart
+# width and the number of traces, not on how much history is selected.
+CHART_WIDTH = 800        # px; points kept per trace
+MAX_VISIBLE_TRACES = 4   # further districts start hidden (click the legend to show)
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: indices of `n_out` points that keep the
+    visual shape of the line (peaks and troughs survive). `x` must be sorted.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # n_out - 2 buckets between the fixed first and last point; the final
+    # point is its own bucket so the last real bucket has a neighbour
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(int), n)
+    counts = np.diff(edges)
+    avg_x = (np.add.reduceat(x, edges[:-1]) / counts).tolist()
+    avg_y = (np.add.reduceat(y, edges[:-1]) / counts).tolist()
+    edges = edges.tolist()
+
+    # Each pick depends on the previous one, so this part stays a loop;
+    # plain floats beat numpy on buckets of a dozen points
+    xs, ys = x.tolist(), y.tolist()
+    idx = [0]
+    ax, ay = xs[0], ys[0]
+    for i in range(n_out - 2):
+        dx, dy = ax - avg_x[i + 1], avg_y[i + 1] - ay
+        best, pick = -1.0, edges[i]
+        for j in range(edges[i], edges[i + 1]):
+            area = abs(dx * (ys[j] - ay) - (ax - xs[j]) * dy)
+            if area > best:
+                best, pick = area, j
+        idx.append(pick)
+        ax, ay = xs[pick], ys[pick]
+    idx.append(n - 1)
+    return np.array(idx)
+
+
+def minmax(x, y, n_out):
+    """
+    Min and max of each of n_out / 2 equal-width x buckets (plus both ends).
+    Cheaper than LTTB and never drops an extreme, at the cost of a
+    jagged look on smooth series. `x` must be sorted.
+    """
+    n = len(x)
+    buckets = max(n_out // 2, 1)
+    if n <= n_out:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    span = x[-1] - x[0] or 1.0
+    bucket = np.minimum(((x - x[0]) / span * buckets).astype(int), buckets - 1)
+    order = np.lexsort((y, bucket))
+    starts = np.r_[0, np.flatnonzero(np.diff(bucket[order])) + 1]
+    ends = np.r_[starts[1:] - 1, n - 1]
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def downsample(df, x, y, n_out=CHART_WIDTH, by="district", method="lttb"):
+    """Rows of long-format `df` reduced to at most ~`n_out` per `by` group."""
+    pick = METHODS[method]
+    df = df.dropna(subset=[y]).sort_values([by, x]).reset_index(drop=True)
+    xs = df[x].values
+    if np.issubdtype(xs.dtype, np.datetime64):
+        xs = xs.astype("datetime64[ns]").astype(np.int64)
+    ys = df[y].values
+    keep = [rows[pick(xs[rows], ys[rows], n_out)]
+            for rows in df.groupby(by, sort=False).indices.values()]
+    if not keep:
+        return df
+    return df.iloc[np.concatenate(keep)].reset_index(drop=True)
+
+
+def history_figure(df, x, y, by="district", title=None, labels=None,
+                   visible=MAX_VISIBLE_TRACES, n_out=CHART_WIDTH, method="lttb"):
+    """
+    One WebGL line figure with a trace per `by` group, each downsampled to
+    `n_out` points. Groups after the first `visible` start hidden and are
+    switched on from the legend.
+    """
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    fig = go.Figure()
+    small = downsample(df, x, y, n_out, by, method)
+    for i, (name, group) in enumerate(small.groupby(by, sort=False)):
+        fig.add_trace(go.Scattergl(
+            x=group[x], y=group[y], mode="lines", name=str(name),
+            visible=True if i < visible else "legendonly",
+        ))
+    fig.update_layout(
+        title=title,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y),
+        legend_title_text=labels.get(by, by),
+        hovermode="x unified",
+    )
+    return fig
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def synthetic_history(districts=27, start="2001-01-01", end=None, freq="16D", seed=0):
+    """Seasonal NDVI-like composites for `districts` districts."""
+    dates = pd.date_range(start, end or pd.Timestamp.today(), freq=freq)
+    rng = np.random.default_rng(seed)
+    phase = 2 * np.pi * dates.dayofyear.values / 365.25
+    frames = [pd.DataFrame({
+        "district": f"District-{d}",
+        "date": dates,
+        "NDVI": 0.35 + 0.2 * np.sin(phase + rng.uniform(0, 2 * np.pi)) + rng.normal(0, 0.04, len(dates)),
+    }) for d in range(districts)]
+    return pd.concat(frames, ignore_index=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Downsampling cost and payload for long histories")
+    parser.add_argument("--districts", type=int, default=27)
+    parser.add_argument("--freq", default="16D", help="composite spacing, e.g. 16D or 1D")
+    parser.add_argument("--width", type=int, default=CHART_WIDTH)
+    args = parser.parse_args(argv)
+
+    df = synthetic_history(args.districts, freq=args.freq)
+    print(f"{len(df)} points, {args.districts} districts")
+    for method in METHODS:
+        t0 = time.perf_counter()
+        small = downsample(df, "date", "NDVI", args.width, method=method)
+        elapsed = time.perf_counter() - t0
+        raw = len(df.to_json(orient="split", date_format="iso"))
+        sent = len(small.to_json(orient="split", date_format="iso"))
+        print(f"{method:<7} {len(small):>7} points  {elapsed * 1000:7.1f} ms  "
+              f"payload {raw / 1024:8.0f} KB -> {sent / 1024:6.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
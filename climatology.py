@@ -0,0 +1,160 @@
+import argparse
+import os
+
+import pandas as pd
+
+from ee_stats import (
+    ee_backend, district_means, records_frame, zonal_records, ERA5_MONTHLY_AGGR, PRECIP_BAND,
+)
+
+# -----------------------------
+# 2001–2020 Precipitation Climatology
+# -----------------------------
+BASELINE_START, BASELINE_END = 2001, 2020
+BASELINE_TAG = f"climatology_{BASELINE_START}_{BASELINE_END}"
+# Optional exported 12-band asset (bands p01..p12); built with `python climatology.py export`
+CLIMATOLOGY_ASSET = os.environ.get("SINDH_CLIMATOLOGY_ASSET")
+M_TO_MM = 1000
+
+_asset_exists = {}
+_baselines = {}
+
+
+def band_name(month):
+    return f"p{month:02d}"
+
+
+def asset_available(asset_id, backend=None):
+    """Check once per process whether the exported climatology asset exists."""
+    if not asset_id:
+        return False
+    if asset_id not in _asset_exists:
+        ee = ee_backend(backend)
+        try:
+            _asset_exists[asset_id] = ee.data.getInfo(asset_id) is not None
+        except Exception:
+            _asset_exists[asset_id] = False
+    return _asset_exists[asset_id]
+
+
+def computed_baseline(month, backend=None):
+    """Mean precipitation of one calendar month over the baseline years (20 images)."""
+    ee = ee_backend(backend)
+    return (
+        ee.ImageCollection(ERA5_MONTHLY_AGGR)
+        .select(PRECIP_BAND)
+        .filter(ee.Filter.calendarRange(BASELINE_START, BASELINE_END, "year"))
+        .filter(ee.Filter.calendarRange(month, month, "month"))
+        .mean()
+    )
+
+
+def baseline_image(month, asset_id=CLIMATOLOGY_ASSET, backend=None):
+    """
+    Same-calendar-month baseline, read from the exported asset when present.
+
+    Built once per process; the band is renamed to PRECIP_BAND so it can be
+    subtracted from a monthly ERA5-Land image directly.
+    """
+    key = (month, asset_id if asset_available(asset_id, backend) else None)
+    if key not in _baselines:
+        ee = ee_backend(backend)
+        if key[1]:
+            image = ee.Image(asset_id).select([band_name(month)], [PRECIP_BAND])
+        else:
+            image = computed_baseline(month, backend)
+        _baselines[key] = image
+    return _baselines[key]
+
+
+def climatology_stack(backend=None):
+    """All 12 baselines as one image with bands p01..p12, ready for export."""
+    ee = ee_backend(backend)
+    bands = [computed_baseline(m, backend).rename(band_name(m)) for m in range(1, 13)]
+    return ee.Image.cat(bands)
+
+
+def export_climatology(asset_id, geom, scale=10000, backend=None):
+    """Start an EE export task that writes the 12-band climatology to an asset."""
+    ee = ee_backend(backend)
+    task = ee.batch.Export.image.toAsset(
+        image=climatology_stack(backend).clip(geom),
+        description="sindh_precip_climatology",
+        assetId=asset_id,
+        region=geom,
+        scale=scale,
+        maxPixels=1e9,
+    )
+    task.start()
+    return task
+
+
+def district_baseline(gdf, month, name_col="NAME_2", fc=None, cache=None, backend=None):
+    """Baseline precipitation (mm) of every district for one calendar month."""
+    from ee_cache import geometry_hash
+
+    def compute():
+        return zonal_records(baseline_image(month, backend=backend), gdf, PRECIP_BAND,
+                             10000, name_col, fc, backend,
+                             key=("baseline", BASELINE_TAG, month, name_col, geometry_hash(gdf)))
+
+    if cache is None:
+        records = compute()
+    else:
+        # The baseline period is closed, so this is stored permanently
+        records = cache.get_or_compute(
+            f"{ERA5_MONTHLY_AGGR}:{BASELINE_TAG}", PRECIP_BAND, "mean", geometry_hash(gdf),
+            f"{BASELINE_START}-01-01", f"{BASELINE_END + 1}-01-01", compute,
+            scale=10000, name_col=name_col, calendar_month=month,
+        )
+    df = records_frame(records, PRECIP_BAND, name_col)
+    df[PRECIP_BAND] = df[PRECIP_BAND] * M_TO_MM
+    return df
+
+
+def district_anomaly(gdf, year, month, name_col="NAME_2", fc=None, cache=None, rain_mm=None,
+                     backend=None):
+    """
+    Monthly precipitation vs. the same calendar month's 2001–2020 baseline.
+
+    `rain_mm` (one value per gdf row, e.g. from the local archive) skips the
+    Earth Engine query for the month itself. Returns one row per district
+    with rain_mm, baseline_mm, anomaly_mm and anomaly_pct.
+    """
+    if rain_mm is None:
+        current = district_means(gdf, ERA5_MONTHLY_AGGR, PRECIP_BAND, year, month, 10000,
+                                 name_col=name_col, fc=fc, cache=cache, backend=backend)
+        rain_mm = current[PRECIP_BAND].values * M_TO_MM
+    baseline = district_baseline(gdf, month, name_col=name_col, fc=fc, cache=cache, backend=backend)
+
+    df = pd.DataFrame({
+        "District": baseline.index,
+        "rain_mm": rain_mm,
+        "baseline_mm": baseline[PRECIP_BAND].values,
+    })
+    df["anomaly_mm"] = df["rain_mm"] - df["baseline_mm"]
+    df["anomaly_pct"] = 100 * df["anomaly_mm"] / df["baseline_mm"].where(df["baseline_mm"] > 0)
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precipitation climatology (2001–2020)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="export the 12-band baseline to an EE asset")
+    export.add_argument("--asset", required=True)
+    export.add_argument("--geojson", default="sindh_with_indus_sea.geojson")
+    export.add_argument("--project", default=os.environ.get("GEE_PROJECT_ID"))
+    args = parser.parse_args(argv)
+
+    import ee
+    import geopandas as gpd
+
+    ee.Initialize(project=args.project)
+    gdf = gpd.read_file(args.geojson)
+    geom = ee.Geometry(gdf.geometry.unary_union.__geo_interface__)
+    task = export_climatology(args.asset, geom)
+    print(f"Started export task {task.id} -> {args.asset}")
+
+
+if __name__ == "__main__":
+    main()
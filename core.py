@@ -0,0 +1,142 @@
+import datetime
+import json
+import threading
+import time
+
+import pandas as pd
+
+from advisory import (
+    CROP_WATER_REQUIREMENT, FLOOD_THRESHOLD, advisory_table, apply_grid_flood_risk,
+    sowing_status,
+)
+from forecast import cached_forecasts
+from flood_grid import antecedent_soil_moisture, get_flood_grid
+from forecast_store import get_forecast_store
+from units import get_unit_index, grid_forecasts
+
+# -----------------------------
+# Advisory Core (shared by the Streamlit page and the JSON API)
+# -----------------------------
+SNAPSHOT_TTL = 300   # seconds an advisory snapshot is served before it is rebuilt
+
+
+def district_advisories(unit_index, forecasts, gdf, river_gdf=None, geom_hash=None,
+                        fetch=cached_forecasts, cache=None, ee_available=None, backend=None):
+    """
+    Irrigation / heat / flood advisories for every unit × crop from
+    {gdf row: forecast}, with the flood level taken from the gridded engine
+    when it can run. Returns {"table", "flood", "soil_period", "flood_error"}.
+    """
+    store = get_forecast_store(forecasts, unit_index.names)
+    names, arr = store.advisory_array()
+    table = advisory_table(names, arr, rows=store.keys)
+    result = {"table": table, "flood": pd.DataFrame(), "soil_period": None, "flood_error": None}
+    try:
+        grid = get_flood_grid(unit_index, gdf.total_bounds, river_gdf)
+        soil, result["soil_period"] = antecedent_soil_moisture(
+            gdf, geom_hash, name_col=unit_index.name_col, cache=cache, ee_available=ee_available,
+            backend=backend)
+        result["flood"] = grid.district_risk(fetch(grid.grid_locations()), soil)
+        result["table"] = apply_grid_flood_risk(table, result["flood"])
+    except Exception as e:
+        result["flood_error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _records(df):
+    """DataFrame -> JSON-ready records (NaN -> null, numpy scalars -> Python)."""
+    return json.loads(df.to_json(orient="records"))
+
+
+class AdvisoryService:
+    """
+    Headless advisories for all units from the same forecast/EE caches the
+    page uses. One snapshot is built per `ttl` (concurrent callers wait for
+    the same build) and serialized responses are memoized per snapshot, so
+    a burst of requests costs one computation.
+    """
+
+    def __init__(self, sindh_path=None, river_path=None, fetch=cached_forecasts, cache=None,
+                 ee_available=None, ttl=SNAPSHOT_TTL, aliases=None):
+        from bootstrap import load_geometries
+        from ee_cache import geometry_hash
+
+        geometries = load_geometries(sindh_path, river_path)
+        self.gdf = geometries["sindh"]
+        self.river_gdf = geometries["river"]
+        self.geom_hash = geometry_hash(self.gdf)
+        self.units = get_unit_index(self.gdf, aliases=aliases)
+        self.fetch = fetch
+        self.cache = cache
+        self.ee_available = ee_available
+        self.ttl = ttl
+        self.stats = {"snapshots": 0, "served": 0, "memo_hits": 0}
+        self._snapshot = None
+        self._responses = {}
+        self._build_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def snapshot_fresh(self):
+        snap = self._snapshot
+        return snap is not None and time.monotonic() - snap["built"] < self.ttl
+
+    def snapshot(self):
+        if self.snapshot_fresh():
+            return self._snapshot
+        with self._build_lock:
+            if self.snapshot_fresh():
+                return self._snapshot
+            forecasts = grid_forecasts(self.units, self.fetch)
+            result = district_advisories(self.units, forecasts, self.gdf, self.river_gdf,
+                                         self.geom_hash, self.fetch, self.cache, self.ee_available)
+            snap = {**result, "built": time.monotonic(),
+                    "generated": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")}
+            with self._lock:
+                self._snapshot = snap
+                self._responses = {}
+                self.stats["snapshots"] += 1
+            return snap
+
+    def advisories(self, crop=None, district=None, today=None):
+        """JSON-ready advisories, optionally for one crop and/or one district (any spelling)."""
+        if crop is not None and crop not in CROP_WATER_REQUIREMENT:
+            raise ValueError(f"unknown crop {crop!r}; expected one of {sorted(CROP_WATER_REQUIREMENT)}")
+        snap = self.snapshot()
+        table = snap["table"]
+        if crop is not None:
+            table = table[table["Crop"] == crop]
+        if district is not None:
+            name = self.units.resolve(district)
+            if name is None:
+                raise LookupError(f"unknown district {district!r}")
+            table = table[table["District"] == name]
+        crops = [crop] if crop else list(CROP_WATER_REQUIREMENT)
+        return {
+            "generated": snap["generated"],
+            "flood_threshold_mm": FLOOD_THRESHOLD,
+            "flood_model": "grid" if snap["flood_error"] is None else "district_total",
+            "soil_moisture_month": "%04d-%02d" % snap["soil_period"] if snap["soil_period"] else None,
+            "sowing": [sowing_status(c, today) for c in crops],
+            "advisories": _records(table),
+        }
+
+    def advisories_json(self, crop=None, district=None):
+        """Serialized `advisories`, memoized per canonical district until the next snapshot."""
+        if district is not None:
+            name = self.units.resolve(district)
+            if name is None:
+                raise LookupError(f"unknown district {district!r}")
+            district = name
+        snap = self.snapshot()
+        key = (id(snap), crop, district)
+        with self._lock:
+            body = self._responses.get(key)
+            self.stats["served"] += 1
+            if body is not None:
+                self.stats["memo_hits"] += 1
+                return body
+        body = json.dumps(self.advisories(crop, district)).encode()
+        with self._lock:
+            if self._snapshot is snap:
+                self._responses[key] = body
+        return body
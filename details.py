@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# -----------------------------
+# On-demand District Details
+# -----------------------------
+DETAIL_TTL = 3600   # seconds; forecasts refresh hourly, so details do too
+
+
+def clicked_unit(map_state, unit_index):
+    """
+    gdf row of the unit the user last clicked on the map: the unit containing
+    the clicked position (works with static boundary tiles too).
+    `last_active_drawing` keeps the last feature clicked even after a click
+    elsewhere, so its row is only used when the position is outside every
+    unit. None before the first click.
+    """
+    if not map_state:
+        return None
+    point = map_state.get("last_clicked")
+    if point:
+        row = int(unit_index.locate_rows([point["lat"]], [point["lng"]])[0])
+        if row >= 0:
+            return row
+    feature = map_state.get("last_active_drawing") or {}
+    row = (feature.get("properties") or {}).get("row")
+    return row if isinstance(row, int) and 0 <= row < len(unit_index) else None
+
+
+def forecast_summary(forecast):
+    """Mean daily max temperature and 7-day rain total of one forecast."""
+    daily = (forecast or {}).get("daily", {})
+    temps = [t for t in daily.get("temperature_2m_max", []) if t is not None]
+    rains = [r for r in daily.get("precipitation_sum", []) if r is not None]
+    if not temps or not rains:
+        return {}
+    return {"avg_temp_max": float(np.mean(temps)), "rain_7d": float(np.sum(rains))}
+
+
+class DetailCache:
+    """
+    Details per (gdf row, year, month), computed the first time a unit is
+    clicked for that period and reused until `ttl` expires. Bounded LRU.
+    """
+
+    def __init__(self, ttl=DETAIL_TTL, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["misses"] += 1
+        value = compute()
+        with self._lock:
+            self._entries[key] = (now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+def district_detail(unit_index, row, year, month, forecasts, ndvi_by_row, cache=None):
+    """
+    {"name", "ndvi", "avg_temp_max", "rain_7d"} for the unit at gdf `row`, with
+    `forecasts` keyed by gdf row. `ndvi_by_row(year, month)` returns {gdf row: NDVI}
+    for the period and is only called on a cache miss.
+    If it fails the forecast part is still returned (with "error") and
+    nothing is memoized, so the next click retries.
+    """
+    def compute():
+        ndvi = ndvi_by_row(year, month).get(row)
+        return {"name": name, "ndvi": None if ndvi is None or np.isnan(ndvi) else float(ndvi),
+                **forecast_summary(forecasts.get(row))}
+
+    name = unit_index.names[row]
+    try:
+        return compute() if cache is None else cache.get((row, year, month), compute)
+    except Exception as e:
+        return {"name": name, "ndvi": None, "error": str(e), **forecast_summary(forecasts.get(row))}
+
+
+_cache = None
+
+
+def get_detail_cache():
+    """Process-wide detail cache shared by every session."""
+    global _cache
+    if _cache is None:
+        _cache = DetailCache()
+    return _cache
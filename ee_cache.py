@@ -0,0 +1,215 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from instrument import record_cache
+
+# -----------------------------
+# Persistent Earth Engine Result Cache
+# -----------------------------
+CACHE_DIR = os.environ.get("SINDH_CACHE_DIR", ".cache")
+DB_PATH = os.path.join(CACHE_DIR, "ee_results.sqlite")
+CURRENT_PERIOD_TTL = 6 * 3600       # seconds; closed months never expire
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def geometry_hash(geom):
+    """
+    Stable hash of a geometry: shapely geometry, GeoSeries/GeoDataFrame or
+    a GeoJSON-like dict.
+    """
+    if hasattr(geom, "geometry") and hasattr(geom.geometry, "to_wkb"):
+        payload = b"".join(geom.geometry.to_wkb())
+    elif hasattr(geom, "to_wkb"):
+        payload = b"".join(geom.to_wkb())
+    elif hasattr(geom, "wkb"):
+        payload = geom.wkb
+    else:
+        payload = json.dumps(geom, sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def period_is_closed(end, today=None):
+    """A period is closed once its (exclusive) end date is on or before today."""
+    today = today or datetime.date.today()
+    if isinstance(end, str):
+        end = datetime.date.fromisoformat(end[:10])
+    return end <= today
+
+
+def month_range(year, month):
+    """ISO (start, exclusive end) of a calendar month."""
+    start = datetime.date(year, month, 1)
+    end = datetime.date(year + (month == 12), month % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+class EECache:
+    """
+    Content-addressed SQLite cache for numeric Earth Engine results.
+
+    The key combines collection ID, band, reducer, geometry hash and date
+    range (plus any extra params such as scale). Results for closed periods
+    are stored permanently; open periods expire after `ttl` seconds. Total
+    stored bytes are bounded by evicting least recently used rows.
+    """
+
+    def __init__(self, path=DB_PATH, ttl=CURRENT_PERIOD_TTL, max_bytes=MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " expires REAL, accessed REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(dataset, band, reducer, geometry, start, end, **params):
+        parts = {"dataset": dataset, "band": band, "reducer": reducer,
+                 "geometry": geometry, "start": str(start), "end": str(end), **params}
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute("SELECT value, expires FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                with self._lock:
+                    self.stats["misses"] += 1
+                record_cache("ee_cache", "miss")
+                return None
+            db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        with self._lock:
+            self.stats["hits"] += 1
+        record_cache("ee_cache", "hit")
+        return json.loads(row[0])
+
+    def put(self, key, value, closed):
+        now = time.time()
+        text = json.dumps(value)
+        expires = None if closed else now + self.ttl
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, expires, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, text, len(text), expires, now),
+            )
+            self._evict(db)
+
+    def _evict(self, db):
+        db.execute("DELETE FROM results WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            with self._lock:
+                self.stats["evictions"] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_or_compute(self, dataset, band, reducer, geometry, start, end, compute, **params):
+        """Return the cached value for this query, calling `compute()` on a miss."""
+        key = self.make_key(dataset, band, reducer, geometry, start, end, **params)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            if value is not None:
+                self.put(key, value, closed=period_is_closed(end))
+        return value
+
+    def info(self):
+        with self._connect() as db:
+            rows, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": rows, "bytes": size, **self.stats}
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM results")
+
+
+_default_cache = None
+
+
+def get_cache():
+    """Process-wide cache instance shared by the app and the CLI."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EECache()
+    return _default_cache
+
+
+# -----------------------------
+# CLI: prewarm / info / clear
+# -----------------------------
+def prewarm(years, geojson, project, cache=None, name_col=None):
+    """
+    Fill the cache with monthly NDVI, soil moisture and precipitation of
+    every unit, keyed exactly as the app reads them (same geometries, same
+    unit name column).
+    """
+    import ee
+    import ee_stats
+    from bootstrap import load_geometries
+    from units import get_unit_index
+
+    ee.Initialize(project=project)
+    cache = cache or get_cache()
+    gdf = load_geometries(geojson)["sindh"]
+    name_col = name_col or get_unit_index(gdf).name_col
+    fc = ee_stats.districts_fc(gdf, name_col)
+    today = datetime.date.today()
+
+    for year in years:
+        for month in range(1, 13):
+            if datetime.date(year, month, 1) > today:
+                break
+            for collection, band, scale in ee_stats.MONTHLY_DISTRICT_LAYERS:
+                t0 = time.perf_counter()
+                ee_stats.district_means(gdf, collection, band, year, month, scale,
+                                        name_col=name_col, fc=fc, cache=cache)
+                print(f"{year}-{month:02d} {band}: {time.perf_counter() - t0:.2f}s")
+    print(cache.info())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Earth Engine result cache")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    warm = sub.add_parser("prewarm", help="precompute monthly district stats for a range of years")
+    warm.add_argument("--start-year", type=int, required=True)
+    warm.add_argument("--end-year", type=int, default=datetime.date.today().year)
+    warm.add_argument("--geojson", default="sindh_with_indus_sea.geojson")
+    warm.add_argument("--project", default=os.environ.get("GEE_PROJECT_ID"))
+    warm.add_argument("--name-col", default=None, help="unit name column (default: the app's unit column)")
+
+    sub.add_parser("info", help="show entry count, size and counters")
+    sub.add_parser("clear", help="delete every cached result")
+
+    args = parser.parse_args(argv)
+    cache = get_cache()
+    if args.command == "prewarm":
+        prewarm(range(args.start_year, args.end_year + 1), args.geojson, args.project, cache, args.name_col)
+    elif args.command == "info":
+        print(cache.info())
+    elif args.command == "clear":
+        cache.clear()
+
+
+if __name__ == "__main__":
+    main()
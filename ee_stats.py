@@ -0,0 +1,122 @@
+import json
+
+import pandas as pd
+
+from instrument import span
+from outbound import ee_call
+
+# -----------------------------
+# Earth Engine Zonal Statistics
+# -----------------------------
+NDVI_COLLECTION = "MODIS/061/MOD13Q1"
+NDVI_BAND = "NDVI"
+NDVI_SCALE_FACTOR = 10000
+ERA5_MONTHLY = "ECMWF/ERA5_LAND/MONTHLY"
+SOIL_MOISTURE_BAND = "volumetric_soil_water_layer_1"
+ERA5_MONTHLY_AGGR = "ECMWF/ERA5_LAND/MONTHLY_AGGR"
+PRECIP_BAND = "total_precipitation_sum"
+
+# (collection, band, scale) of every monthly per-district statistic
+MONTHLY_DISTRICT_LAYERS = [
+    (NDVI_COLLECTION, NDVI_BAND, 500),
+    (ERA5_MONTHLY, SOIL_MOISTURE_BAND, 10000),
+    (ERA5_MONTHLY_AGGR, PRECIP_BAND, 10000),
+]
+
+
+def ee_backend(backend):
+    """Real `ee` module unless a fake backend is injected (offline use)."""
+    if backend is not None:
+        return backend
+    import ee
+    return ee
+
+
+def districts_fc(gdf, name_col="NAME_2", backend=None):
+    """One FeatureCollection holding every district polygon, tagged with its row."""
+    ee = ee_backend(backend)
+    features = [
+        ee.Feature(ee.Geometry(row["geometry"].__geo_interface__),
+                   {"row": int(i), name_col: row.get(name_col, f"District-{i}")})
+        for i, (_, row) in enumerate(gdf.iterrows())
+    ]
+    return ee.FeatureCollection(features)
+
+
+def monthly_mean(collection_id, band, year, month, backend=None):
+    """Mean image of one band over a calendar month."""
+    ee = ee_backend(backend)
+    start = ee.Date.fromYMD(year, month, 1)
+    end = start.advance(1, "month")
+    return ee.ImageCollection(collection_id).filterDate(start, end).select(band).mean()
+
+
+def zonal_records(image, gdf, band, scale, name_col, fc, backend, key=None):
+    ee = ee_backend(backend)
+    fc = fc if fc is not None else districts_fc(gdf, name_col, backend=backend)
+    reduced = image.reduceRegions(
+        collection=fc,
+        reducer=ee.Reducer.mean(),
+        scale=scale,
+    ).select(["row", name_col, "mean"], retainGeometry=False)
+
+    with span("ee.reduceRegions", band=band) as sp:
+        info = ee_call(reduced.getInfo, key=key)
+        sp.bytes = len(json.dumps(info))
+    return [
+        {"row": f["properties"]["row"],
+         name_col: f["properties"].get(name_col),
+         band: f["properties"].get("mean")}
+        for f in info["features"]
+    ]
+
+
+def records_frame(records, band, name_col):
+    df = pd.DataFrame(records, columns=["row", name_col, band])
+    df[band] = pd.to_numeric(df[band])
+    return df.sort_values("row").set_index(name_col)
+
+
+def zonal_means(image, gdf, band, scale, name_col="NAME_2", fc=None, backend=None):
+    """
+    Mean of `image` in every district with a single reduceRegions + getInfo.
+
+    Returns a DataFrame indexed by `name_col` with the gdf row position in
+    "row" and the district mean in `band` (NaN where the polygon is empty).
+    """
+    records = zonal_records(image, gdf, band, scale, name_col, fc, backend)
+    return records_frame(records, band, name_col)
+
+
+def district_means(gdf, collection_id, band, year, month, scale, name_col="NAME_2",
+                   fc=None, cache=None, backend=None):
+    """
+    Monthly mean of `band` for every district, optionally through an EECache.
+
+    Cached results are keyed by collection, band, reducer, the hash of the
+    district geometries and the month, so closed months are fetched once.
+    """
+    from ee_cache import geometry_hash
+
+    def compute():
+        image = monthly_mean(collection_id, band, year, month, backend=backend)
+        # identical concurrent queries (other sessions, prefetch) share one getInfo
+        key = ("mean", collection_id, band, year, month, scale, name_col, geometry_hash(gdf))
+        return zonal_records(image, gdf, band, scale, name_col, fc, backend, key=key)
+
+    if cache is None:
+        records = compute()
+    else:
+        from ee_cache import month_range
+        start, end = month_range(year, month)
+        records = cache.get_or_compute(collection_id, band, "mean", geometry_hash(gdf),
+                                       start, end, compute, scale=scale, name_col=name_col)
+    return records_frame(records, band, name_col)
+
+
+def district_ndvi(gdf, year, month, name_col="NAME_2", fc=None, cache=None, backend=None):
+    """Monthly mean MODIS NDVI (scaled to -1..1) for every district in one EE call."""
+    df = district_means(gdf, NDVI_COLLECTION, NDVI_BAND, year, month, scale=500,
+                        name_col=name_col, fc=fc, cache=cache, backend=backend)
+    df[NDVI_BAND] = df[NDVI_BAND] / NDVI_SCALE_FACTOR
+    return df
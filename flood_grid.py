@@ -0,0 +1,217 @@
+import argparse
+import datetime
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from advisory import FLOOD_THRESHOLD, FLOOD_WATCH_FRACTION, RAIN, forecast_array
+
+# -----------------------------
+# Gridded Flood Risk
+# -----------------------------
+GRID_STEP = 0.25            # degrees; ~400 forecast cells over Sindh, one batched request
+RAIN_3D_THRESHOLD = 50      # mm in any 3 consecutive days
+SOIL_DRY, SOIL_SATURATED = 0.10, 0.40   # m³/m³, ERA5-Land top layer
+RIVER_DECAY_KM = 10         # proximity weight falls to 1/e this far from the river
+SOIL_WEIGHT = 0.5           # saturated soil raises the score by up to 50%
+RIVER_WEIGHT = 0.5          # so does lying on the river
+METRIC_CRS = 32642          # UTM 42N, for river distances in metres
+
+
+class FloodGrid:
+    """
+    Regular forecast grid over the province with everything that does not
+    depend on the forecast precomputed once: the unit each cell falls in,
+    and each cell's distance to the river.
+
+    Units too small to contain a cell centre get the cell around their
+    representative point, so every unit is scored.
+    """
+
+    def __init__(self, unit_index, bounds, river_geom=None, step=GRID_STEP):
+        self.unit_index = unit_index
+        self.step = step
+        lats = np.arange(np.floor(bounds[1] / step) * step, bounds[3] + step, step)
+        lons = np.arange(np.floor(bounds[0] / step) * step, bounds[2] + step, step)
+        grid_lats, grid_lons = (a.ravel() for a in np.meshgrid(lats, lons, indexing="ij"))
+        rows = unit_index.locate_rows(grid_lats, grid_lons)
+        inside = rows >= 0
+
+        # One extra cell for every unit that no cell centre fell into
+        missing = np.setdiff1d(np.arange(len(unit_index)), rows[inside])
+        cell_lats = np.concatenate([grid_lats[inside], np.round(unit_index.lats[missing] / step) * step])
+        cell_lons = np.concatenate([grid_lons[inside], np.round(unit_index.lons[missing] / step) * step])
+        self.cell_row = np.concatenate([rows[inside], missing])
+        self.cells = list(zip(np.round(cell_lats, 4).tolist(), np.round(cell_lons, 4).tolist()))
+        self.river_km = self._river_distance(cell_lats, cell_lons, river_geom)
+        self.proximity = np.exp(-self.river_km / RIVER_DECAY_KM)
+        self.cell_counts = np.bincount(self.cell_row, minlength=len(unit_index))
+
+    @staticmethod
+    def _river_distance(lats, lons, river_geom):
+        if river_geom is None:
+            return np.full(len(lats), np.inf)
+        import geopandas as gpd
+        import shapely
+
+        points = gpd.GeoSeries(shapely.points(lons, lats), crs=4326).to_crs(METRIC_CRS)
+        river = gpd.GeoSeries([river_geom], crs=4326).to_crs(METRIC_CRS).iloc[0]
+        return shapely.distance(points.values, river) / 1000
+
+    def __len__(self):
+        return len(self.cells)
+
+    def grid_locations(self):
+        """{cell: (lat, lon)} of every scored cell (duplicates share one fetch)."""
+        return {cell: cell for cell in self.cells}
+
+    def cell_scores(self, rain, soil_by_row=None):
+        """
+        Score per cell from a (cells × days) rain array. 1.0 is the flood
+        threshold: either 7-day rain at FLOOD_THRESHOLD or any 3-day spell at
+        RAIN_3D_THRESHOLD on dry soil far from the river. Wet soil and river
+        proximity scale it up.
+        """
+        filled = np.nan_to_num(rain)
+        rain_7d = filled.sum(axis=1)
+        window = min(3, filled.shape[1])
+        csum = np.cumsum(np.pad(filled, ((0, 0), (1, 0))), axis=1)
+        rain_3d = (csum[:, window:] - csum[:, :-window]).max(axis=1) if filled.shape[1] else rain_7d
+
+        if soil_by_row is None:
+            wetness = np.zeros(len(self.cells))
+        else:
+            soil = np.asarray(soil_by_row, dtype=float)[self.cell_row]
+            wetness = np.nan_to_num(np.clip((soil - SOIL_DRY) / (SOIL_SATURATED - SOIL_DRY), 0, 1))
+
+        intensity = np.maximum(rain_7d / FLOOD_THRESHOLD, rain_3d / RAIN_3D_THRESHOLD)
+        score = intensity * (1 + SOIL_WEIGHT * wetness + RIVER_WEIGHT * self.proximity)
+        return score, rain_7d
+
+    def district_risk(self, cell_forecasts, soil_by_row=None):
+        """
+        Per-unit flood risk from {cell: forecast}: the worst cell decides the
+        level, with mean score and share of High cells alongside.
+        """
+        _, arr = forecast_array({i: cell_forecasts.get(c) for i, c in enumerate(self.cells)})
+        has_data = ~np.all(np.isnan(arr[:, :, RAIN]), axis=1)
+        score, rain_7d = self.cell_scores(arr[:, :, RAIN], soil_by_row)
+        score = np.where(has_data, score, np.nan)
+
+        n = len(self.unit_index)
+        rows = self.cell_row[has_data]
+        max_score = np.full(n, np.nan)
+        max_rain = np.full(n, np.nan)
+        np.fmax.at(max_score, rows, score[has_data])
+        np.fmax.at(max_rain, rows, rain_7d[has_data])
+        counted = np.bincount(rows, minlength=n)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_score = np.bincount(rows, weights=score[has_data], minlength=n) / counted
+            high_share = 100 * np.bincount(rows, weights=score[has_data] >= 1, minlength=n) / counted
+
+        risk = np.select([max_score >= 1, max_score >= FLOOD_WATCH_FRACTION], ["High", "Moderate"], "Low")
+        df = pd.DataFrame({
+            "District": self.unit_index.names,
+            "Row": np.arange(n),
+            "Cells": self.cell_counts,
+            "Max Rain 7d (mm)": max_rain,
+            "Flood Score": max_score,
+            "Mean Score": mean_score,
+            "High Cells (%)": high_share,
+            "Flood Risk": risk,
+        })
+        return df[counted > 0].reset_index(drop=True)
+
+
+_grids = {}
+_lock = threading.Lock()
+
+
+def get_flood_grid(unit_index, bounds, river_gdf=None, step=GRID_STEP):
+    """Process-wide FloodGrid per unit set."""
+    key = (id(unit_index), tuple(np.round(bounds, 4)), river_gdf is not None, step)
+    with _lock:
+        if key not in _grids:
+            river = river_gdf.geometry.union_all() if river_gdf is not None else None
+            _grids[key] = FloodGrid(unit_index, bounds, river, step)
+        return _grids[key]
+
+
+# -----------------------------
+# Antecedent soil moisture (archive, then EE cache)
+# -----------------------------
+def antecedent_months(today=None, lookback=3):
+    """Closed months, most recent first (ERA5-Land monthly lags by a few weeks)."""
+    today = today or datetime.date.today()
+    y, m = today.year, today.month
+    out = []
+    for _ in range(lookback):
+        y, m = (y - 1, 12) if m == 1 else (y, m - 1)
+        out.append((y, m))
+    return out
+
+
+def antecedent_soil_moisture(gdf, geom_hash, name_col="NAME_2", cache=None, ee_available=None,
+                             today=None, backend=None):
+    """
+    (soil moisture per gdf row, (year, month)) for the latest closed month
+    that has data, or (None, None). The local archive is tried first; Earth
+    Engine (through `cache`) only if `ee_available()` says it can be used.
+    """
+    from archive import read_month
+    from ee_stats import district_means, ERA5_MONTHLY, SOIL_MOISTURE_BAND
+
+    for y, m in antecedent_months(today):
+        archived = read_month("soil_moisture", y, m, geom_hash, name_col=name_col)
+        if archived is not None:
+            values = np.full(len(gdf), np.nan)
+            values[archived["row"].astype(int).values] = archived["value"].values
+            return values, (y, m)
+    if ee_available is None or not ee_available():
+        return None, None
+    for y, m in antecedent_months(today):
+        df = district_means(gdf, ERA5_MONTHLY, SOIL_MOISTURE_BAND, y, m, 10000,
+                            name_col=name_col, cache=cache, backend=backend)
+        if df[SOIL_MOISTURE_BAND].notna().any():
+            values = np.full(len(gdf), np.nan)
+            values[df["row"].astype(int).values] = df[SOIL_MOISTURE_BAND].values
+            return values, (y, m)
+    return None, None
+
+
+# -----------------------------
+# Benchmark
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the gridded flood-risk engine on synthetic forecasts")
+    parser.add_argument("--step", type=float, default=GRID_STEP)
+    args = parser.parse_args(argv)
+
+    from advisory import synthetic_forecasts
+    from bootstrap import load_geometries
+    from units import get_unit_index
+
+    geometries = load_geometries()
+    sindh = geometries["sindh"]
+    t0 = time.perf_counter()
+    unit_index = get_unit_index(sindh)
+    grid = get_flood_grid(unit_index, sindh.total_bounds, geometries["river"], args.step)
+    build = time.perf_counter() - t0
+
+    forecasts = synthetic_forecasts(len(grid))
+    cell_forecasts = dict(zip(grid.cells, forecasts.values()))
+    soil = np.random.default_rng(0).uniform(0.05, 0.45, len(unit_index))
+    t0 = time.perf_counter()
+    df = grid.district_risk(cell_forecasts, soil)
+    score = time.perf_counter() - t0
+
+    print(f"{len(grid)} cells, {len(unit_index)} units")
+    print(f"grid + index + river distance (once per process): {build * 1000:.0f} ms")
+    print(f"score + aggregate per render:                     {score * 1000:.1f} ms")
+    print(df.sort_values("Flood Score", ascending=False).head(10).round(2).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrument import record_cache, span
+from outbound import OutboundError, check_status, get_service
+
+# -----------------------------
+# Open-Meteo Forecast Client
+# -----------------------------
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+DAILY_VARS = [
+    "temperature_2m_max",
+    "temperature_2m_min",
+    "precipitation_sum",
+    "windspeed_10m_max",
+]
+FORECAST_DAYS = 7
+MAX_WORKERS = 8
+
+_session = None
+
+
+def get_session(pool_size=MAX_WORKERS):
+    """Shared requests session so every call reuses the same connection pool."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def forecast_params(lats, lons, forecast_days=FORECAST_DAYS):
+    return {
+        "latitude": ",".join(str(lat) for lat in lats),
+        "longitude": ",".join(str(lon) for lon in lons),
+        "daily": ",".join(DAILY_VARS),
+        "forecast_days": forecast_days,
+        "timezone": "auto",
+    }
+
+
+def _valid_forecast(r):
+    """A 2xx answer whose body is a forecast (or a list of them); only these are kept as last good."""
+    try:
+        payload = r.json()
+    except ValueError:
+        return False
+    items = payload if isinstance(payload, list) else [payload]
+    return bool(items) and all(isinstance(p, dict) and "daily" in p for p in items)
+
+
+def _timed_get(session, url, params, timeout, label):
+    """
+    GET through the shared Open-Meteo service: identical concurrent requests
+    share one response, 429/5xx are retried with backoff, any other non-2xx
+    raises StatusError, and while the breaker is open the last good
+    forecast is reused.
+    """
+    def get():
+        with span("open-meteo.forecast", request=label) as sp:
+            r = session.get(url, params=params, timeout=timeout)
+            sp.bytes = len(r.content)
+        check_status(r.status_code, r.headers.get("Retry-After"))
+        return r
+
+    t0 = time.perf_counter()
+    r = get_service("open-meteo").call((url, tuple(sorted(params.items()))), get, valid=_valid_forecast)
+    timing = {
+        "request": label,
+        "status": r.status_code,
+        "seconds": time.perf_counter() - t0,
+        "bytes": len(r.content),
+    }
+    return r, timing
+
+
+def fetch_forecast(lat, lon, url=FORECAST_URL, timeout=30, session=None):
+    """
+    Single-location forecast. Raises StatusError on a 4xx answer and
+    OutboundError once retries are exhausted with no last good response.
+    """
+    session = session or get_session()
+    r, _ = _timed_get(session, url, forecast_params([lat], [lon]), timeout, "single")
+    return r.json()
+
+
+def fetch_forecasts(locations, url=FORECAST_URL, timeout=30, max_workers=MAX_WORKERS, session=None):
+    """
+    Fetch 7-day forecasts for every {name: (lat, lon)} in one request.
+
+    Open-Meteo accepts comma-separated coordinate lists and answers with a
+    JSON list in the same order. If the batched call fails, fall back to a
+    bounded thread pool of single-location calls over the shared session.
+    Returns (forecasts keyed by name, list of per-request timings).
+    """
+    session = session or get_session()
+    names = list(locations)
+    if not names:
+        return {}, []
+
+    lats = [locations[n][0] for n in names]
+    lons = [locations[n][1] for n in names]
+    timings = []
+
+    try:
+        r, timing = _timed_get(session, url, forecast_params(lats, lons), timeout, "batch")
+        timings.append(timing)
+        if r.status_code == 200:
+            payload = r.json()
+            if isinstance(payload, dict):
+                payload = [payload]
+            if len(payload) == len(names):
+                return dict(zip(names, payload)), timings
+    except (requests.RequestException, OutboundError) as e:
+        timings.append({"request": "batch", "status": getattr(e, "status", None), "seconds": None, "bytes": 0})
+
+    def fetch_one(name):
+        lat, lon = locations[name]
+        try:
+            r, timing = _timed_get(session, url, forecast_params([lat], [lon]), timeout, name)
+        except (requests.RequestException, OutboundError) as e:
+            return name, {}, {"request": name, "status": getattr(e, "status", None), "seconds": None, "bytes": 0}
+        return name, (r.json() if r.status_code == 200 else {}), timing
+
+    forecasts = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as pool:
+        for name, data, timing in pool.map(fetch_one, names):
+            forecasts[name] = data
+            timings.append(timing)
+    return forecasts, timings
+
+
+# -----------------------------
+# Process-wide Forecast Cache
+# -----------------------------
+class ForecastCache:
+    """
+    TTL + LRU cache of forecasts keyed by rounded lat/lon and request params.
+
+    Lives at module level, so every Streamlit session in the process shares
+    it. Expired entries keep being served while a single background thread
+    refreshes them, so a slow API never blocks a render; only cold misses
+    wait on the network, and concurrent misses for one key share one fetch.
+    """
+
+    def __init__(self, fetcher=fetch_forecasts, ttl=3600, max_entries=4096, precision=2,
+                 forecast_days=FORECAST_DAYS):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.precision = precision
+        self.forecast_days = forecast_days
+        self.stats = {"hits": 0, "stale": 0, "misses": 0, "refreshes": 0, "evictions": 0}
+        self._entries = OrderedDict()   # key -> (fetched_at, data)
+        self._inflight = {}             # key -> threading.Event
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def key(self, lat, lon):
+        return (round(lat, self.precision), round(lon, self.precision),
+                tuple(DAILY_VARS), self.forecast_days)
+
+    def _store(self, key, data):
+        self._entries[key] = (time.monotonic(), data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _fetch(self, keyed):
+        """Fetch {key: (lat, lon)} upstream and store every non-empty result."""
+        data, _ = self.fetcher(keyed)
+        with self._lock:
+            for key, value in data.items():
+                if value:
+                    self._store(key, value)
+        return data
+
+    def _refresh(self, keyed):
+        try:
+            self._fetch(keyed)
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(keyed)
+                self.stats["refreshes"] += 1
+
+    def get_many(self, locations):
+        """Return {name: forecast} for {name: (lat, lon)}, fetching only cold keys."""
+        now = time.monotonic()
+        keys = {name: self.key(lat, lon) for name, (lat, lon) in locations.items()}
+        result, stale, cold, waiting = {}, {}, {}, {}
+
+        with self._lock:
+            for name, key in keys.items():
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    result[name] = entry[1]
+                    if now - entry[0] < self.ttl:
+                        self.stats["hits"] += 1
+                        record_cache("forecast_cache", "hit")
+                    else:
+                        self.stats["stale"] += 1
+                        record_cache("forecast_cache", "stale")
+                        if key not in self._refreshing:
+                            stale[key] = locations[name]
+                elif key in self._inflight:
+                    waiting[name] = self._inflight[key]
+                else:
+                    self.stats["misses"] += 1
+                    record_cache("forecast_cache", "miss")
+                    if key not in cold:
+                        self._inflight[key] = threading.Event()
+                    cold[key] = locations[name]
+            self._refreshing.update(stale)
+
+        if stale:
+            threading.Thread(target=self._refresh, args=(stale,), daemon=True).start()
+
+        if cold:
+            try:
+                self._fetch(cold)
+            finally:
+                with self._lock:
+                    for key in cold:
+                        self._inflight.pop(key).set()
+
+        for event in waiting.values():
+            event.wait()
+
+        with self._lock:
+            for name, key in keys.items():
+                if name not in result:
+                    entry = self._entries.get(key)
+                    result[name] = entry[1] if entry else {}
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+forecast_cache = ForecastCache()
+
+
+def cached_forecasts(locations):
+    """Forecasts for {name: (lat, lon)} via the shared process-wide cache."""
+    return forecast_cache.get_many(locations)
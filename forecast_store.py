@@ -0,0 +1,201 @@
+import argparse
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from advisory import VARIABLES as ADVISORY_VARIABLES
+from forecast import DAILY_VARS, FORECAST_DAYS
+
+# -----------------------------
+# Columnar Forecast Store
+# -----------------------------
+def _pad(values, days):
+    if values is not None and len(values) == days:
+        return values
+    values = list(values or [])[:days]
+    return values + [None] * (days - len(values))
+
+
+class ForecastStore:
+    """
+    Every unit's daily forecast in one (units × days × variables) float
+    array with a key -> row dict, built once per forecast refresh.
+
+    Units are looked up by their key in `forecasts` (the gdf row for unit
+    forecasts); `names` maps each key to its display name and defaults to
+    the key itself. Lookups are a dict hit, and per-unit frames and the
+    advisory engine's input are views into the array rather than copies.
+    Units sharing a forecast grid cell share one response, which is parsed
+    only once.
+    """
+
+    def __init__(self, forecasts, variables=DAILY_VARS, days=FORECAST_DAYS, dtype=np.float64, names=None):
+        self.keys = list(forecasts)
+        self.names = self.keys if names is None else [names[key] for key in self.keys]
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.variables = list(variables)
+        # Units sharing a grid cell share one response object: parse each once,
+        # padded to `days` so the whole set converts in a single np.array call
+        source = np.full(len(self.keys), -1)
+        unique, dates = {}, []
+        for i, key in enumerate(self.keys):
+            forecast = forecasts[key]
+            if not forecast:
+                continue
+            if id(forecast) not in unique:
+                daily = forecast.get("daily") or {}
+                unique[id(forecast)] = (len(unique), [_pad(daily.get(var), days) for var in self.variables])
+                if len(daily.get("time") or []) > len(dates):
+                    dates = daily["time"][:days]
+            source[i] = unique[id(forecast)][0]
+        parsed = np.array([columns for _, columns in unique.values()], dtype=dtype)
+        parsed = parsed.reshape(len(unique), len(self.variables), days).transpose(0, 2, 1)
+        self.values = np.full((len(self.names), days, len(self.variables)), np.nan, dtype=dtype)
+        self.values[source >= 0] = parsed[source[source >= 0]]
+        self.dates = np.array(dates, dtype="datetime64[D]")
+        self.has_data = ~np.all(np.isnan(self.values), axis=(1, 2))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def available(self):
+        """Keys of units that have a forecast."""
+        return [key for key, ok in zip(self.keys, self.has_data.tolist()) if ok]
+
+    def series(self, key, variable):
+        """One variable of one unit (a view)."""
+        return self.values[self.index[key], :len(self.dates), self.variables.index(variable)]
+
+    def frame(self, key, labels=None):
+        """
+        Date + one column per variable for one unit. The value columns share
+        memory with the store; `labels` renames variables.
+        """
+        block = self.values[self.index[key], :len(self.dates)]
+        columns = [(labels or {}).get(v, v) for v in self.variables]
+        df = pd.DataFrame(block, columns=columns, copy=False)
+        df.insert(0, "Date", self.dates)
+        return df
+
+    def advisory_array(self):
+        """(names, units × days × advisory variables) for advisory_table; a view when the order allows."""
+        cols = [self.variables.index(v) for v in ADVISORY_VARIABLES]
+        if cols == list(range(len(cols))):
+            return self.names, self.values[:, :, :len(cols)]
+        return self.names, self.values[:, :, cols]
+
+    def nbytes(self):
+        return self.values.nbytes + self.dates.nbytes
+
+
+_stores = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_forecast_store(forecasts, names=None, keep=4):
+    """
+    Store for this {key: forecast} mapping, rebuilt only when a forecast
+    object changes (a cache refresh), not on every rerun that rebuilds the dict.
+    """
+    key = (tuple(zip(forecasts, map(id, forecasts.values()))), None if names is None else tuple(names))
+    with _lock:
+        entry = _stores.get(key)
+        if entry is not None:
+            _stores.move_to_end(key)
+            return entry[0]
+    store = ForecastStore(forecasts, names=names)
+    with _lock:
+        # keep the mapping alive with the store so the ids in the key stay unique
+        _stores[key] = (store, forecasts)
+        while len(_stores) > keep:
+            _stores.popitem(last=False)
+    return store
+
+
+# -----------------------------
+# Benchmark: list-of-dicts charts_data vs. columnar store
+# -----------------------------
+def charts_data_lists(forecasts):
+    """The previous structure: a list of dicts of Python lists, scanned by name."""
+    charts_data = []
+    for city in forecasts:
+        forecast = forecasts.get(city, {})
+        if "daily" in forecast:
+            daily = forecast["daily"]
+            charts_data.append({
+                "city": city,
+                "dates": daily.get("time", []),
+                "temp_max": daily.get("temperature_2m_max", []),
+                "temp_min": daily.get("temperature_2m_min", []),
+                "rain": daily.get("precipitation_sum", [])
+            })
+    return charts_data
+
+
+def _measure(build):
+    """(result, seconds, bytes allocated while building); tracing inflates the seconds."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - t0
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, seconds, size
+
+
+def _best(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory and latency of forecast structures")
+    parser.add_argument("--units", type=int, nargs="+", default=[27, 1000, 10000, 50000])
+    args = parser.parse_args(argv)
+
+    from advisory import forecast_array, synthetic_forecasts
+
+    print(f"{'units':>6} | {'structure':<10} {'build ms':>9} {'memory KB':>10} "
+          f"{'lookup µs':>10} {'frame ms':>9} {'advisory in ms':>15}")
+    for n in args.units:
+        # Parsed JSON responses; the lists in charts_data reference them, so only
+        # the structure itself is measured for the baseline
+        forecasts = synthetic_forecasts(n)
+        last = list(forecasts)[-1]
+        old, _, old_b = _measure(lambda: charts_data_lists(forecasts))
+        store, _, new_b = _measure(lambda: ForecastStore(forecasts))
+        old_s = _best(lambda: charts_data_lists(forecasts))
+        new_s = _best(lambda: ForecastStore(forecasts))
+
+        def old_frame():
+            d = next(d for d in old if d["city"] == last)
+            return pd.DataFrame({"Date": d["dates"], "Temp Max (°C)": d["temp_max"],
+                                 "Temp Min (°C)": d["temp_min"], "Rain (mm)": d["rain"]}).dropna()
+
+        rows = [
+            ("lists", old_s, old_b, _best(lambda: next(d for d in old if d["city"] == last)),
+             _best(old_frame), _best(lambda: forecast_array(forecasts))),
+            ("columnar", new_s, new_b, _best(lambda: store.index[last]),
+             _best(lambda: store.frame(last)), _best(store.advisory_array)),
+        ]
+        for label, build_s, size, lookup, frame, adv in rows:
+            print(f"{n:>6} | {label:<10} {build_s * 1000:9.1f} {size / 1024:10.0f} "
+                  f"{lookup * 1e6:10.1f} {frame * 1000:9.2f} {adv * 1000:15.2f}")
+        # Lists only hold references into the responses; the store owns its numbers
+        print(f"{'':>6} | responses kept alive by the lists: "
+              f"{_measure(lambda: synthetic_forecasts(n))[2] / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import shutil
+
+import shapely
+
+from ee_cache import CACHE_DIR
+
+# -----------------------------
+# Boundary Layers: simplification + payload budget
+# -----------------------------
+SINDH_PATH = "sindh_with_indus_sea.geojson"
+RIVER_PATH = "Indus River.shp"
+GEO_CACHE_DIR = os.path.join(CACHE_DIR, "geo")
+
+# Simplification tolerances in degrees, finest first (0.001° ≈ 110 m)
+TOLERANCES = [0.0, 0.0005, 0.001, 0.0025, 0.005, 0.01]
+COORD_GRID = 1e-5          # snap output coordinates to ~1 m
+MAX_PAYLOAD_BYTES = 100_000  # districts + river geometry shipped to the browser
+
+_layers = {}
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def _shapefile_copy(path):
+    """
+    Readable copy of a shapefile that has no .shx beside it (the bundled
+    river). GDAL can only rebuild the index next to the .shp, so the sidecars
+    are copied under the cache dir and the index is rebuilt there once.
+    """
+    import pyogrio
+
+    base = os.path.splitext(path)[0]
+    work = os.path.join(GEO_CACHE_DIR, f"{os.path.basename(base).replace(' ', '_')}-{file_hash(path)}")
+    copy = os.path.join(work, os.path.basename(path))
+    if os.path.exists(os.path.splitext(copy)[0] + ".shx"):
+        return copy
+    os.makedirs(work, exist_ok=True)
+    for ext in (".shp", ".dbf", ".prj", ".cpg"):
+        if os.path.exists(base + ext):
+            shutil.copyfile(base + ext, os.path.join(work, os.path.basename(base) + ext))
+    previous = pyogrio.get_gdal_config_option("SHAPE_RESTORE_SHX")
+    pyogrio.set_gdal_config_options({"SHAPE_RESTORE_SHX": True})
+    try:
+        pyogrio.read_info(copy)
+    finally:
+        pyogrio.set_gdal_config_options({"SHAPE_RESTORE_SHX": previous})
+    return copy
+
+
+def load_layer(path):
+    """Read a boundary file; the bundled river .shp has no .shx/.prj beside it."""
+    import geopandas as gpd
+
+    if path.lower().endswith(".shp") and not os.path.exists(os.path.splitext(path)[0] + ".shx"):
+        path = _shapefile_copy(path)
+    gdf = gpd.read_file(path)
+    if gdf.crs is None:
+        gdf = gdf.set_crs(epsg=4326)
+    return gdf.to_crs(epsg=4326)
+
+
+def simplify_layer(gdf, tolerance):
+    """
+    Topology-preserving simplification. Polygon layers are simplified as a
+    coverage so neighbouring districts keep shared edges (no gaps/slivers).
+    """
+    if tolerance <= 0:
+        geoms = gdf.geometry.values
+    elif gdf.geom_type.isin(["Polygon", "MultiPolygon"]).all():
+        try:
+            geoms = shapely.coverage_simplify(gdf.geometry.values, tolerance)
+        except Exception:
+            geoms = gdf.geometry.simplify(tolerance, preserve_topology=True).values
+    else:
+        geoms = gdf.geometry.simplify(tolerance, preserve_topology=True).values
+    import geopandas as gpd
+
+    geoms = shapely.set_precision(geoms, COORD_GRID)
+    return gdf.set_geometry(gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs))
+
+
+def simplified_layer(path, tolerance):
+    """Simplified layer, cached in-process and on disk per (source hash, tolerance)."""
+    key = (path, tolerance)
+    if key in _layers:
+        return _layers[key]
+
+    stem = os.path.splitext(os.path.basename(path))[0].replace(" ", "_")
+    cached = os.path.join(GEO_CACHE_DIR, f"{stem}-{file_hash(path)}-{tolerance:g}.geojson")
+    if os.path.exists(cached):
+        import geopandas as gpd
+        gdf = gpd.read_file(cached)
+    else:
+        gdf = simplify_layer(load_layer(path), tolerance)
+        os.makedirs(GEO_CACHE_DIR, exist_ok=True)
+        gdf.to_file(cached, driver="GeoJSON")
+    _layers[key] = gdf
+    return gdf
+
+
+def payload_bytes(gdf):
+    """Size of the geometry as it would be embedded in the Folium HTML."""
+    return len(gdf.geometry.to_json().encode())
+
+
+def _raw_bytes(path):
+    key = (path, "raw_bytes")
+    if key not in _layers:
+        _layers[key] = payload_bytes(load_layer(path))
+    return _layers[key]
+
+
+def fit_budget(paths, max_bytes=MAX_PAYLOAD_BYTES, tolerances=TOLERANCES):
+    """
+    Pick the finest tolerance whose combined payload for `paths` fits in
+    `max_bytes` (falling back to the coarsest). Returns
+    ({path: simplified gdf}, report) where the report lists full vs. shipped
+    bytes and the bytes saved.
+    """
+    full = {p: _raw_bytes(p) for p in paths}
+    for tolerance in tolerances:
+        layers = {p: simplified_layer(p, tolerance) for p in paths}
+        sizes = {p: payload_bytes(g) for p, g in layers.items()}
+        if sum(sizes.values()) <= max_bytes:
+            break
+
+    report = {
+        "tolerance": tolerance,
+        "max_bytes": max_bytes,
+        "full_bytes": sum(full.values()),
+        "bytes": sum(sizes.values()),
+        "layers": {os.path.basename(p): {"full_bytes": full[p], "bytes": sizes[p]} for p in paths},
+    }
+    report["saved_bytes"] = report["full_bytes"] - report["bytes"]
+    return layers, report
+
+
+def districts_geojson(gdf, tooltips=None, name_col="NAME_2"):
+    """
+    All districts as one FeatureCollection (name + gdf row per feature),
+    optionally with per-feature tooltip HTML.
+    """
+    names = gdf[name_col].tolist() if name_col in gdf.columns else [None] * len(gdf)
+    features = [
+        {"type": "Feature",
+         "properties": ({"name": name, "row": row} if tooltips is None
+                        else {"name": name, "row": row, "tooltip": tooltip}),
+         "geometry": geom.__geo_interface__}
+        for row, (name, geom, tooltip) in enumerate(zip(names, gdf.geometry.values,
+                                                         tooltips or [None] * len(names)))
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+def main():
+    for tolerance in TOLERANCES:
+        sizes = {p: payload_bytes(simplified_layer(p, tolerance)) for p in (SINDH_PATH, RIVER_PATH)}
+        print(f"tolerance {tolerance:<7g} " + "  ".join(f"{p}: {b:,} B" for p, b in sizes.items()))
+    print(json.dumps(fit_budget([SINDH_PATH, RIVER_PATH])[1], indent=2))
+
+
+if __name__ == "__main__":
+    main()
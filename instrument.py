@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# -----------------------------
+# Hot-path Instrumentation
+# -----------------------------
+# Spans record wall time, bytes transferred and cache hit/miss. Spans opened
+# while a render is active (same thread) are kept for that render's debug
+# panel; every span also feeds process-wide totals for Prometheus.
+_local = threading.local()
+_totals = {}
+_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "kind", "started", "seconds", "bytes", "cache", "attrs")
+
+    def __init__(self, name, kind, attrs):
+        self.name = name
+        self.kind = kind
+        self.started = time.time()
+        self.seconds = None
+        self.bytes = None
+        self.cache = None     # "hit" / "miss" / "stale"
+        self.attrs = attrs
+
+    def as_dict(self):
+        return {"name": self.name, "kind": self.kind, "started": self.started,
+                "seconds": self.seconds, "bytes": self.bytes, "cache": self.cache, **self.attrs}
+
+
+def _record(sp):
+    spans = getattr(_local, "spans", None)
+    if spans is not None:
+        spans.append(sp)
+    with _lock:
+        t = _totals.setdefault((sp.name, sp.kind), {"count": 0, "seconds": 0.0, "bytes": 0,
+                                                    "hit": 0, "miss": 0, "stale": 0})
+        t["count"] += 1
+        t["seconds"] += sp.seconds or 0.0
+        t["bytes"] += sp.bytes or 0
+        if sp.cache in ("hit", "miss", "stale"):
+            t[sp.cache] += 1
+
+
+@contextmanager
+def span(name, kind="external", **attrs):
+    """Time a block: `with span("open-meteo") as sp: ...; sp.bytes = n`."""
+    sp = Span(name, kind, attrs)
+    t0 = time.perf_counter()
+    try:
+        yield sp
+    finally:
+        sp.seconds = time.perf_counter() - t0
+        _record(sp)
+
+
+def record_cache(name, result):
+    """Zero-duration span that only counts a cache hit/miss."""
+    sp = Span(name, "cache", {})
+    sp.seconds = 0.0
+    sp.cache = result
+    _record(sp)
+
+
+# -----------------------------
+# Per-render Sections
+# -----------------------------
+def start_render():
+    _local.spans = []
+    _local.section = None
+    _local.render_start = time.perf_counter()
+
+
+def section(name):
+    """Close the running script section (if any) and start timing `name`."""
+    end_section()
+    sp = Span(name, "section", {})
+    sp.seconds = time.perf_counter()   # start time until closed
+    _local.section = sp
+
+
+def end_section():
+    sp = getattr(_local, "section", None)
+    if sp is not None:
+        sp.seconds = time.perf_counter() - sp.seconds
+        _record(sp)
+        _local.section = None
+
+
+def finish_render():
+    """End the render and return its spans (sections and external calls)."""
+    end_section()
+    spans = getattr(_local, "spans", None) or []
+    total = Span("render", "render", {})
+    total.seconds = time.perf_counter() - getattr(_local, "render_start", time.perf_counter())
+    _local.spans = None
+    _record(total)
+    return spans + [total]
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def to_jsonl(spans):
+    return "\n".join(json.dumps(sp.as_dict(), default=str) for sp in spans) + "\n"
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def prometheus_text():
+    """Process-wide totals in the Prometheus text exposition format."""
+    with _lock:
+        totals = {k: dict(v) for k, v in _totals.items()}
+    lines = [
+        "# HELP sindh_span_seconds_total Wall time spent in instrumented spans.",
+        "# TYPE sindh_span_seconds_total counter",
+    ]
+    for (name, kind), t in sorted(totals.items()):
+        lines.append(f'sindh_span_seconds_total{{name="{_label(name)}",kind="{kind}"}} {t["seconds"]:.6f}')
+    lines += ["# HELP sindh_span_count_total Number of completed spans.",
+              "# TYPE sindh_span_count_total counter"]
+    for (name, kind), t in sorted(totals.items()):
+        lines.append(f'sindh_span_count_total{{name="{_label(name)}",kind="{kind}"}} {t["count"]}')
+    lines += ["# HELP sindh_span_bytes_total Bytes transferred inside spans.",
+              "# TYPE sindh_span_bytes_total counter"]
+    for (name, kind), t in sorted(totals.items()):
+        if t["bytes"]:
+            lines.append(f'sindh_span_bytes_total{{name="{_label(name)}",kind="{kind}"}} {t["bytes"]}')
+    lines += ["# HELP sindh_cache_requests_total Cache lookups by result.",
+              "# TYPE sindh_cache_requests_total counter"]
+    for (name, kind), t in sorted(totals.items()):
+        for result in ("hit", "miss", "stale"):
+            if t[result]:
+                lines.append(f'sindh_cache_requests_total{{name="{_label(name)}",result="{result}"}} {t[result]}')
+    return "\n".join(lines) + "\n"
+
+
+def totals():
+    """Process-wide totals per "name (kind)", for the debug panel."""
+    with _lock:
+        return {f"{name} ({kind})": dict(v) for (name, kind), v in _totals.items()}
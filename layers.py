@@ -0,0 +1,203 @@
+import threading
+import time
+
+from climatology import baseline_image, BASELINE_TAG
+from ee_cache import month_range
+from instrument import record_cache, span
+from outbound import ee_call
+from ee_stats import (
+    ee_backend, NDVI_COLLECTION, NDVI_BAND, ERA5_MONTHLY, SOIL_MOISTURE_BAND,
+    ERA5_MONTHLY_AGGR, PRECIP_BAND,
+)
+
+# -----------------------------
+# Overlay Layer Registry
+# -----------------------------
+MAP_TOKEN_TTL = 2 * 3600   # seconds before a getMapId url is refreshed
+
+
+def dynamic_vis(image, band, geom, palette, scale=1000, cache=None, cache_key=None, backend=None):
+    """Compute dynamic min/max (5–95th percentile) for better visualization."""
+    ee = ee_backend(backend)
+
+    def compute():
+        reduced = image.select(band).reduceRegion(
+            reducer=ee.Reducer.percentile([5, 95]),
+            geometry=geom,
+            scale=scale,
+            maxPixels=1e9
+        )
+        key = ("percentile_5_95", scale, tuple(sorted(cache_key.items()))) if cache_key else None
+        with span("ee.percentile", band=band):
+            return ee_call(reduced.getInfo, key=key)
+
+    if cache is None or cache_key is None:
+        stats = compute()
+    else:
+        stats = cache.get_or_compute(reducer="percentile_5_95", compute=compute,
+                                     scale=scale, **cache_key)
+
+    if not stats:
+        return {"min": 0, "max": 1, "palette": palette}
+
+    values = [stats[k] for k in sorted(stats)]   # <band>_p5, <band>_p95
+    band_min, band_max = values[0], values[1]
+    if band_min is None or band_max is None or band_min == band_max:
+        band_min, band_max = 0, 1
+
+    return {"min": band_min, "max": band_max, "palette": palette}
+
+
+def ndvi_image(year, month, geom, backend=None):
+    ee = ee_backend(backend)
+    start = ee.Date.fromYMD(year, month, 1)
+    end = start.advance(1, "month")
+    return (
+        ee.ImageCollection(NDVI_COLLECTION)
+        .filterDate(start, end)
+        .select(NDVI_BAND)
+        .mean()
+        .clip(geom)
+    )
+
+
+def soil_moisture_image(year, month, geom, backend=None):
+    """Mean ERA5-Land volumetric soil water for top layer (0–7 cm) in the given month."""
+    ee = ee_backend(backend)
+    start = ee.Date.fromYMD(year, month, 1)
+    end = start.advance(1, "month")
+    return (
+        ee.ImageCollection(ERA5_MONTHLY)
+        .filterDate(start, end)
+        .select(SOIL_MOISTURE_BAND)  # Top 0–7 cm
+        .mean()
+        .clip(geom)
+    )
+
+
+def flood_anomaly_image(year, month, geom, backend=None):
+    """Monthly precipitation minus the same calendar month's 2001–2020 mean."""
+    ee = ee_backend(backend)
+    dataset = ee.ImageCollection(ERA5_MONTHLY_AGGR).select(PRECIP_BAND)
+    start = ee.Date.fromYMD(year, month, 1)
+    end = start.advance(1, "month")
+
+    this_month = dataset.filterDate(start, end).mean()
+    return this_month.subtract(baseline_image(month, backend=backend)).clip(geom)
+
+
+# name -> how to build and colour each overlay. A fixed "vis" skips the
+# percentile reduceRegion; otherwise min/max come from dynamic_vis.
+OVERLAYS = {
+    "ndvi": {
+        "build": ndvi_image,
+        "dataset": NDVI_COLLECTION,
+        "band": NDVI_BAND,
+        "palette": ["brown", "yellow", "green"],
+        "scale": 500,
+    },
+    "soil_moisture": {
+        "build": soil_moisture_image,
+        "dataset": ERA5_MONTHLY,
+        "band": SOIL_MOISTURE_BAND,
+        "vis": {"min": 0.05, "max": 0.45, "palette": ["brown", "yellow", "green", "blue"]},
+    },
+    "flood_anomaly": {
+        "build": flood_anomaly_image,
+        "dataset": f"{ERA5_MONTHLY_AGGR}:anomaly_{BASELINE_TAG}",
+        "band": PRECIP_BAND,
+        "palette": ["blue", "white", "red"],
+        "scale": 10000,
+    },
+}
+
+
+class LayerRegistry:
+    """
+    Memoizes vis params and tile url_format per (overlay, year, month).
+
+    Vis min/max are cached for the life of the process (and on disk through
+    the EE cache); tile urls are reused until `token_ttl` elapses, after which
+    only getMapId is re-run. `timings` keeps the last compute/getMapId cost
+    of every key.
+    """
+
+    def __init__(self, geom, geom_hash, cache=None, token_ttl=MAP_TOKEN_TTL,
+                 overlays=OVERLAYS, backend=None):
+        self.geom = geom
+        self.geom_hash = geom_hash
+        self.cache = cache
+        self.token_ttl = token_ttl
+        self.overlays = overlays
+        self.backend = backend
+        self.timings = {}
+        self._vis = {}
+        self._urls = {}    # key -> (created, url_format)
+        self._lock = threading.Lock()
+
+    def vis_params(self, name, year, month, image=None):
+        key = (name, year, month)
+        with self._lock:
+            if key in self._vis:
+                return self._vis[key]
+        spec = self.overlays[name]
+        if "vis" in spec:
+            vis = spec["vis"]
+        else:
+            image = image if image is not None else spec["build"](year, month, self.geom, self.backend)
+            start, end = month_range(year, month)
+            vis = dynamic_vis(
+                image, spec["band"], self.geom, spec["palette"], spec["scale"],
+                cache=self.cache,
+                cache_key={"dataset": spec["dataset"], "band": spec["band"],
+                           "geometry": self.geom_hash, "start": start, "end": end},
+                backend=self.backend,
+            )
+        with self._lock:
+            self._vis[key] = vis
+        return vis
+
+    def preload_vis(self, vis_by_key):
+        """Seed vis params computed elsewhere (e.g. a precomputed snapshot)."""
+        with self._lock:
+            for key, vis in vis_by_key.items():
+                self._vis.setdefault(key, vis)
+
+    def tile_url(self, name, year, month):
+        """Leaflet url_format for the overlay, calling EE only when needed."""
+        key = (name, year, month)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._urls.get(key)
+        if entry is not None and now - entry[0] < self.token_ttl:
+            self.timings[key] = {"compute": 0.0, "getMapId": 0.0, "cached": True}
+            record_cache("tile_url", "hit")
+            return entry[1]
+        record_cache("tile_url", "miss")
+
+        t0 = time.perf_counter()
+        image = self.overlays[name]["build"](year, month, self.geom, self.backend)
+        vis = self.vis_params(name, year, month, image)
+        t1 = time.perf_counter()
+        with span("ee.getMapId", layer=name):
+            # A stored map id is only replayed while its token is alive; past that the
+            # call raises and the page falls back to local raster tiles
+            map_id = ee_call(image.visualize(**vis).getMapId,
+                             key=("getMapId", self.geom_hash, name, year, month), max_age=self.token_ttl)
+        url = map_id["tile_fetcher"].url_format
+        t2 = time.perf_counter()
+
+        with self._lock:
+            self._urls[key] = (time.monotonic(), url)
+        self.timings[key] = {"compute": t1 - t0, "getMapId": t2 - t1, "cached": False}
+        return url
+
+
+_registries = {}
+
+
+def get_registry(geom, geom_hash, cache=None):
+    """Process-wide registry per clip geometry, shared across sessions."""
+    if geom_hash not in _registries:
+        _registries[geom_hash] = LayerRegistry(geom, geom_hash, cache=cache)
+    return _registries[geom_hash]
@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# -----------------------------
+# Advisory API Load Test
+# -----------------------------
+# Starts api.py against a local Open-Meteo stub (or targets --url) and
+# fires requests over keep-alive connections at a fixed concurrency.
+REQUESTS = 5000
+CONCURRENCY = 200
+PATHS = ("/advisories?crop=Rice", "/advisories?crop=Wheat", "/advisories?crop=Cotton",
+         "/advisories?crop=Sugarcane", "/advisories", "/advisories?crop=Rice&district=Thatta")
+STARTUP_TIMEOUT = 60
+
+
+async def _worker(host, port, paths, latencies, errors, counter, total):
+    reader = writer = None
+    while True:
+        i = counter[0]
+        if i >= total:
+            break
+        counter[0] += 1
+        path = paths[i % len(paths)]
+        t0 = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            status = int(head.split(b" ", 2)[1])
+            length = next(int(line.split(b":", 1)[1]) for line in head.split(b"\r\n")
+                          if line.lower().startswith(b"content-length:"))
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t0)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+        except (OSError, asyncio.IncompleteReadError, ValueError, StopIteration) as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(url, requests=REQUESTS, concurrency=CONCURRENCY, paths=PATHS):
+    """Fire `requests` GETs at `url` from `concurrency` keep-alive connections."""
+    parts = urlsplit(url)
+    latencies, errors, counter = [], {}, [0]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_worker(parts.hostname, parts.port, paths, latencies, errors, counter, requests)
+                           for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    ms = np.array(latencies) * 1000 if latencies else np.array([np.nan])
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(ms, 95)), 2),
+        "p99_ms": round(float(np.percentile(ms, 99)), 2),
+        "max_ms": round(float(ms.max()), 2),
+        "errors": errors,
+    }
+
+
+def _get_json(url, timeout=5):
+    with urllib.request.urlopen(url, timeout=timeout) as r:
+        return json.loads(r.read())
+
+
+def wait_ready(url, timeout=STARTUP_TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            return _get_json(url + "/health")
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"{url} did not become ready in {timeout}s")
+
+
+def measure(url, requests=REQUESTS, concurrency=CONCURRENCY):
+    """Wait for `url`, time the first (snapshot-building) request, then the load run."""
+    wait_ready(url)
+    t0 = time.perf_counter()
+    urllib.request.urlopen(url + "/advisories", timeout=STARTUP_TIMEOUT).read()
+    first = time.perf_counter() - t0
+    report = asyncio.run(run_load(url, requests, concurrency))
+    report["first_request_s"] = round(first, 3)
+    report["server"] = _get_json(url + "/health")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the advisory JSON API")
+    parser.add_argument("--url", default=None, help="existing server, e.g. http://127.0.0.1:8502")
+    parser.add_argument("--port", type=int, default=8599, help="port for the spawned server")
+    parser.add_argument("--requests", type=int, default=REQUESTS)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--out", default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        report = measure(args.url, args.requests, args.concurrency)
+    else:
+        from benchmark import StubForecastServer
+
+        url = f"http://127.0.0.1:{args.port}"
+        with StubForecastServer() as stub:
+            proc = subprocess.Popen([sys.executable, "api.py", "--port", str(args.port),
+                                     "--forecast-url", stub.url, "--project", ""])
+            try:
+                report = measure(url, args.requests, args.concurrency)
+            finally:
+                proc.terminate()
+                proc.wait()
+
+    for key, value in report.items():
+        print(f"{key:>16}: {value}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
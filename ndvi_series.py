@@ -0,0 +1,238 @@
+import datetime
+import os
+import threading
+
+import pandas as pd
+
+from ee_cache import CACHE_DIR, geometry_hash
+from ee_stats import ee_backend, districts_fc, NDVI_COLLECTION, NDVI_BAND, NDVI_SCALE_FACTOR
+from instrument import span
+from outbound import ee_call
+
+# -----------------------------
+# NDVI Time Series (all districts, one EE job)
+# -----------------------------
+# Series are keyed by gdf row, like forecasts and the archive: unit names
+# repeat at the finer levels, and two tehsils of the same name are not one area
+SERIES_PATH = os.path.join(CACHE_DIR, "ndvi_series-v2.parquet")
+COLUMNS = ["geom_hash", "row", "date", "NDVI"]
+COMPOSITE_DAYS = 16
+FETCH_CHUNK_DAYS = 4 * 365   # ~90 composites; keeps 50 districts under the getInfo limit
+HISTORY_START = datetime.date(2001, 1, 1)
+
+
+def district_geometries(gdf, rows):
+    """The polygons of the requested gdf rows, in that order."""
+    return gdf.iloc[sorted(set(rows))][["geometry"]].reset_index(drop=True)
+
+
+def fetch_ndvi_series(gdf, rows, start, end, backend=None):
+    """
+    Long-format (row, date, NDVI) for every MOD13Q1 composite in [start, end)
+    and every requested gdf row, reduced server-side in a single getInfo.
+    """
+    ee = ee_backend(backend)
+    rows = sorted(set(rows))
+    geoms = district_geometries(gdf, rows)
+    if geoms.empty:
+        return pd.DataFrame(columns=["row", "date", NDVI_BAND])
+    # districts_fc tags features with their position in `geoms`; map back to gdf rows below
+    fc = districts_fc(geoms, backend=backend)
+
+    def per_image(img):
+        date = img.date().format("YYYY-MM-dd")
+        return img.reduceRegions(
+            collection=fc,
+            reducer=ee.Reducer.mean(),
+            scale=500,
+        ).map(lambda f: f.set("date", date))
+
+    table = (
+        ee.ImageCollection(NDVI_COLLECTION)
+        .filterDate(str(start), str(end))
+        .select(NDVI_BAND)
+        .map(per_image)
+        .flatten()
+        .select(["row", "date", "mean"], retainGeometry=False)
+    )
+    key = ("ndvi_series", geometry_hash(geoms), str(start), str(end))
+    with span("ee.ndvi_series", districts=len(geoms)):
+        info = ee_call(table.getInfo, key=key)
+    records = [
+        {"row": rows[f["properties"]["row"]],
+         "date": f["properties"].get("date"),
+         NDVI_BAND: f["properties"].get("mean")}
+        for f in info["features"]
+    ]
+    df = pd.DataFrame(records, columns=["row", "date", NDVI_BAND]).dropna()
+    df["row"] = df["row"].astype(int)
+    df["date"] = pd.to_datetime(df["date"])
+    df[NDVI_BAND] = df[NDVI_BAND].astype(float) / NDVI_SCALE_FACTOR
+    return df
+
+
+def empty_series():
+    """Typed empty store, so concatenated rows keep datetime/float columns."""
+    return pd.DataFrame({"geom_hash": pd.Series(dtype=object), "row": pd.Series(dtype="int64"),
+                         "date": pd.Series(dtype="datetime64[ns]"), NDVI_BAND: pd.Series(dtype="float64")})
+
+
+def fetch_chunks(start, end, days=FETCH_CHUNK_DAYS):
+    """[start, end) split into spans short enough for one getInfo (~5000 features)."""
+    chunks = []
+    while start < end:
+        stop = min(start + pd.Timedelta(days=days), end)
+        chunks.append((start, stop))
+        start = stop
+    return chunks
+
+
+class NDVISeriesStore:
+    """
+    Local store of fetched composites. Later runs only request what is not
+    stored yet: newer composites, older ones when a range reaches further
+    back, holes left between earlier ranges, and every date for units
+    never fetched before. Units are gdf rows. Long ranges are
+    fetched in chunks, so extending a chart back in time costs one EE job
+    per missing chunk.
+    """
+
+    def __init__(self, path=SERIES_PATH, fetch=fetch_ndvi_series):
+        self.path = path
+        self.fetch = fetch
+        self._lock = threading.Lock()
+        self._df = None
+        self._checked = set()   # (geom hash, rows, start, end) already brought up to date
+        self._inflight = {}     # (geom hash, rows, lo, hi) chunk -> threading.Event
+
+    def _load(self):
+        if self._df is None:
+            if os.path.exists(self.path):
+                self._df = pd.read_parquet(self.path)
+            else:
+                self._df = empty_series()
+        return self._df
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._df.to_parquet(self.path, index=False)
+
+    def _merge(self, ghash, part):
+        """Add one fetched chunk to the store and persist it. Caller holds the lock."""
+        part = part.copy()
+        part.insert(0, "geom_hash", ghash)
+        df = pd.concat([self._load(), part[COLUMNS]], ignore_index=True).astype(
+            {"row": "int64", "date": "datetime64[ns]", NDVI_BAND: "float64"})
+        df = df.drop_duplicates(["geom_hash", "row", "date"], keep="last")
+        self._df = df.reset_index(drop=True)
+        self._save()
+
+    @staticmethod
+    def gaps(have, rows, start, end):
+        """
+        [(rows, from, to)] not covered by `have` within [start, end): the head
+        and tail of each unit's series and every hole longer than one
+        composite period in between. Units with the same hole share one
+        entry, so they are fetched together.
+        """
+        period = pd.Timedelta(days=COMPOSITE_DAYS)
+        day = pd.Timedelta(days=1)
+        dates = have[(have["date"] >= start) & (have["date"] < end)].groupby("row")["date"]
+        series = {r: sorted(group.unique()) for r, group in dates}
+        holes = {}
+        for row in rows:
+            known = series.get(row)
+            if not known:
+                holes.setdefault((start, end), []).append(row)
+                continue
+            if known[0] > start + period:
+                holes.setdefault((start, known[0]), []).append(row)
+            for a, b in zip(known, known[1:]):
+                if b - a > period:
+                    holes.setdefault((a + day, b), []).append(row)
+            if known[-1] + day < end:
+                holes.setdefault((known[-1] + day, end), []).append(row)
+        return [(units, lo, hi) for (lo, hi), units in holes.items()]
+
+    def get(self, gdf, rows, start, end, name_col=None, backend=None):
+        """(row, district, date, NDVI) for the gdf `rows` in [start, end); district is the unit name."""
+        from units import unit_column
+
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        rows = sorted(set(int(r) for r in rows))
+        ghash = geometry_hash(gdf)
+        checked_key = (ghash, frozenset(rows), start, end)
+        with self._lock:
+            df = self._load()
+            have = df[(df["geom_hash"] == ghash) & df["row"].isin(rows)]
+            gaps = self.gaps(have, rows, start, end)
+            mine, waiting = [], []
+            if gaps and checked_key not in self._checked:
+                for units, a, b in gaps:
+                    for lo, hi in fetch_chunks(a, b):
+                        key = (ghash, tuple(units), lo, hi)
+                        if key in self._inflight:
+                            waiting.append(self._inflight[key])
+                        else:
+                            self._inflight[key] = threading.Event()
+                            mine.append(key)
+
+        # Fetch outside the lock; each chunk is stored as soon as it arrives,
+        # so a failing chunk does not lose the ones fetched before it.
+        try:
+            for key in mine:
+                _, units, lo, hi = key
+                part = self.fetch(gdf, list(units), lo.date(), hi.date(), backend)
+                with self._lock:
+                    if not part.empty:
+                        self._merge(ghash, part)
+                    self._inflight.pop(key).set()
+        finally:
+            with self._lock:
+                for key in mine:
+                    if key in self._inflight:
+                        self._inflight.pop(key).set()
+
+        for event in waiting:
+            event.wait()
+
+        with self._lock:
+            if gaps and not waiting:
+                self._checked.add(checked_key)
+            df = self._df
+            mask = ((df["geom_hash"] == ghash) & df["row"].isin(rows)
+                    & (df["date"] >= start) & (df["date"] < end))
+            out = df.loc[mask, ["row", "date", NDVI_BAND]].reset_index(drop=True)
+        names = gdf[name_col or unit_column(gdf)].astype(str).to_numpy()
+        out.insert(1, "district", names[out["row"].to_numpy()])
+        return out
+
+
+def smooth_and_normalize(df, window=3, by="row"):
+    """Rolling mean and 0–1 min/max normalization per unit (`by`), vectorized by group."""
+    df = df.sort_values([by, "date"]).reset_index(drop=True)
+    by_unit = df.groupby(by, sort=False)
+    df["NDVI_Smoothed"] = (
+        by_unit[NDVI_BAND].rolling(window=window, min_periods=1).mean()
+        .reset_index(level=0, drop=True)
+    )
+    smoothed = df.groupby(by, sort=False)["NDVI_Smoothed"]
+    lo, hi = smoothed.transform("min"), smoothed.transform("max")
+    df["NDVI_Normalized"] = (df["NDVI_Smoothed"] - lo) / (hi - lo)
+    return df
+
+
+_store = None
+
+
+def get_store():
+    """Process-wide store shared by every session."""
+    global _store
+    if _store is None:
+        _store = NDVISeriesStore()
+    return _store
+
+
+def last_year_range(today=None):
+    today = today or datetime.date.today()
+    return today - datetime.timedelta(days=365), today
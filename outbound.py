@@ -0,0 +1,328 @@
+import argparse
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from instrument import record_cache
+
+# -----------------------------
+# Outbound Call Layer (Open-Meteo, Earth Engine)
+# -----------------------------
+# Every external call goes through a per-service `Service`, which:
+#   - coalesces identical in-flight calls (single-flight) across sessions,
+#   - caps concurrency and paces calls with a token bucket,
+#   - retries 429 / 5xx / transport errors with full-jitter backoff,
+#   - opens a circuit breaker after repeated failures and then serves the
+#     last good value of a call instead of waiting on a failing upstream.
+SERVICES = {
+    # Open-Meteo free tier: 600 calls / minute
+    "open-meteo": {"rate": 10, "burst": 20, "concurrency": 8},
+    # EE interactive quota is ~40 concurrent requests per project; stay well under
+    "earthengine": {"rate": 5, "burst": 10, "concurrency": 6},
+}
+RETRIES = 3
+BACKOFF = 0.5            # seconds; first retry waits up to this, doubling per attempt
+MAX_BACKOFF = 8.0
+BREAKER_FAILURES = 5     # consecutive failed calls before the breaker opens
+BREAKER_RESET = 30.0     # seconds the breaker stays open before one trial call
+LAST_GOOD = 256          # last good values kept per service
+
+
+class OutboundError(Exception):
+    """Base class for failures raised by the outbound layer."""
+
+
+class StatusError(OutboundError):
+    """Upstream answered with a non-2xx status that is not worth retrying (400, 401, 404, ...)."""
+
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class RetryableStatus(StatusError):
+    """Upstream answered 429 or 5xx; `retry_after` is its hint in seconds, if any."""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(status)
+        try:
+            self.retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            self.retry_after = None
+
+
+def check_status(status, retry_after=None):
+    """Raise RetryableStatus for 429 / 5xx and StatusError for any other non-2xx status."""
+    if status == 429 or status >= 500:
+        raise RetryableStatus(status, retry_after)
+    if not 200 <= status < 300:
+        raise StatusError(status)
+
+
+class CircuitOpen(OutboundError):
+    """The breaker is open and there is no last good value for this call."""
+
+
+class TokenBucket:
+    """`rate` tokens per second, at most `burst` banked; `acquire` blocks until one is free."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive failures -> half-open after `reset` seconds."""
+
+    def __init__(self, failures=BREAKER_FAILURES, reset=BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.state = "closed"
+        self._count = 0
+        self._opened = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened >= self.reset:
+                self.state, self._trial = "half-open", False
+            if self.state == "half-open" and not self._trial:
+                self._trial = True          # exactly one trial call
+                return True
+            return self.state == "closed"
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.state, self._count = "closed", 0
+                return
+            self._count += 1
+            if self.state == "half-open" or self._count >= self.failures:
+                self.state, self._opened = "open", time.monotonic()
+
+
+def _transport_error(exc):
+    try:
+        import requests
+    except ImportError:
+        return False
+    return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+
+
+# EE raises EEException carrying the server's reason; throttling and server
+# errors are worth retrying, computation errors (bad band, memory) are not
+EE_RETRYABLE = re.compile(r"too many requests|rate limit|concurrency limit|unavailable|"
+                          r"internal error|deadline exceeded|\b(429|502|503|504)\b", re.IGNORECASE)
+
+
+def ee_retryable(exc):
+    return isinstance(exc, RetryableStatus) or bool(EE_RETRYABLE.search(str(exc)))
+
+
+def http_retryable(exc):
+    return isinstance(exc, RetryableStatus) or _transport_error(exc)
+
+
+class Service:
+    """
+    Rate-limited, retrying, single-flight gateway to one upstream service.
+
+    `call(key, fn)` runs `fn()` at most once at a time per `key`; callers
+    arriving while it runs get the same result (or exception). A key of
+    None opts out of coalescing and last-good fallback; `valid(result)`,
+    if given, decides whether a result may be kept as the last good value,
+    and `max_age` (seconds) bounds how old a served last good value may be
+    (e.g. a map token that expires).
+    """
+
+    def __init__(self, name, rate, burst, concurrency, retries=RETRIES, backoff=BACKOFF,
+                 max_backoff=MAX_BACKOFF, breaker=None, retryable=http_retryable, sleep=time.sleep):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.retryable = retryable
+        self.sleep = sleep
+        self.stats = {"calls": 0, "upstream": 0, "coalesced": 0, "retries": 0,
+                      "failures": 0, "stale": 0, "rejected": 0}
+        self._inflight = {}                # key -> [Event, result, exception]
+        self._last_good = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bump(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def delay(self, attempt, retry_after=None):
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)], never below Retry-After."""
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+        return delay
+
+    def call(self, key, fn, valid=None, max_age=None):
+        self._bump("calls")
+        if key is not None:
+            with self._lock:
+                entry = self._inflight.get(key)
+                leader = entry is None
+                if leader:
+                    entry = self._inflight[key] = [threading.Event(), None, None]
+            if not leader:
+                self._bump("coalesced")
+                record_cache(f"{self.name}.singleflight", "hit")
+                entry[0].wait()
+                if entry[2] is not None:
+                    raise entry[2]
+                return entry[1]
+        try:
+            result = self._call(key, fn, valid, max_age)
+            if key is not None:
+                entry[1] = result
+            return result
+        except Exception as e:
+            if key is not None:
+                entry[2] = e
+            raise
+        finally:
+            if key is not None:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                entry[0].set()
+
+    def _call(self, key, fn, valid=None, max_age=None):
+        if not self.breaker.allow():
+            self._bump("rejected")
+            return self._fallback(key, CircuitOpen(f"{self.name}: circuit open"), max_age)
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                with self.slots:
+                    self._bump("upstream")
+                    result = fn()
+            except Exception as e:
+                if not self.retryable(e):
+                    # upstream answered; the request itself is bad
+                    self.breaker.record(True)
+                    raise
+                if attempt >= self.retries:
+                    self._bump("failures")
+                    self.breaker.record(False)
+                    return self._fallback(key, e, max_age)
+                self._bump("retries")
+                self.sleep(self.delay(attempt, getattr(e, "retry_after", None)))
+                attempt += 1
+                continue
+            self.breaker.record(True)
+            if key is not None and (valid is None or valid(result)):
+                with self._lock:
+                    self._last_good[key] = (time.monotonic(), result)
+                    self._last_good.move_to_end(key)
+                    while len(self._last_good) > LAST_GOOD:
+                        self._last_good.popitem(last=False)
+            return result
+
+    def _fallback(self, key, exc, max_age=None):
+        """
+        Last good value of `key` if there is one younger than `max_age`
+        (while upstream is failing), else raise `exc`.
+        """
+        with self._lock:
+            entry = self._last_good.get(key) if key is not None else None
+        if entry is None or (max_age is not None and time.monotonic() - entry[0] >= max_age):
+            raise exc
+        value = entry[1]
+        self._bump("stale")
+        record_cache(self.name, "stale")
+        return value
+
+    def metrics(self):
+        return {**self.stats, "breaker": self.breaker.state}
+
+
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_service(name):
+    """Process-wide Service per upstream, configured from SERVICES."""
+    with _services_lock:
+        if name not in _services:
+            retryable = ee_retryable if name == "earthengine" else http_retryable
+            _services[name] = Service(name, retryable=retryable, **SERVICES[name])
+        return _services[name]
+
+
+def ee_call(fn, key=None, valid=None, max_age=None):
+    """Run one Earth Engine round trip (getInfo / getMapId) through the shared service."""
+    return get_service("earthengine").call(key, fn, valid, max_age)
+
+
+# -----------------------------
+# Fault-injection check against the local Open-Meteo stub
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exercise the outbound layer against a faulty stub")
+    parser.add_argument("--callers", type=int, default=50, help="concurrent requests")
+    parser.add_argument("--locations", type=int, default=5, help="distinct locations among them")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.3, help="share of 503 answers")
+    args = parser.parse_args(argv)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from benchmark import StubForecastServer
+    from forecast import fetch_forecast
+    from outbound import get_service as shared_service   # the instance forecast.py uses, not __main__'s
+
+    service = shared_service("open-meteo")
+    service.backoff = 0.05
+    points = [(25.4 + 0.5 * i, 68.4) for i in range(args.locations)]
+    with StubForecastServer(latency=args.latency, error_rate=args.error_rate) as stub:
+        def one(i):
+            try:
+                return bool(fetch_forecast(*points[i % len(points)], url=stub.url))
+            except Exception:
+                return False
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(args.callers) as pool:
+            ok = sum(pool.map(one, range(args.callers)))
+        print(f"{args.callers} callers over {len(points)} locations, {args.error_rate:.0%} upstream errors: "
+              f"{ok} succeeded in {time.perf_counter() - t0:.2f}s, "
+              f"{stub.requests} upstream requests ({stub.errors} errors)")
+        print(f"  {service.metrics()}")
+
+        # Upstream down: the breaker opens and the last good forecasts are served
+        stub.error_rate = 1.0
+        t0 = time.perf_counter()
+        results = [one(i) for i in range(BREAKER_FAILURES + 5)]
+        print(f"outage: {sum(results)}/{len(results)} answered from the last good value "
+              f"in {time.perf_counter() - t0:.2f}s, breaker {service.breaker.state}")
+        print(f"  {service.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
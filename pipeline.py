@@ -0,0 +1,446 @@
+import argparse
+import datetime
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from ee_cache import CACHE_DIR, geometry_hash
+from instrument import span
+
+# -----------------------------
+# Daily Precompute Pipeline (versioned snapshots)
+# -----------------------------
+# Everything the page shows that depends only on the date is materialized
+# once per run into .cache/snapshots/<version>/ and published by rewriting
+# LATEST. Each stage records status and timing in manifest.json; re-running
+# the same version skips finished stages, so a failed run resumes where it
+# stopped.
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "snapshots")
+SCHEMA = 2
+SNAPSHOT_MAX_AGE = 26 * 3600   # seconds; a missed daily run falls back to live data
+KEEP = 7                       # published versions kept on disk
+ZONAL_COLUMNS = ["variable", "year", "month", "row", "district", "value"]
+
+
+def snapshot_months(today=None):
+    """The page's default month plus the last closed one (soil moisture, archives)."""
+    today = today or datetime.date.today()
+    prev = (today.year - 1, 12) if today.month == 1 else (today.year, today.month - 1)
+    return [(today.year, today.month), prev]
+
+
+def _write_json(path, payload):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def _write_parquet(path, df):
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class SnapshotPipeline:
+    """
+    Stages, in order:
+
+      forecasts    Open-Meteo for every unit cell and flood-grid cell (one batch)
+      zonal_stats  per-district NDVI / soil moisture / precipitation, archive first
+      overlays     vis params and tile urls of every overlay
+      rasters      every overlay as a local array and tile pyramid (EE fallback)
+      advisories   irrigation / heat / flood table for every crop, from the stored forecasts
+
+    A stage writes its files atomically and is marked done in the manifest
+    only after they are all on disk; `run` skips done stages unless forced.
+    """
+
+    STAGES = ("forecasts", "zonal_stats", "overlays", "rasters", "advisories")
+
+    def __init__(self, version=None, root=SNAPSHOT_DIR, sindh_path=None, river_path=None,
+                 fetch=None, cache=None, ee_available=None, today=None, backend=None, log=print,
+                 raster_root=None, tile_root=None):
+        from bootstrap import load_geometries
+        from forecast import cached_forecasts
+        from units import get_unit_index
+
+        self.today = today or datetime.date.today()
+        self.version = version or self.today.isoformat()
+        self.root = root
+        self.path = os.path.join(root, self.version)
+        geometries = load_geometries(sindh_path, river_path)
+        self.gdf = geometries["sindh"]
+        self.river_gdf = geometries["river"]
+        self.union = geometries["sindh_union"]
+        self.geom_hash = geometry_hash(self.gdf)
+        self.units = get_unit_index(self.gdf)
+        self.fetch = fetch or cached_forecasts
+        self.cache = cache
+        self.ee_available = ee_available or (lambda: False)
+        self.backend = backend
+        self.raster_root = raster_root
+        self.tile_root = tile_root
+        self.registry = None
+        self.log = log
+        self.manifest = self._load_manifest()
+
+    # --- manifest ---
+    def _load_manifest(self):
+        path = os.path.join(self.path, "manifest.json")
+        if os.path.exists(path):
+            manifest = _read_json(path)
+            if manifest.get("schema") == SCHEMA and manifest.get("geom_hash") == self.geom_hash:
+                return manifest
+        return {"schema": SCHEMA, "version": self.version, "geom_hash": self.geom_hash,
+                "months": snapshot_months(self.today), "stages": {}, "published": False,
+                "created": time.time()}
+
+    def _save_manifest(self):
+        os.makedirs(self.path, exist_ok=True)
+        _write_json(os.path.join(self.path, "manifest.json"), self.manifest)
+
+    def done(self, stage):
+        entry = self.manifest["stages"].get(stage, {})
+        return entry.get("status") == "done" and all(
+            os.path.exists(os.path.join(self.path, f)) for f in entry.get("files", []))
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    # --- stages ---
+    def stage_forecasts(self):
+        from flood_grid import get_flood_grid
+
+        grid = get_flood_grid(self.units, self.gdf.total_bounds, self.river_gdf)
+        cells = {**self.units.grid_locations(), **grid.grid_locations()}
+        data = self.fetch(cells)
+        _write_json(self._file("forecasts.json"), {
+            "cells": [[lat, lon, data.get((lat, lon)) or {}] for lat, lon in cells],
+            "units": [list(cell) for cell in self.units.unit_cell],   # cell of each gdf row
+        })
+        return {"files": ["forecasts.json"], "cells": len(cells)}
+
+    def stage_zonal_stats(self):
+        from archive import VARIABLES, read_month
+        from ee_stats import district_means
+
+        parts = []
+        for year, month in self.manifest["months"]:
+            for variable, (collection, band, scale, factor) in VARIABLES.items():
+                # only rows archived for this run's units; a month archived for
+                # another unit column counts as not archived
+                archived = read_month(variable, year, month, self.geom_hash, name_col=self.units.name_col)
+                if archived is not None:
+                    rows, districts, values = archived["row"], archived["district"], archived["value"]
+                elif self.ee_available():
+                    df = district_means(self.gdf, collection, band, year, month, scale,
+                                        name_col=self.units.name_col, cache=self.cache,
+                                        backend=self.backend)
+                    rows, districts, values = df["row"], df.index, df[band] * factor
+                else:
+                    raise RuntimeError(f"{variable} {year}-{month:02d} not archived and Earth Engine unavailable")
+                parts.append(pd.DataFrame({"variable": variable, "year": year, "month": month,
+                                           "row": pd.Series(rows).astype(int).values,
+                                           "district": list(districts), "value": list(values)}))
+        _write_parquet(self._file("zonal_stats.parquet"), pd.concat(parts, ignore_index=True)[ZONAL_COLUMNS])
+        return {"files": ["zonal_stats.parquet"], "rows": sum(len(p) for p in parts)}
+
+    def _registry(self):
+        """One LayerRegistry per run, so rasters reuse the vis params the overlays stage computed."""
+        from ee_stats import ee_backend
+        from layers import LayerRegistry
+
+        if not self.ee_available():
+            raise RuntimeError("Earth Engine unavailable")
+        if self.registry is None:
+            ee = ee_backend(self.backend)
+            self.registry = LayerRegistry(ee.Geometry(self.union.__geo_interface__), self.geom_hash,
+                                          cache=self.cache, backend=self.backend)
+        return self.registry
+
+    def _each_layer(self, build):
+        """
+        build(name, year, month) for every overlay month. A failing layer (e.g.
+        an ERA5 month not out yet) is recorded and skipped; the stage fails
+        only if every layer does.
+        """
+        from layers import OVERLAYS
+
+        results, failed = [], []
+        for year, month in self.manifest["months"]:
+            for name in OVERLAYS:
+                try:
+                    results.append(build(name, year, month))
+                except Exception as e:
+                    failed.append({"name": name, "year": year, "month": month,
+                                   "error": f"{type(e).__name__}: {e}"})
+                    self.log(f"  {name} {year}-{month:02d}: {failed[-1]['error']}")
+        if not results and failed:
+            raise RuntimeError(f"every layer failed ({failed[0]['error']})")
+        return results, failed
+
+    def stage_overlays(self):
+        registry = self._registry()
+
+        def build(name, year, month):
+            url = registry.tile_url(name, year, month)
+            return {"name": name, "year": year, "month": month, "url": url,
+                    "vis": registry.vis_params(name, year, month), "created": time.time()}
+
+        layers, failed = self._each_layer(build)
+        _write_json(self._file("overlays.json"), layers)
+        return {"files": ["overlays.json"], "layers": len(layers), "failed": failed}
+
+    def stage_rasters(self):
+        """Overlay months as local arrays + rendered tiles, served when EE tile urls are not."""
+        from raster_tiles import RASTER_DIR, TILE_ROOT, download_raster, raster_fresh, render_tiles
+
+        registry = self._registry()
+        root, tile_root = self.raster_root or RASTER_DIR, self.tile_root or TILE_ROOT
+
+        def build(name, year, month):
+            if not raster_fresh(name, year, month, self.geom_hash, root):
+                download_raster(name, year, month, registry.geom, self.geom_hash, self.gdf.total_bounds,
+                                registry=registry, root=root, backend=self.backend)
+            return render_tiles(name, year, month, self.geom_hash, root=root, tile_root=tile_root)[1]
+
+        tiles, failed = self._each_layer(build)
+        return {"files": [], "layers": len(tiles), "tiles": sum(tiles), "failed": failed}
+
+    def stage_advisories(self):
+        from core import district_advisories
+
+        stored = _read_json(self._file("forecasts.json"))
+        cells = {(lat, lon): forecast for lat, lon, forecast in stored["cells"]}
+        forecasts = self.units.unit_forecasts(cells)
+        result = district_advisories(
+            self.units, forecasts, self.gdf, self.river_gdf, self.geom_hash,
+            fetch=lambda locations: {k: cells.get(tuple(v), {}) for k, v in locations.items()},
+            cache=self.cache, ee_available=self.ee_available, backend=self.backend)
+        _write_parquet(self._file("advisories.parquet"), result["table"])
+        _write_parquet(self._file("flood.parquet"), result["flood"])
+        return {"files": ["advisories.parquet", "flood.parquet"],
+                "soil_period": result["soil_period"], "flood_error": result["flood_error"]}
+
+    # --- driver ---
+    def run(self, stages=None, force=()):
+        """Run `stages` (all by default) in order; returns True if every one is done."""
+        stages = [s for s in self.STAGES if stages is None or s in stages]
+        ok, ran = True, set()
+        for stage in stages:
+            if stage == "advisories" and not self.done("forecasts"):
+                self.log("advisories: skipped, forecasts stage not done")
+                ok = False
+                continue
+            # advisories are derived from the stored forecasts, so they follow a re-fetch
+            stale = stage == "advisories" and "forecasts" in ran
+            if self.done(stage) and stage not in force and not stale:
+                self.log(f"{stage}: done ({self.manifest['stages'][stage]['seconds']:.2f}s), skipped")
+                continue
+            os.makedirs(self.path, exist_ok=True)
+            t0 = time.perf_counter()
+            try:
+                with span(f"pipeline.{stage}", kind="stage"):
+                    info = getattr(self, f"stage_{stage}")()
+                entry = {"status": "done", **info}
+                ran.add(stage)
+            except Exception as e:
+                entry = {"status": "failed", "error": f"{type(e).__name__}: {e}"}
+                ok = False
+            entry["seconds"] = round(time.perf_counter() - t0, 3)
+            entry["finished"] = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+            self.manifest["stages"][stage] = entry
+            self._save_manifest()
+            self.log(f"{stage}: {entry['status']} in {entry['seconds']:.2f}s"
+                     + (f" ({entry['error']})" if "error" in entry else ""))
+        return ok
+
+    def complete(self):
+        """True once every stage is done (whichever run did it)."""
+        return all(self.done(stage) for stage in self.STAGES)
+
+    def publish(self, keep=KEEP):
+        """
+        Point LATEST at this version, then drop all but the `keep` most
+        recently created versions. Refuses an incomplete snapshot; the
+        version just published is never removed.
+        """
+        if not self.complete():
+            missing = [s for s in self.STAGES if not self.done(s)]
+            raise RuntimeError(f"{self.version} is incomplete (not done: {', '.join(missing)})")
+        self.manifest["published"] = True
+        self.manifest["generated"] = time.time()
+        self._save_manifest()
+        _write_json(os.path.join(self.root, "LATEST"), {"version": self.version})
+        if keep:
+            versions = sorted((d for d in os.listdir(self.root)
+                               if os.path.isfile(os.path.join(self.root, d, "manifest.json"))),
+                              key=lambda d: _created(os.path.join(self.root, d)))
+            for old in versions[:-keep]:
+                if old != self.version:
+                    shutil.rmtree(os.path.join(self.root, old), ignore_errors=True)
+
+
+def _created(path):
+    """Creation time recorded in a version's manifest (directory mtime for older manifests)."""
+    try:
+        manifest = _read_json(os.path.join(path, "manifest.json"))
+    except ValueError:
+        manifest = {}
+    return manifest.get("created") or manifest.get("generated") or os.path.getmtime(path)
+
+
+# -----------------------------
+# Snapshot reader (used by the page)
+# -----------------------------
+class Snapshot:
+    """One published snapshot, fully loaded (a few hundred KB)."""
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.generated = manifest.get("generated", 0)
+        stages = manifest["stages"]
+
+        def has(stage):
+            return stages.get(stage, {}).get("status") == "done"
+
+        self.forecasts = None
+        if has("forecasts"):
+            stored = _read_json(os.path.join(path, "forecasts.json"))
+            cells = {(lat, lon): forecast for lat, lon, forecast in stored["cells"]}
+            self.forecasts = {row: cells.get(tuple(cell), {}) for row, cell in enumerate(stored["units"])}
+        self.zonal = (pd.read_parquet(os.path.join(path, "zonal_stats.parquet"))
+                      if has("zonal_stats") else pd.DataFrame(columns=ZONAL_COLUMNS))
+        self.overlays = {}
+        if has("overlays"):
+            for layer in _read_json(os.path.join(path, "overlays.json")):
+                self.overlays[(layer["name"], layer["year"], layer["month"])] = layer
+        self.advisories = None
+        if has("advisories"):
+            info = stages["advisories"]
+            self.advisories = {
+                "table": pd.read_parquet(os.path.join(path, "advisories.parquet")),
+                "flood": pd.read_parquet(os.path.join(path, "flood.parquet")),
+                "soil_period": tuple(info["soil_period"]) if info.get("soil_period") else None,
+                "flood_error": info.get("flood_error"),
+            }
+
+    def read_month(self, variable, year, month):
+        """Same shape as archive.read_month: one row per district, or None."""
+        df = self.zonal[(self.zonal["variable"] == variable) & (self.zonal["year"] == year)
+                        & (self.zonal["month"] == month)]
+        if df.empty:
+            return None
+        return df.sort_values("row").reset_index(drop=True)
+
+    def tile_url(self, name, year, month, ttl=None):
+        """Stored tile url while its map token is still valid, else None."""
+        from layers import MAP_TOKEN_TTL
+
+        layer = self.overlays.get((name, year, month))
+        if layer is None or time.time() - layer["created"] >= (ttl or MAP_TOKEN_TTL):
+            return None
+        return layer["url"]
+
+    def vis_params(self):
+        """{(overlay, year, month): vis} — valid for as long as the snapshot is."""
+        return {key: layer["vis"] for key, layer in self.overlays.items()}
+
+
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def get_snapshot(geom_hash=None, max_age=SNAPSHOT_MAX_AGE, root=SNAPSHOT_DIR):
+    """
+    Latest published snapshot for these geometries, or None if there is none
+    younger than `max_age`. Only the small LATEST pointer is read on each call;
+    a version is loaded from disk once per process.
+    """
+    try:
+        version = _read_json(os.path.join(root, "LATEST"))["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+    path = os.path.join(root, version)
+    manifest_path = os.path.join(path, "manifest.json")
+    with _lock:
+        try:
+            key = (path, os.path.getmtime(manifest_path))   # a resumed run republishes in place
+            snap = _snapshots.get(key)
+            if snap is None:
+                manifest = _read_json(manifest_path)
+                if manifest.get("schema") != SCHEMA or not manifest.get("published"):
+                    return None
+                _snapshots.clear()
+                snap = _snapshots[key] = Snapshot(path, manifest)
+        except (OSError, ValueError, KeyError):
+            return None
+    if geom_hash is not None and snap.manifest.get("geom_hash") != geom_hash:
+        return None
+    if time.time() - snap.generated > max_age:
+        return None
+    return snap
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the dashboard into a versioned snapshot")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="run (or resume) today's snapshot and publish it when complete")
+    run.add_argument("--version", default=None, help="snapshot directory name (default: today's date)")
+    run.add_argument("--stages", nargs="*", default=None, help=", ".join(SnapshotPipeline.STAGES))
+    run.add_argument("--force", nargs="*", default=[], help="re-run these stages even if done")
+    run.add_argument("--project", default=os.environ.get("GEE_PROJECT_ID"))
+    sub.add_parser("info", help="show the published snapshot and its stage timings")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        snap = get_snapshot(max_age=float("inf"))
+        if snap is None:
+            print("no published snapshot")
+            return
+        age = (time.time() - snap.generated) / 3600
+        print(f"{snap.version} (published {age:.1f} h ago)")
+        for stage, entry in snap.manifest["stages"].items():
+            print(f"  {stage:<12} {entry['status']:<7} {entry['seconds']:8.2f}s")
+            for layer in entry.get("failed", []):
+                print(f"    {layer['name']} {layer['year']}-{layer['month']:02d}: {layer['error']}")
+        return
+
+    from ee_cache import get_cache
+
+    def ee_available():
+        if not args.project:
+            return False
+        from bootstrap import init_ee
+        try:
+            init_ee(args.project)
+            return True
+        except Exception:
+            return False
+
+    pipeline = SnapshotPipeline(args.version, cache=get_cache(), ee_available=ee_available)
+    pipeline.run(args.stages, set(args.force))
+    # --stages may run a subset; publish only once every stage is done
+    if pipeline.complete():
+        pipeline.publish()
+        print(f"published {pipeline.version} -> {pipeline.path}")
+    else:
+        print(f"incomplete; re-run to resume {pipeline.version}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
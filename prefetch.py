@@ -0,0 +1,176 @@
+import datetime
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from layers import MAP_TOKEN_TTL
+
+# -----------------------------
+# Background Prefetch Scheduler
+# -----------------------------
+# Queue priorities, lower runs first. The visible request never queues: it runs
+# in the render thread via `fetch` and at most waits on an identical prefetch.
+NEIGHBOR, OTHER_OVERLAY = 1, 2
+MAX_QUEUE = 32
+WORKERS = 2
+PREFETCH_TTL = MAP_TOKEN_TTL   # seconds a prefetched key counts as warm; tile tokens expire after this
+
+
+class PrefetchScheduler:
+    """
+    Bounded priority heap + worker threads that warm caches for selections
+    the user is likely to make next.
+
+    Every call to `reschedule` bumps the owner's generation and drops queued
+    work for a selection the user has already left. Foreground requests go
+    through `fetch`, which waits for an in-flight prefetch of the same key
+    instead of duplicating it and counts prefetch hits/misses.
+
+    The heap is only touched under `_lock`, so purging, queueing and the
+    workers' pops cannot interleave.
+    """
+
+    def __init__(self, workers=WORKERS, max_queue=MAX_QUEUE, remember=512, ttl=PREFETCH_TTL):
+        self.stats = {"hits": 0, "misses": 0, "queued": 0, "completed": 0,
+                      "cancelled": 0, "dropped": 0, "deduped": 0, "failed": 0}
+        self._heap = []                 # (priority, seq, owner, generation, key, fn)
+        self._max_queue = max_queue
+        self._seq = itertools.count()
+        self._generation = {}
+        self._inflight = {}             # key -> threading.Event
+        self._prefetched = OrderedDict()  # key -> completion time
+        self._remember = remember
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        for _ in range(workers):
+            threading.Thread(target=self._worker, daemon=True).start()
+
+    def reschedule(self, tasks, owner="default"):
+        """Replace `owner`'s pending prefetches with [(priority, key, fn), ...]."""
+        with self._lock:
+            generation = self._generation.get(owner, 0) + 1
+            self._generation[owner] = generation
+            self._purge_stale()
+            for priority, key, fn in sorted(tasks, key=lambda t: t[0]):
+                if self._warm(key) or key in self._inflight:
+                    self.stats["deduped"] += 1
+                    continue
+                if len(self._heap) >= self._max_queue:
+                    self.stats["dropped"] += 1
+                    continue
+                heapq.heappush(self._heap, (priority, next(self._seq), owner, generation, key, fn))
+                self.stats["queued"] += 1
+            self._ready.notify_all()
+
+    def _warm(self, key):
+        """True if `key` was prefetched less than `ttl` ago; older entries are forgotten. Caller holds _lock."""
+        done = self._prefetched.get(key)
+        if done is not None and time.monotonic() - done >= self._ttl:
+            del self._prefetched[key]
+            done = None
+        return done is not None
+
+    def _purge_stale(self):
+        """Drop queued work of superseded generations so it frees queue slots now. Caller holds _lock."""
+        keep = [item for item in self._heap if item[3] == self._generation.get(item[2])]
+        self.stats["cancelled"] += len(self._heap) - len(keep)
+        heapq.heapify(keep)
+        self._heap = keep
+
+    def fetch(self, key, fn):
+        """Foreground request: reuse a running prefetch of `key`, then call `fn`."""
+        with self._lock:
+            event = self._inflight.get(key)
+        if event is not None:
+            event.wait()
+        with self._lock:
+            hit = self._warm(key)
+            self.stats["hits" if hit else "misses"] += 1
+        return fn()
+
+    def hit_rate(self):
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    def metrics(self):
+        with self._lock:
+            pending = len(self._heap)
+        return {**self.stats, "hit_rate": self.hit_rate(), "pending": pending}
+
+    def _bump(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _worker(self):
+        while True:
+            with self._ready:
+                while not self._heap:
+                    self._ready.wait()
+                priority, _, owner, generation, key, fn = heapq.heappop(self._heap)
+                stale = generation != self._generation.get(owner)
+                busy = key in self._inflight or self._warm(key)
+                if stale:
+                    self.stats["cancelled"] += 1
+                elif busy:
+                    self.stats["deduped"] += 1
+                else:
+                    event = self._inflight[key] = threading.Event()
+            if stale or busy:
+                continue
+            try:
+                fn()
+                with self._lock:
+                    self._prefetched[key] = time.monotonic()
+                    self._prefetched.move_to_end(key)
+                    while len(self._prefetched) > self._remember:
+                        self._prefetched.popitem(last=False)
+                    self.stats["completed"] += 1
+            except Exception:
+                self._bump("failed")
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                event.set()
+
+
+def neighbor_months(year, month, today=None):
+    """Previous and next (year, month), skipping months in the future."""
+    today = today or datetime.date.today()
+    prev = (year - 1, 12) if month == 1 else (year, month - 1)
+    nxt = (year + 1, 1) if month == 12 else (year, month + 1)
+    return [p for p in (prev, nxt) if datetime.date(p[0], p[1], 1) <= today]
+
+
+def selection_tasks(year, month, overlays_on, all_overlays, tile_url, district_stats=None):
+    """
+    Prefetch plan for a selection: tiles for the enabled overlays in the
+    neighbouring months, the other overlays for this month, and district
+    stats for the neighbouring months.
+    """
+    tasks = []
+    for y, m in neighbor_months(year, month):
+        for name in overlays_on:
+            tasks.append((NEIGHBOR, ("tile", name, y, m), lambda n=name, y=y, m=m: tile_url(n, y, m)))
+        if district_stats is not None:
+            tasks.append((NEIGHBOR, ("stats", y, m), lambda y=y, m=m: district_stats(y, m)))
+    for name in all_overlays:
+        if name not in overlays_on:
+            tasks.append((OTHER_OVERLAY, ("tile", name, year, month),
+                          lambda n=name: tile_url(n, year, month)))
+    return tasks
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler attached to the app process."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrefetchScheduler()
+    return _scheduler
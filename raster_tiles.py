@@ -0,0 +1,378 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from basemap_tiles import STATIC_DIR, TILE_SIZE, TILE_URL_PREFIX, lonlat_to_pixel
+from ee_cache import CACHE_DIR, CURRENT_PERIOD_TTL, month_range, period_is_closed
+from instrument import record_cache, span
+from outbound import ee_call
+
+# -----------------------------
+# Local Overlay Rasters (Earth Engine fallback)
+# -----------------------------
+# Each overlay month is downloaded once as a float32 grid over the Sindh
+# bounding box (memory-mapped .npy plus a JSON sidecar with its bounds and
+# vis params). PNG tiles are colourized from that array with the same
+# min/max stretch and palette interpolation EE applies, rendered across
+# threads and written under static/, so the overlay still shows when
+# Earth Engine is slow or out of quota.
+RASTER_DIR = os.path.join(CACHE_DIR, "rasters")
+TILE_ROOT = os.path.join(STATIC_DIR, "tiles", "overlays")
+URL_PREFIX = f"{TILE_URL_PREFIX}/overlays"
+MIN_ZOOM, MAX_ZOOM = 6, 10     # NDVI is 250–500 m; zoom 10 is ~150 m per pixel over Sindh
+DEFAULT_SCALE = 10000          # m; ERA5-Land soil moisture has no "scale" in OVERLAYS
+NODATA = -9999.0               # outside the clip geometry
+LUT_SIZE = 255                 # palette entries; index 255 is transparent (indexed PNG)
+TRANSPARENT = 255
+M_PER_DEGREE = 111320.0
+
+
+def raster_key(name, year, month, geom_hash):
+    return f"{name}-{year}-{month:02d}-{geom_hash[:12]}"
+
+
+def _paths(key, root=RASTER_DIR):
+    return os.path.join(root, f"{key}.npy"), os.path.join(root, f"{key}.json")
+
+
+def local_vis(values, palette):
+    """dynamic_vis computed on the downloaded grid: 5th–95th percentile of valid pixels."""
+    valid = values[np.isfinite(values) & (values != NODATA)]
+    if valid.size == 0:
+        return {"min": 0, "max": 1, "palette": palette}
+    lo, hi = np.percentile(valid, [5, 95]).tolist()
+    if lo == hi:
+        lo, hi = 0, 1
+    return {"min": lo, "max": hi, "palette": palette}
+
+
+def download_raster(name, year, month, geom, geom_hash, bounds, registry=None, overlays=None,
+                    root=RASTER_DIR, backend=None):
+    """
+    Fetch one overlay month as a float32 array over `bounds` (west, south,
+    east, north) with computePixels and store it under `root`. Vis params
+    come from `registry` when given (the same ones the EE tiles use).
+    """
+    from ee_stats import ee_backend
+    from layers import OVERLAYS
+
+    ee = ee_backend(backend)
+    spec = (overlays or OVERLAYS)[name]
+    west, south, east, north = [float(b) for b in bounds]
+    res = spec.get("scale", DEFAULT_SCALE) / M_PER_DEGREE
+    width, height = math.ceil((east - west) / res), math.ceil((north - south) / res)
+
+    image = spec["build"](year, month, geom, backend)
+    request = {
+        "expression": image.select(spec["band"]).toFloat().unmask(NODATA),
+        "fileFormat": "NUMPY_NDARRAY",
+        "grid": {
+            "dimensions": {"width": width, "height": height},
+            "affineTransform": {"scaleX": res, "shearX": 0, "translateX": west,
+                                "shearY": 0, "scaleY": -res, "translateY": north},
+            "crsCode": "EPSG:4326",
+        },
+    }
+    with span("ee.computePixels", layer=name):
+        data = ee_call(lambda: ee.data.computePixels(request),
+                       key=("computePixels", geom_hash, name, year, month))
+    values = np.asarray(data[data.dtype.names[0]] if data.dtype.names else data, dtype=np.float32)
+    values[values == NODATA] = np.nan
+
+    if registry is not None:
+        vis = registry.vis_params(name, year, month, image)
+    elif "vis" in spec:
+        vis = spec["vis"]
+    else:
+        vis = local_vis(values, spec["palette"])
+
+    key = raster_key(name, year, month, geom_hash)
+    array_path, meta_path = _paths(key, root)
+    os.makedirs(root, exist_ok=True)
+    with open(array_path + ".tmp", "wb") as f:
+        np.save(f, values)
+    os.replace(array_path + ".tmp", array_path)
+    meta = {"key": key, "name": name, "year": year, "month": month,
+            "bounds": [west, north - height * res, west + width * res, north],
+            "shape": list(values.shape), "vis": vis, "created": time.time()}
+    with open(meta_path + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(meta_path + ".tmp", meta_path)
+    return meta
+
+
+def load_raster(name, year, month, geom_hash, root=RASTER_DIR):
+    """(meta, memory-mapped array) of a downloaded overlay month, or None."""
+    array_path, meta_path = _paths(raster_key(name, year, month, geom_hash), root)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return meta, np.load(array_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+
+def raster_fresh(name, year, month, geom_hash, root=RASTER_DIR, ttl=CURRENT_PERIOD_TTL):
+    """True if the month is cached and either closed or downloaded less than `ttl` ago."""
+    loaded = load_raster(name, year, month, geom_hash, root)
+    if loaded is None:
+        return False
+    return period_is_closed(month_range(year, month)[1]) or time.time() - loaded[0]["created"] < ttl
+
+
+# -----------------------------
+# Palette + tile rendering
+# -----------------------------
+def _rgb(color):
+    """EE palette entry (CSS name or hex, with or without '#') as an RGB tuple."""
+    from PIL import ImageColor
+
+    if not color.startswith("#") and len(color) in (3, 6) and all(c in "0123456789abcdefABCDEF" for c in color):
+        color = "#" + color
+    return ImageColor.getrgb(color)[:3]
+
+
+def palette_lut(palette, size=LUT_SIZE):
+    """(size, 3) uint8 RGB table; colours are evenly spaced and linearly blended, as in EE."""
+    stops = np.array([_rgb(c) for c in palette], dtype=float)
+    pos = np.linspace(0, 1, len(stops))
+    t = np.linspace(0, 1, size)
+    return np.stack([np.round(np.interp(t, pos, stops[:, c])) for c in range(3)], axis=1).astype(np.uint8)
+
+
+def color_index(values, vis, size=LUT_SIZE):
+    """
+    Palette index of every value stretched over vis min/max (clamped, as EE
+    does); NaN maps to TRANSPARENT. One byte per pixel, so tiles are written
+    as indexed PNGs.
+    """
+    lo, hi = float(vis["min"]), float(vis["max"])
+    valid = np.isfinite(values)
+    scaled = (np.where(valid, values, lo) - lo) * ((size - 1) / ((hi - lo) or 1.0)) + 0.5
+    idx = np.clip(scaled, 0, size - 1).astype(np.uint8)
+    idx[~valid] = TRANSPARENT
+    return idx
+
+
+def tile_range(bounds, zoom):
+    """Inclusive x and y tile index ranges covering (west, south, east, north)."""
+    west, south, east, north = bounds
+    x0, y0 = lonlat_to_pixel(west, north, zoom)
+    x1, y1 = lonlat_to_pixel(east, south, zoom)
+    return (range(int(x0) // TILE_SIZE, int(x1) // TILE_SIZE + 1),
+            range(int(y0) // TILE_SIZE, int(y1) // TILE_SIZE + 1))
+
+
+def tile_values(values, bounds, zoom, tx, ty):
+    """Nearest-neighbour sample of the lon/lat grid at every pixel centre of a Web Mercator tile."""
+    west, south, east, north = bounds
+    height, width = values.shape
+    scale = TILE_SIZE * 2 ** zoom
+    px = (tx * TILE_SIZE + np.arange(TILE_SIZE) + 0.5) / scale
+    py = (ty * TILE_SIZE + np.arange(TILE_SIZE) + 0.5) / scale
+    lon = px * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * py))))
+    col = np.floor((lon - west) / (east - west) * width).astype(np.intp)
+    row = np.floor((north - lat) / (north - south) * height).astype(np.intp)
+    ok_col = (col >= 0) & (col < width)
+    ok_row = (row >= 0) & (row < height)
+    out = np.full((TILE_SIZE, TILE_SIZE), np.nan, dtype=np.float32)
+    out[np.ix_(ok_row, ok_col)] = values[np.ix_(row[ok_row], col[ok_col])]
+    return out
+
+
+_worker_arrays = {}   # array path -> memmap, shared by the render threads
+
+
+def _render_tile(job):
+    """Worker: render one tile to disk; False when it is fully transparent."""
+    array_path, bounds, vis, lut, out_dir, zoom, tx, ty = job
+    values = _worker_arrays.get(array_path)
+    if values is None:
+        values = _worker_arrays[array_path] = np.load(array_path, mmap_mode="r")
+    idx = color_index(tile_values(values, bounds, zoom, tx, ty), vis, len(lut))
+    if (idx == TRANSPARENT).all():
+        return False
+    from PIL import Image
+
+    img = Image.fromarray(idx, "P")
+    img.putpalette(lut.ravel().tolist() + [0, 0, 0])
+    path = os.path.join(out_dir, str(zoom), str(tx))
+    os.makedirs(path, exist_ok=True)
+    target = os.path.join(path, f"{ty}.png")
+    img.save(target + ".tmp", format="PNG", transparency=TRANSPARENT)
+    os.replace(target + ".tmp", target)
+    return True
+
+
+def _version(meta, min_zoom, max_zoom):
+    vis = json.dumps([meta["vis"], meta["created"], min_zoom, max_zoom], sort_keys=True)
+    return f"{meta['key']}-{hashlib.sha256(vis.encode()).hexdigest()[:8]}"
+
+
+def render_tiles(name, year, month, geom_hash, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, workers=None,
+                 root=RASTER_DIR, tile_root=TILE_ROOT):
+    """
+    Render the pyramid of a downloaded overlay month into
+    <tile_root>/<version>/{z}/{x}/{y}.png, in parallel. A finished pyramid is
+    reused; an interrupted one resumes. Returns (version, tiles) or None if
+    the raster has not been downloaded.
+    """
+    loaded = load_raster(name, year, month, geom_hash, root)
+    if loaded is None:
+        return None
+    meta, values = loaded
+    version = _version(meta, min_zoom, max_zoom)
+    out_dir = os.path.join(tile_root, version)
+    done_path = os.path.join(out_dir, "done.json")
+    if os.path.exists(done_path):
+        record_cache("raster_tiles", "hit")
+        with open(done_path) as f:
+            return version, json.load(f)["tiles"]
+    record_cache("raster_tiles", "miss")
+
+    array_path = _paths(meta["key"], root)[0]
+    lut = palette_lut(meta["vis"]["palette"])
+    jobs = []
+    for zoom in range(min_zoom, max_zoom + 1):
+        xs, ys = tile_range(meta["bounds"], zoom)
+        jobs += [(array_path, meta["bounds"], meta["vis"], lut, out_dir, zoom, tx, ty)
+                 for tx in xs for ty in ys
+                 if not os.path.exists(os.path.join(out_dir, str(zoom), str(tx), f"{ty}.png"))]
+    with span("raster_tiles.render", layer=name, tiles=len(jobs)):
+        # Threads, not processes: this runs inside the multi-threaded app server,
+        # where a forked child can deadlock on a lock held by another thread.
+        # The numpy colouring and the PNG encode release the GIL.
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(jobs) < 2 * workers:
+            list(map(_render_tile, jobs))
+        else:
+            with ThreadPoolExecutor(workers, thread_name_prefix="raster-tiles") as pool:
+                list(pool.map(_render_tile, jobs))
+
+    tiles = sum(len(files) for _, _, files in os.walk(out_dir))
+    with open(done_path, "w") as f:
+        json.dump({"tiles": tiles, "zoom": [min_zoom, max_zoom], "finished": time.time()}, f)
+    # older renders of the same month (vis or raster changed) are dropped
+    if os.path.isdir(tile_root):
+        for old in os.listdir(tile_root):
+            if old.startswith(meta["key"] + "-") and old != version:
+                shutil.rmtree(os.path.join(tile_root, old), ignore_errors=True)
+    return version, tiles
+
+
+_render_lock = threading.Lock()
+
+
+def tile_url(name, year, month, geom_hash, render=True, ttl=None, root=RASTER_DIR, tile_root=TILE_ROOT):
+    """
+    Leaflet url template of the locally rendered overlay, rendering it first
+    if only the raster is cached (and `render`). With `ttl`, an open month
+    downloaded longer ago than that is ignored, as ee_cache expires it.
+    None if nothing (fresh enough) is cached.
+    """
+    loaded = load_raster(name, year, month, geom_hash, root)
+    if loaded is None:
+        return None
+    if (ttl is not None and not period_is_closed(month_range(year, month)[1])
+            and time.time() - loaded[0]["created"] >= ttl):
+        return None
+    version = _version(loaded[0], MIN_ZOOM, MAX_ZOOM)
+    if not os.path.exists(os.path.join(tile_root, version, "done.json")):
+        if not render:
+            return None
+        with _render_lock:
+            rendered = render_tiles(name, year, month, geom_hash, root=root, tile_root=tile_root)
+        if rendered is None:
+            return None
+        version = rendered[0]
+    return f"{URL_PREFIX}/{version}/{{z}}/{{x}}/{{y}}.png"
+
+
+# -----------------------------
+# CLI: fetch rasters (needs EE) / render tiles (offline) / timing check
+# -----------------------------
+def synthetic_raster(name, year, month, geom_hash, bounds, vis, res=0.005, root=RASTER_DIR, seed=0):
+    """Smooth random field over `bounds`, stored like a downloaded raster (for the benchmark)."""
+    west, south, east, north = bounds
+    width, height = math.ceil((east - west) / res), math.ceil((north - south) / res)
+    lon = np.linspace(west, east, width)[None, :]
+    lat = np.linspace(north, south, height)[:, None]
+    rng = np.random.default_rng(seed)
+    field = 0.5 + 0.25 * (np.sin(3 * lon) * np.cos(4 * lat)) + rng.normal(0, 0.05, (height, width))
+    values = (vis["min"] + field.clip(0, 1) * (vis["max"] - vis["min"])).astype(np.float32)
+    values[: height // 10] = np.nan
+    key = raster_key(name, year, month, geom_hash)
+    array_path, meta_path = _paths(key, root)
+    os.makedirs(root, exist_ok=True)
+    np.save(array_path, values)
+    meta = {"key": key, "name": name, "year": year, "month": month, "bounds": list(bounds),
+            "shape": [height, width], "vis": vis, "created": time.time()}
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def main(argv=None):
+    import datetime
+
+    parser = argparse.ArgumentParser(description="Local overlay rasters and tiles (Earth Engine fallback)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fetch = sub.add_parser("fetch", help="download overlay rasters and render their tiles")
+    fetch.add_argument("--year", type=int, default=datetime.date.today().year)
+    fetch.add_argument("--month", type=int, default=datetime.date.today().month)
+    fetch.add_argument("--layers", nargs="*", default=None)
+    fetch.add_argument("--project", default=os.environ.get("GEE_PROJECT_ID"))
+    bench = sub.add_parser("bench", help="render a synthetic NDVI-sized raster with 1..N workers")
+    bench.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        import tempfile
+
+        from benchmark import SINDH_BOUNDS
+
+        vis = {"min": 1200, "max": 6800, "palette": ["brown", "yellow", "green"]}
+        for workers in args.workers:
+            work = tempfile.mkdtemp()
+            synthetic_raster("ndvi", 2025, 7, "bench", SINDH_BOUNDS, vis, root=work)
+            t0 = time.perf_counter()
+            _, tiles = render_tiles("ndvi", 2025, 7, "bench", workers=workers, root=work,
+                                    tile_root=os.path.join(work, "tiles"))
+            cold = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            render_tiles("ndvi", 2025, 7, "bench", workers=workers, root=work,
+                         tile_root=os.path.join(work, "tiles"))
+            print(f"{workers:>3} workers: {tiles} tiles in {cold:.2f}s, cached {1000 * (time.perf_counter() - t0):.1f} ms")
+            shutil.rmtree(work, ignore_errors=True)
+        return
+
+    from bootstrap import ee_geometry, init_ee, load_geometries
+    from ee_cache import geometry_hash, get_cache
+    from layers import OVERLAYS, get_registry
+
+    init_ee(args.project)
+    geometries = load_geometries()
+    geom_hash = geometry_hash(geometries["sindh"])
+    geom = ee_geometry(geom_hash, geometries["sindh_union"])
+    registry = get_registry(geom, geom_hash, cache=get_cache())
+    for name in args.layers or OVERLAYS:
+        t0 = time.perf_counter()
+        meta = download_raster(name, args.year, args.month, geom, geom_hash,
+                               geometries["sindh"].total_bounds, registry=registry)
+        t1 = time.perf_counter()
+        version, tiles = render_tiles(name, args.year, args.month, geom_hash)
+        print(f"{name}: {meta['shape'][1]}x{meta['shape'][0]} px in {t1 - t0:.1f}s, "
+              f"{tiles} tiles in {time.perf_counter() - t1:.1f}s -> {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,145 +1,167 @@
 import streamlit as st
-import geopandas as gpd
 import folium
 from streamlit_folium import st_folium
-import requests
 import pandas as pd
 import datetime
-import numpy as np
-import plotly.express as px
-import ee
 import calendar as calender
+from bootstrap import ee_geometry, init_ee, lazy_module, load_geometries
+from forecast import cached_forecasts
+from forecast_store import get_forecast_store
+from units import get_unit_index, grid_forecasts
+from details import clicked_unit, district_detail, get_detail_cache
+from core import district_advisories
+from ee_stats import district_ndvi
+from ee_cache import CURRENT_PERIOD_TTL, get_cache, geometry_hash
+from layers import OVERLAYS, get_registry
+from prefetch import get_scheduler as get_prefetcher, selection_tasks
+from climatology import district_anomaly
+from archive import read_history, read_month as read_archived_month
+from pipeline import get_snapshot
+from ndvi_series import HISTORY_START, get_store as get_ndvi_store, last_year_range, smooth_and_normalize
+from chart_data import history_figure
+from outbound import SERVICES, get_service
+from instrument import finish_render, prometheus_text, section, span, start_render, to_jsonl, totals as span_totals
+from geo_layers import SINDH_PATH, RIVER_PATH, MAX_PAYLOAD_BYTES, districts_geojson, fit_budget
+from basemap_tiles import MAX_ZOOM as BASEMAP_MAX_ZOOM, tile_url as basemap_tile_url
+from raster_tiles import MAX_ZOOM as RASTER_MAX_ZOOM, URL_PREFIX as RASTER_URL_PREFIX, tile_url as raster_tile_url
+from advisory import (
+    CROP_WATER_REQUIREMENT, FLOOD_THRESHOLD, ranked_alerts, sowing_status,
+)
+
+# Heavy modules are imported on first use, not on every script start
+ee = lazy_module("ee")
+px = lazy_module("plotly.express")
+
+# Per-render timing: sections below are checkpoints, external calls are spans
+start_render()
+
+def session_id():
+    """Id of the current browser session (prefetch work is cancelled per session)."""
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx().session_id
+    except Exception:
+        return "default"
 
 # -----------------------------
 # 0. Setup Earth Engine (GEE)
 # -----------------------------
+section("0. Setup Earth Engine (GEE)")
 PROJECT_ID = st.secrets["GEE_PROJECT_ID"]
-try:
-    ee.Initialize(project=PROJECT_ID)
-except Exception as e:
-    st.error(f"GEE init failed: {e}")
-    st.stop()
+ee_error_shown = False
+
+
+def ee_ready():
+    """Initialize Earth Engine the first time an EE-backed panel needs it (once per process)."""
+    global ee_error_shown
+    try:
+        init_ee(PROJECT_ID)
+        return True
+    except Exception as e:
+        if not ee_error_shown:
+            st.error(f"GEE init failed: {e}")
+            ee_error_shown = True
+        return False
 
 # -----------------------------
 # 1. Load Sindh GeoJSON + Indus River
 # -----------------------------
-SINDH_PATH = sindh_with_indus_sea.geojson"
-RIVER_PATH = Indus River Shapefiles (1)" 
-
-sindh_gdf = gpd.read_file(SINDH_PATH)
-
-try:
-    river_gdf = gpd.read_file(RIVER_PATH)
-except:
-    river_gdf = None
+section("1. Load Sindh GeoJSON + Indus River")
+# Parsed once per process from a GeoParquet/WKB cache of the bundled files
+geometries = load_geometries(SINDH_PATH, RIVER_PATH)
+sindh_gdf = geometries["sindh"]
+river_gdf = geometries["river"]
 
 st.title("Sindh Weather, Crops & Flood Dashboard 🌾🌧️🔥")
 
 # -----------------------------
 # 2. District Name Fix Mapping
 # -----------------------------
+section("2. District Name Fix Mapping")
+# Only spellings the boundary file does not carry itself (its name and
+# variant-name columns are matched automatically, ignoring case and spaces)
 DISTRICT_NAME_MAP = {
-    "Nawabshah": "Shaheed Benazirabad",
-    "Thatta": "Thatta",
-    "Jacobabad": "Jacobabad",
-    "Sukkur": "Sukkur",
-    "Larkana": "Larkana",
-    "Badin": "Badin",
-    "Mirpurkhas": "Mirpur Khas",
-    "Hyderabad": "Hyderabad",
-    "Karachi": "Karachi",
-    "Shikarpur": "Shikarpur",
-    "Kashmore": "Kashmore",
-    "Umerkot": "Umarkot",
-    "Sanghar": "Sanghar"
+    "Mirpurkhas": "Mirphurkhas",
+    "Jacobabad": "Jakobabad",
 }
 
 # -----------------------------
 # 3. Sidebar Options
 # -----------------------------
+section("3. Sidebar Options")
 st.sidebar.header("Controls")
 selected_crop = st.sidebar.selectbox("Select Crop", ["Wheat", "Rice", "Cotton", "Sugarcane"])
 year = st.sidebar.selectbox("Select Year", list(range(2020, datetime.date.today().year + 1)))
 month = st.sidebar.slider("Month", 1, 12, datetime.date.today().month)
+show_timings = st.sidebar.checkbox("🐞 Debug timings", value=False)
 
 # -----------------------------
 # Sowing Season Advisory
 # -----------------------------
-SOWING_WINDOWS = {
-    "Wheat": [11, 12],       # Nov-Dec
-    "Rice": [6, 7],          # Jun-Jul
-    "Cotton": [4, 5],        # Apr-May
-    "Sugarcane": [2, 3]      # Feb-Mar
-}
-
+section("Sowing Season Advisory")
 current_month = datetime.date.today().month
 current_year = datetime.date.today().year
-sowing_months = SOWING_WINDOWS[selected_crop]
+sowing = sowing_status(selected_crop)
 
-if current_month in sowing_months:
+if sowing["in_season"]:
     sowing_message = (f"This month({calender.month_name[current_month]} {current_year}) "
     f"is suitabe for sowing **{selected_crop}**." 
     )
+elif sowing["next_year"] == current_year:
+    sowing_message = f"⚠ Not sowing season now. Next sowing for **{selected_crop}** in: {calender.month_name[sowing['next_month']]} {current_year}."
 else:
-    # Find next available sowing month
-    future_months = [m for m in sowing_months if m > current_month]
-    if future_months:
-        next_month = future_months[0]
-        sowing_message = f"⚠ Not sowing season now. Next sowing for **{selected_crop}** in: {calender.month_name[next_month]} {current_year}."
-    else:
-        next_month = sowing_months[0]
-        sowing_message = f"❌ Not sowing season now. Next sowing for **{selected_crop}** will be in: {calender.month_name[next_month]} {current_year}."
+    sowing_message = f"❌ Not sowing season now. Next sowing for **{selected_crop}** will be in: {calender.month_name[sowing['next_month']]} {sowing['next_year']}."
 
 st.sidebar.markdown(f"### 🌱 Sowing Advisory\n{sowing_message}")
 
 # -----------------------------
 # 4. Locations Dictionary
 # -----------------------------
-locations = {
-    "Karachi": (24.8607, 67.0011),
-    "Hyderabad": (25.3960, 68.3578),
-    "Sukkur": (27.7139, 68.8356),
-    "Larkana": (27.5600, 68.2264),
-    "Thatta": (24.7466, 67.9235),
-    "Nawabshah": (26.2483, 68.4096),
-    "Mirpurkhas": (25.5251, 69.0159),
-    "Badin": (24.6550, 68.8370),
-    "Jacobabad": (28.2819, 68.4370),
-    "Shikarpur": (27.9556, 68.6382),
-    "Kashmore": (28.4329, 69.5814),
-    "Umerkot": (25.3610, 69.7360),
-    "Sanghar": (26.0469, 68.9492)
-}
+section("4. Locations Dictionary")
+# Points, spatial index and forecast grid derived from the finest unit level
+# in the boundary file; built once per process
+unit_index = get_unit_index(sindh_gdf, aliases=DISTRICT_NAME_MAP)
+UNIT_COL = unit_index.name_col
+sindh_geom_hash = geometry_hash(sindh_gdf)
+
+# Daily precomputed snapshot (python pipeline.py run); anything it does not
+# hold, or a snapshot older than a day, falls back to live computation
+snapshot = get_snapshot(sindh_geom_hash)
+if snapshot is not None:
+    st.sidebar.caption(f"📦 Snapshot {snapshot.version} "
+                       f"({datetime.datetime.fromtimestamp(snapshot.generated):%H:%M})")
 
 # -----------------------------
 # 5. Weather Forecast API
 # -----------------------------
-def fetch_forecast(lat, lon):
-    url = (
-        f"https://api.open-meteo.com/v1/forecast?"
-        f"latitude={lat}&longitude={lon}"
-        f"&daily=temperature_2m_max,temperature_2m_min,"
-        f"precipitation_sum,windspeed_10m_max"
-        f"&forecast_days=7&timezone=auto"
-    )
-    r = requests.get(url, timeout=30)
-    return r.json() if r.status_code == 200 else {}
+section("5. Weather Forecast API")
+# One batched Open-Meteo request over the deduplicated grid cells (units in
+# the same cell share a forecast), cached process-wide with an hourly TTL
+if snapshot is not None and snapshot.forecasts:
+    forecasts = snapshot.forecasts
+else:
+    forecasts = grid_forecasts(unit_index, cached_forecasts)
 
 # -----------------------------
 # 6. FAO Yield Data (for Popups & Charts)
 # -----------------------------
+section("6. FAO Yield Data (for Popups & Charts)")
 FAO_YIELD = {
     "Wheat": {"Thatta": 2.5, "Nawabshah": 3.0, "Sukkur": 2.8},
     "Rice": {"Thatta": 3.5, "Badin": 3.0, "Larkana": 3.8},
     "Cotton": {"Mirpurkhas": 2.2, "Hyderabad": 2.5, "Nawabshah": 2.3},
     "Sugarcane": {"Badin": 60, "Thatta": 65, "Sanghar": 70, "Nawabshah": 68}
 }
+# Same yields keyed by the unit names used on the map
+UNIT_YIELD = {crop: {unit_index.resolve(d) or d: y for d, y in yields.items()}
+              for crop, yields in FAO_YIELD.items()}
 
 # -----------------------------
 # 8. Map Setup (Locked to Sindh)
 # -----------------------------
+section("8. Map Setup (Locked to Sindh)")
 bounds = sindh_gdf.total_bounds
-sindh_geom = ee.Geometry(sindh_gdf.geometry.unary_union.__geo_interface__)  # clip NDVI/SMAP/Flood
+ee_cache = get_cache()  # on-disk cache of EE numbers; closed months never re-queried
 
 m = folium.Map(
     location=[25.5, 68.5],
@@ -175,42 +197,53 @@ show_ndvi = st.sidebar.checkbox("🌿 Show NDVI Vegetation", value=True)
 show_smap = st.sidebar.checkbox("💧 Show Soil Moisture (SMAP)", value=False)
 show_flood = st.sidebar.checkbox("🌊 Show Flood Anomaly", value=False)
 
-# --- Helper: dynamic scaling ---
-def dynamic_vis(image, band, geom, palette, scale=1000):
-    """Compute dynamic min/max (5–95th percentile) for better visualization."""
-    stats = image.select(band).reduceRegion(
-        reducer=ee.Reducer.percentile([5, 95]),
-        geometry=geom,
-        scale=scale,
-        maxPixels=1e9
-    ).getInfo()
-
-    if not stats:
-        return {"min": 0, "max": 1, "palette": palette}
-
-    values = list(stats.values())
-    band_min, band_max = values[0], values[1]
-    if band_min == band_max:
-        band_min, band_max = 0, 1
-
-    return {"min": band_min, "max": band_max, "palette": palette}
+prefetcher = get_prefetcher()
+
+# Vis params and tile urls are memoized per (overlay, year, month) across reruns.
+# Earth Engine is only initialized once an overlay is switched on that the
+# snapshot has no valid tile url for.
+def layer_registry():
+    sindh_geom = ee_geometry(sindh_geom_hash, geometries["sindh_union"])  # clip NDVI/SMAP/Flood
+    registry = get_registry(sindh_geom, sindh_geom_hash, cache=ee_cache)
+    if snapshot is not None:
+        registry.preload_vis(snapshot.vis_params())
+    return registry
+
+
+# Overlays rendered locally from cached rasters (pipeline "rasters" stage or
+# python raster_tiles.py fetch) are used as soon as their tiles are on disk, and
+# rendered on demand when Earth Engine cannot hand out a tile url
+def overlay_url(name):
+    url = snapshot.tile_url(name, year, month) if snapshot is not None else None
+    if url is None:
+        # tiles of an open month go stale like its EE results do
+        url = raster_tile_url(name, year, month, sindh_geom_hash, render=False, ttl=CURRENT_PERIOD_TTL)
+    if url is None and ee_ready():
+        try:
+            url = prefetcher.fetch(("tile", name, year, month),
+                                   lambda: layer_registry().tile_url(name, year, month))
+        except Exception as e:
+            st.sidebar.warning(f"Earth Engine tiles for {name} unavailable: {type(e).__name__}")
+    if url is None:
+        url = raster_tile_url(name, year, month, sindh_geom_hash)
+    return url
+
+
+def native_zoom(url):
+    """Local tiles stop at RASTER_MAX_ZOOM; Leaflet upscales them beyond it."""
+    return RASTER_MAX_ZOOM if url.startswith(RASTER_URL_PREFIX) else None
+
+
+overlay_urls = {name: overlay_url(name) for name, on in
+                [("ndvi", show_ndvi), ("soil_moisture", show_smap), ("flood_anomaly", show_flood)] if on}
+show_ndvi, show_smap, show_flood = (overlay_urls.get(name) is not None
+                                    for name in ("ndvi", "soil_moisture", "flood_anomaly"))
 
 # --- NDVI Vegetation ---
 if show_ndvi:
-    start = ee.Date.fromYMD(year, month, 1)
-    end = start.advance(1, "month")
-    ndvi = (
-        ee.ImageCollection("MODIS/061/MOD13Q1")
-        .filterDate(start, end)
-        .select("NDVI")
-        .mean()
-        .clip(sindh_geom)
-    )
-    ndvi_vis = dynamic_vis(ndvi, "NDVI", sindh_geom, ["brown", "yellow", "green"], scale=500)
-    ndvi_layer = ndvi.visualize(**ndvi_vis)
-
     folium.TileLayer(
-        tiles=ndvi_layer.getMapId()["tile_fetcher"].url_format,
+        tiles=overlay_urls["ndvi"],
+        max_native_zoom=native_zoom(overlay_urls["ndvi"]),
         name="🌱 NDVI Vegetation",
         attr="MODIS NDVI",
         overlay=True,
@@ -220,33 +253,9 @@ if show_ndvi:
 
 # --- Soil Moisture (ERA5-Land) Layer ---
 if show_smap:
-    def get_era5_soilmoisture(year, month, _geom):
-        """Returns mean ERA5-Land volumetric soil water for top layer (0–7 cm) in the given month."""
-        start = ee.Date.fromYMD(year, month, 1)
-        end = start.advance(1, "month")
-
-        sm = (
-            ee.ImageCollection("ECMWF/ERA5_LAND/MONTHLY")
-            .filterDate(start, end)
-            .select("volumetric_soil_water_layer_1")  # Top 0–7 cm
-            .mean()
-            .clip(_geom)
-        )
-        return sm
-
-    sm_layer = get_era5_soilmoisture(year, month, sindh_geom)
-
-    vis_params = {
-        "min": 0.05,  # drier soil
-        "max": 0.45,  # saturated soil
-        "palette": ["brown", "yellow", "green", "blue"]
-    }
-
-    ee_layer = sm_layer.visualize(**vis_params)
-    layer_name = "Soil Moisture (ERA5, 0–7 cm)"
-
     folium.TileLayer(
-        tiles=ee_layer.getMapId()["tile_fetcher"].url_format,
+        tiles=overlay_urls["soil_moisture"],
+        max_native_zoom=native_zoom(overlay_urls["soil_moisture"]),
         name="💧 Soil Moisture",
         attr="NASA SMAP",
         overlay=True,
@@ -256,20 +265,9 @@ if show_smap:
 
 # --- Flood Anomaly ---
 if show_flood:
-    dataset = ee.ImageCollection("ECMWF/ERA5_LAND/MONTHLY_AGGR").select("total_precipitation_sum")
-    start = ee.Date.fromYMD(year, month, 1)
-    end = start.advance(1, "month")
-
-    this_month = dataset.filterDate(start, end).mean()
-    baseline = dataset.filterDate("2001-01-01", "2020-12-31").mean()
-    anomaly = this_month.subtract(baseline).clip(sindh_geom)
-
-    flood_vis = dynamic_vis(anomaly, "total_precipitation_sum", sindh_geom,
-                            ["blue", "white", "red"], scale=10000)
-    flood_layer = anomaly.visualize(**flood_vis)
-
     folium.TileLayer(
-        tiles=flood_layer.getMapId()["tile_fetcher"].url_format,
+        tiles=overlay_urls["flood_anomaly"],
+        max_native_zoom=native_zoom(overlay_urls["flood_anomaly"]),
         name="🌊 Flood Anomaly",
         attr="ECMWF ERA5",
         overlay=True,
@@ -277,12 +275,48 @@ if show_flood:
         opacity=0.8
     ).add_to(m)
 
+# -----------------------------
+# 8c. Boundary layers: pre-rendered static tiles or simplified GeoJSON
+# -----------------------------
+use_static_tiles = st.sidebar.checkbox(
+    "🧱 Static boundary tiles", value=False,
+    help="Serve district/river boundaries as pre-built PNG tiles (python basemap_tiles.py). "
+         "District tooltips are not shown in this mode."
+)
+static_tiles = {}
+if use_static_tiles:
+    static_tiles = {name: url for name in ("districts", "river") if (url := basemap_tile_url(name))}
+    if not static_tiles:
+        st.sidebar.warning("No static tiles built yet — run `python basemap_tiles.py`.")
+
+for name, url in static_tiles.items():
+    folium.TileLayer(
+        tiles=url,
+        name="Districts" if name == "districts" else "Indus River",
+        attr="GADM boundaries" if name == "districts" else "Indus River",
+        overlay=True,
+        control=True,
+        max_native_zoom=BASEMAP_MAX_ZOOM
+    ).add_to(m)
+
+boundary_paths = [SINDH_PATH] if "districts" not in static_tiles else []
+if river_gdf is not None and "river" not in static_tiles:
+    boundary_paths.append(RIVER_PATH)
+
+boundary_layers = {}
+if boundary_paths:
+    boundary_layers, payload_report = fit_budget(boundary_paths, MAX_PAYLOAD_BYTES)
+    st.sidebar.caption(
+        f"🗺 Map geometry: {payload_report['bytes'] / 1024:.0f} KB "
+        f"(saved {payload_report['saved_bytes'] / 1024:.0f} KB, tolerance {payload_report['tolerance']:g}°)"
+    )
+
 # -----------------------------
 # 8d. Indus River
 # -----------------------------
-if river_gdf is not None:
+if RIVER_PATH in boundary_layers:
     folium.GeoJson(
-        river_gdf,
+        boundary_layers[RIVER_PATH],
         name="Indus River",
         style_function=lambda x: {"color": "blue", "weight": 2, "opacity": 0.8},
         tooltip="Indus River"
@@ -291,70 +325,38 @@ if river_gdf is not None:
 # -----------------------------
 # 9. District Polygons + Popups + Forecast Data
 # -----------------------------
-charts_data = []
-
-for idx, row in sindh_gdf.iterrows():
-    district_name = row.get("NAME_2", f"District-{idx}")
-    geom = ee.Geometry(row["geometry"].__geo_interface__)
-
-    # --- NDVI value ---
-    try:
-        ndvi_val = (
-            ee.ImageCollection("MODIS/061/MOD13Q1")
-            .filterDate(f"{year}-{month:02d}-01", f"{year}-{month:02d}-28")
-            .select("NDVI")
-            .mean()
-            .reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=geom,
-                scale=500,
-                maxPixels=1e9
-            )
-            .get("NDVI")
-            .getInfo()
-        )
-    except:
-        ndvi_val = None
-
-    # --- Popup text ---
-    popup_text = f"<b>{district_name}</b><br>"
-    if ndvi_val:
-        popup_text += f"🟢 Avg NDVI ({year}-{month}): {ndvi_val/10000:.2f}<br>"
-
-    if district_name in FAO_YIELD.get(selected_crop, {}):
-        popup_text += f"🌾 {selected_crop} Yield: {FAO_YIELD[selected_crop][district_name]} t/ha<br>"
-
-    # --- Forecast (from locations dictionary) ---
-    if district_name in locations:
-        lat, lon = locations[district_name]
-        forecast = fetch_forecast(lat, lon)
-        if forecast and "daily" in forecast:
-            fdata = forecast["daily"]
-            temps = fdata.get("temperature_2m_max", [])
-            rains = fdata.get("precipitation_sum", [])
-            if temps and rains:
-                popup_text += f"🌡 Avg Temp: {np.mean(temps):.1f} °C<br>"
-                popup_text += f"🌧 Rain (7d): {np.sum(rains):.1f} mm<br>"
-            charts_data.append({
-                "city": district_name,
-                "dates": fdata["time"],
-                "temp_max": temps,
-                "temp_min": fdata.get("temperature_2m_min", []),
-                "rain": rains
-            })
-
-    # --- Add polygon to map ---
+section("9. District Polygons + Popups + Forecast Data")
+# Boundaries only carry the unit name; NDVI, yield and forecast are loaded
+# for the clicked unit after the map is shown (see "District details")
+if SINDH_PATH in boundary_layers:
     folium.GeoJson(
-        data={"type": "Feature", "geometry": row["geometry"].__geo_interface__},
-        name=district_name,
+        data=districts_geojson(boundary_layers[SINDH_PATH], name_col=UNIT_COL),
+        name="Districts",
         style_function=lambda x: {"fillColor": "transparent", "color": "black", "weight": 1},
-        tooltip=popup_text
+        highlight_function=lambda x: {"weight": 3, "color": "#1565c0"},
+        tooltip=folium.GeoJsonTooltip(fields=["name"], labels=False)
     ).add_to(m)
 
-# -----------------------------
-# Popup Settings (handled in district loop below)
-# -----------------------------
-# (popup text is now built dynamically inside the district loop)
+
+def read_stored_month(variable, y, mo):
+    """Per-district values of one month from the snapshot, else the local archive."""
+    stored = snapshot.read_month(variable, y, mo) if snapshot is not None else None
+    return stored if stored is not None else read_archived_month(variable, y, mo, sindh_geom_hash, name_col=UNIT_COL)
+
+
+def month_ndvi(y, mo):
+    """
+    {gdf row: NDVI} of every unit for one month. Snapshot and archived months
+    are read from disk; otherwise one reduceRegions call covers all units.
+    """
+    archived = read_stored_month("ndvi", y, mo)
+    if archived is not None:
+        return dict(zip(archived["row"], archived["value"]))
+    if not ee_ready():
+        raise RuntimeError("Earth Engine unavailable")
+    ndvi_df = prefetcher.fetch(("stats", y, mo),
+                               lambda: district_ndvi(sindh_gdf, y, mo, name_col=UNIT_COL, cache=ee_cache))
+    return dict(zip(ndvi_df["row"], ndvi_df["NDVI"]))
 
 # -----------------------------
 # Add Legend for Overlays
@@ -421,36 +423,68 @@ add_legend(m, overlay_choice)
 # -----------------------------
 # 10. Show Map
 # -----------------------------
-st_map = st_folium(m, width=850, height=600)
+section("10. Show Map")
+with span("st_folium", kind="render"):
+    # Only clicks trigger a rerun; panning and zooming stay in the browser
+    st_map = st_folium(m, width=850, height=600,
+                       returned_objects=["last_clicked", "last_active_drawing"])
+
+# --- District details, computed for the clicked unit only (memoized per unit and month) ---
+section("District details")
+clicked = clicked_unit(st_map, unit_index)
+if clicked is None:
+    st.caption("👆 Click a district on the map for NDVI, yield and forecast details.")
+else:
+    clicked_name = unit_index.names[clicked]
+    detail = district_detail(unit_index, clicked, year, month, forecasts, month_ndvi,
+                             cache=get_detail_cache())
+    st.markdown(f"#### 📍 {clicked_name} — {calender.month_name[month]} {year}")
+    cols = st.columns(4)
+    cols[0].metric("🟢 Avg NDVI", "—" if detail.get("ndvi") is None else f"{detail['ndvi']:.2f}")
+    crop_yield = UNIT_YIELD.get(selected_crop, {}).get(clicked_name)
+    cols[1].metric(f"🌾 {selected_crop} Yield", "—" if crop_yield is None else f"{crop_yield} t/ha")
+    cols[2].metric("🌡 Avg Temp", "—" if "avg_temp_max" not in detail else f"{detail['avg_temp_max']:.1f} °C")
+    cols[3].metric("🌧 Rain (7d)", "—" if "rain_7d" not in detail else f"{detail['rain_7d']:.1f} mm")
+    if detail.get("error"):
+        st.caption(f"NDVI unavailable: {detail['error']}")
+
+# --- Warm caches for the selections users usually make next ---
+section("Prefetch")
+# Only when something on the page is EE-backed (an overlay switched on or a unit's
+# NDVI shown); otherwise a rerun must not initialize Earth Engine just to prefetch
+if (overlay_urls or clicked is not None) and ee_ready():
+    overlays_on = [name for name, url in overlay_urls.items() if url is not None]
+    prefetcher.reschedule(
+        selection_tasks(
+            year, month, overlays_on, list(OVERLAYS), layer_registry().tile_url,
+            district_stats=lambda y, m: district_ndvi(sindh_gdf, y, m, name_col=UNIT_COL, cache=ee_cache)
+        ),
+        owner=session_id()
+    )
+    prefetch_stats = prefetcher.metrics()
+    st.sidebar.caption(
+        f"⚡ Prefetch hit rate: {prefetch_stats['hit_rate']:.0%} "
+        f"({prefetch_stats['hits']}/{prefetch_stats['hits'] + prefetch_stats['misses']}), "
+        f"{prefetch_stats['pending']} queued"
+    )
 
 # -----------------------------
 # 11. Forecast Charts
 # -----------------------------
-# Prepare charts_data by fetching weather forecast for each district
-charts_data = []
-for city, (lat, lon) in locations.items():
-    forecast = fetch_forecast(lat, lon)
-    if "daily" in forecast:
-        daily = forecast["daily"]
-        charts_data.append({
-            "city": city,
-            "dates": daily.get("time", []),
-            "temp_max": daily.get("temperature_2m_max", []),
-            "temp_min": daily.get("temperature_2m_min", []),
-            "rain": daily.get("precipitation_sum", [])
-        })
-
-if charts_data:
-    st.subheader("📊 Forecast Charts (7-Day)")
-    selected_city = st.selectbox("Select District for Chart", [d["city"] for d in charts_data])
-    city_data = next(d for d in charts_data if d["city"] == selected_city)
+section("11. Forecast Charts")
+# One columnar store per forecast refresh: the district list comes from its
+# index and the chart frame is a view of the district's rows. Units are keyed
+# by gdf row (names can repeat) and shown by name
+forecast_store = get_forecast_store(forecasts, unit_index.names)
+chart_labels = {"temperature_2m_max": "Temp Max (°C)", "temperature_2m_min": "Temp Min (°C)",
+                "precipitation_sum": "Rain (mm)"}
 
-    df_chart = pd.DataFrame({
-        "Date": city_data["dates"],
-        "Temp Max (°C)": city_data["temp_max"],
-        "Temp Min (°C)": city_data["temp_min"],
-        "Rain (mm)": city_data["rain"]
-    }).dropna()
+if forecast_store.available():
+    st.subheader("📊 Forecast Charts (7-Day)")
+    selected_row = st.selectbox("Select District for Chart", forecast_store.available(),
+                                format_func=unit_index.names.__getitem__)
+    selected_city = unit_index.names[selected_row]
+    df_chart = forecast_store.frame(selected_row, chart_labels)[["Date", *chart_labels.values()]].dropna()
 
     fig = px.line(df_chart, x="Date", y=["Temp Max (°C)", "Temp Min (°C)", "Rain (mm)"],
                   markers=True, title=f"7-Day Forecast for {selected_city}")
@@ -458,34 +492,29 @@ if charts_data:
 # -----------------------------
 # 12. Irrigation Advisory
 # -----------------------------
-st.subheader("💧 Irrigation Advisory")
-
-# Simplified crop water requirement factors (mm/week)
-CROP_WATER_REQUIREMENT = {
-    "Wheat": 35,
-    "Rice": 50,
-    "Cotton": 40,
-    "Sugarcane": 55
-}
-
-if charts_data and selected_crop:
-    selected_city = st.selectbox("Select District for Advisory", [d["city"] for d in charts_data], key="advisory_city")
-    city_data = next(d for d in charts_data if d["city"] == selected_city)
+section("12. Irrigation Advisory")
+# Every district × crop advisory in one vectorized pass over the forecasts; flood
+# levels come from the gridded engine (forecast cells over the province, last
+# month's soil moisture, distance to the Indus) whenever it can run
+if snapshot is not None and snapshot.advisories is not None:
+    advisories = snapshot.advisories
+else:
+    advisories = district_advisories(unit_index, forecasts, sindh_gdf, river_gdf, sindh_geom_hash,
+                                     cache=ee_cache, ee_available=ee_ready)
+advisory_df, flood_df, soil_period = advisories["table"], advisories["flood"], advisories["soil_period"]
 
-    df_weather = pd.DataFrame({
-        "Date": city_data["dates"],
-        "Temp Max (°C)": city_data["temp_max"],
-        "Temp Min (°C)": city_data["temp_min"],
-        "Rain (mm)": city_data["rain"]
-    }).dropna()
+st.subheader("💧 Irrigation Advisory")
 
-    # Calculate weekly averages
-    avg_temp = df_weather["Temp Max (°C)"].mean()
-    total_rain = df_weather["Rain (mm)"].sum()
+if not advisory_df.empty and selected_crop:
+    selected_row = st.selectbox("Select District for Advisory", advisory_df["Row"].unique(),
+                                format_func=unit_index.names.__getitem__, key="advisory_city")
+    selected_city = unit_index.names[selected_row]
+    adv = advisory_df[(advisory_df["Row"] == selected_row) & (advisory_df["Crop"] == selected_crop)].iloc[0]
 
+    total_rain = adv["Rain 7d (mm)"]
     crop_need = CROP_WATER_REQUIREMENT[selected_crop]
 
-    if total_rain < crop_need:
+    if adv["Irrigation Needed"]:
         st.error(
             f"🚰 Irrigation Required in **{selected_city}** for {selected_crop}. "
             f"Weekly Rainfall = {total_rain:.1f} mm, Crop Need = {crop_need} mm."
@@ -499,38 +528,68 @@ if charts_data and selected_crop:
 # -----------------------------
 # 13. Flood Risk Advisory
 # -----------------------------
+section("13. Flood Risk Advisory")
 st.subheader("🌊 Flood Risk Advisory")
 
-if charts_data:
-    selected_city_flood = st.selectbox("Select District for Flood Risk Check", 
-                                       [d["city"] for d in charts_data], key="flood_city")
-    city_data_flood = next(d for d in charts_data if d["city"] == selected_city_flood)
-
-    df_flood = pd.DataFrame({
-        "Date": city_data_flood["dates"],
-        "Rain (mm)": city_data_flood["rain"]
-    }).dropna()
-
-    total_rain = df_flood["Rain (mm)"].sum()
-
-    # Threshold for flood risk (you can tune this value)
-    FLOOD_THRESHOLD = 70  # mm in 7 days
+if advisories["flood_error"]:
+    st.caption(f"Gridded flood risk unavailable, using 7-day district totals: {advisories['flood_error']}")
+
+if not advisory_df.empty:
+    selected_row_flood = st.selectbox("Select District for Flood Risk Check", advisory_df["Row"].unique(),
+                                      format_func=unit_index.names.__getitem__, key="flood_city")
+    selected_city_flood = unit_index.names[selected_row_flood]
+    adv_flood = advisory_df[advisory_df["Row"] == selected_row_flood].iloc[0]
+    total_rain = adv_flood["Rain 7d (mm)"]
+    if "Flood Score" in adv_flood and pd.notna(adv_flood["Flood Score"]):
+        cell = flood_df.set_index("Row").loc[selected_row_flood]
+        basis = (f"Flood score {cell['Flood Score']:.2f} (1.0 = threshold); wettest cell "
+                 f"{cell['Max Rain 7d (mm)']:.1f} mm in 7 days"
+                 + (f", soil moisture of {calender.month_abbr[soil_period[1]]} {soil_period[0]}"
+                    if soil_period else "") + ".")
+    else:
+        basis = f"7-day Rainfall = {total_rain:.1f} mm (Threshold = {FLOOD_THRESHOLD} mm)."
 
-    if total_rain > FLOOD_THRESHOLD:
+    if adv_flood["Flood Risk"] == "High":
         st.error(
-            f"⚠️ High Flood Risk in **{selected_city_flood}**. "
-            f"7-day Rainfall = {total_rain:.1f} mm (Threshold = {FLOOD_THRESHOLD} mm). "
+            f"⚠️ High Flood Risk in **{selected_city_flood}**. {basis} "
             f"Stay alert for possible waterlogging or flooding."
         )
+    elif adv_flood["Flood Risk"] == "Moderate":
+        st.warning(f"🌧 Moderate Flood Risk in **{selected_city_flood}**. {basis}")
     else:
-        st.success(
-            f"✅ Low Flood Risk in **{selected_city_flood}**. "
-            f"7-day Rainfall = {total_rain:.1f} mm."
+        st.success(f"✅ Low Flood Risk in **{selected_city_flood}**. {basis}")
+
+    if not flood_df.empty:
+        with st.expander("Gridded flood risk by district"):
+            st.dataframe(flood_df.sort_values("Flood Score", ascending=False).round(2),
+                         use_container_width=True)
+
+# -----------------------------
+# 13b. Province-wide Alerts
+# -----------------------------
+section("13b. Province-wide Alerts")
+if not advisory_df.empty:
+    st.subheader(f"🚨 Province-wide Alerts - {selected_crop}")
+    st.dataframe(ranked_alerts(advisory_df, selected_crop).round(1), use_container_width=True)
+
+# --- District rainfall anomaly vs. same-month 2001–2020 baseline ---
+if show_flood:
+    try:
+        archived_rain = read_stored_month("precipitation", year, month)
+        anomaly_df = district_anomaly(
+            sindh_gdf, year, month, name_col=UNIT_COL, cache=ee_cache,
+            rain_mm=None if archived_rain is None else archived_rain["value"].values
         )
+        st.markdown(f"**Rainfall anomaly by district — {calender.month_name[month]} {year}** "
+                    f"(vs. {calender.month_name[month]} 2001–2020 mean)")
+        st.dataframe(anomaly_df.round(1), use_container_width=True)
+    except Exception as e:
+        st.warning(f"Rainfall anomaly table unavailable: {e}")
 
 # -----------------------------
 # FAO Yield Chart
 # -----------------------------
+section("FAO Yield Chart")
 if selected_crop:
     st.subheader(f"🌾 FAO Crop Yield Data for {selected_crop}")
     crop_dict = FAO_YIELD.get(selected_crop, {})
@@ -544,71 +603,91 @@ if selected_crop:
 # -----------------------------
 #  NDVI Growth Trend (12 months)
 # -----------------------------
+section("NDVI Growth Trend (12 months)")
 st.subheader(f"🌱 NDVI Growth Trend - {selected_crop}")
 
-if selected_crop:
-    ndvi_trends = []
-    today = ee.Date(datetime.date.today().strftime("%Y-%m-%d"))
-    one_year_ago = today.advance(-1, "year")
-
-    for district, yield_val in FAO_YIELD.get(selected_crop, {}).items():
-        row = sindh_gdf[sindh_gdf["NAME_2"] == district]
-        if row.empty:
-            continue
-        geom = ee.Geometry(row.iloc[0]["geometry"].__geo_interface__)
-
-        dataset = (
-            ee.ImageCollection("MODIS/061/MOD13Q1")
-            .filterDate(one_year_ago, today)
-            .select("NDVI")
+if selected_crop and ee_ready():
+    # One EE job for every crop district; only new 16-day composites are fetched on later runs
+    trend_rows = [row for row, name in enumerate(unit_index.names) if name in UNIT_YIELD.get(selected_crop, {})]
+    trend_start, trend_end = last_year_range()
+    try:
+        ndvi_long = get_ndvi_store().get(sindh_gdf, trend_rows, trend_start, trend_end, name_col=UNIT_COL)
+    except Exception as e:
+        st.warning(f"NDVI trend unavailable: {e}")
+        ndvi_long = pd.DataFrame()
+
+    if not ndvi_long.empty:
+        # All crop districts in one figure; pick districts from the legend
+        ndvi_trends = smooth_and_normalize(ndvi_long)
+        ndvi_trends["district"] = [unit_index.labels[r] for r in ndvi_trends["row"]]
+        fig_ndvi = history_figure(
+            ndvi_trends, "date", "NDVI_Normalized",
+            title=f"NDVI Growth Trend (Normalized) - {selected_crop}",
+            labels={"NDVI_Normalized": "Normalized NDVI (0–1)", "date": "Date", "district": "District"}
         )
-
-        def extract_ndvi(img):
-            mean_dict = img.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=geom,
-                scale=500,
-                maxPixels=1e9
-            )
-            return ee.Feature(
-                None,
-                {
-                    "date": img.date().format("YYYY-MM-dd"),
-                    "NDVI": mean_dict.get("NDVI")
-                }
-            )
-
-        ndvi_fc = dataset.map(extract_ndvi)
-        ndvi_data = ndvi_fc.getInfo()
-
-        dates, values = [], []
-        for f in ndvi_data["features"]:
-            if f["properties"]["NDVI"] is not None:
-                dates.append(f["properties"]["date"])
-                values.append(f["properties"]["NDVI"] / 10000)
-
-        if dates:
-            df = pd.DataFrame({"Date": pd.to_datetime(dates), "NDVI": values})
-            df = df.sort_values("Date")
-
-            # Apply rolling mean smoothing (3 periods)
-            df["NDVI_Smoothed"] = df["NDVI"].rolling(window=3, min_periods=1).mean()
-
-            # Normalize NDVI between 0–1 for better comparison
-            df["NDVI_Normalized"] = (df["NDVI_Smoothed"] - df["NDVI_Smoothed"].min()) / (
-                df["NDVI_Smoothed"].max() - df["NDVI_Smoothed"].min()
-            )
-
-            ndvi_trends.append({"district": district, "df": df})
-
-    if ndvi_trends:
-        for ndvi in ndvi_trends:
-            df_ndvi = ndvi["df"]
-
-            fig_ndvi = px.area(
-                df_ndvi, x="Date", y="NDVI_Normalized",
-                title=f"NDVI Growth Trend (Normalized) - {ndvi['district']} ({selected_crop})",
-                labels={"NDVI_Normalized": "Normalized NDVI (0–1)"}
-            )
-            fig_ndvi.update_traces(line_color="green", fill="tozeroy")
-            st.plotly_chart(fig_ndvi, use_container_width=True)
+        st.plotly_chart(fig_ndvi, use_container_width=True)
+
+# -----------------------------
+#  Long-range History (2001–present)
+# -----------------------------
+section("Long-range History")
+st.subheader("📈 NDVI & Rainfall History")
+# Only the selected period is loaded (NDVI composites the store lacks are fetched
+# in chunks) and every trace is downsampled to the chart width, so the payload
+# stays the same size whether the period is one year or twenty-five
+history_var = st.radio("Series", ["NDVI (16-day)", "Rainfall (monthly)"], horizontal=True,
+                       key="history_var")
+today = datetime.date.today()
+history_period = st.slider("Period", min_value=HISTORY_START, max_value=today,
+                           value=(today - datetime.timedelta(days=3 * 365), today), format="YYYY-MM",
+                           key="history_period")
+# Units are picked by gdf row (names can repeat) and shown by their unique label
+crop_rows = [row for row, name in enumerate(unit_index.names) if name in UNIT_YIELD.get(selected_crop, {})]
+history_rows = st.multiselect("Districts", list(range(len(unit_index))),
+                              default=crop_rows[:4] or list(range(min(4, len(unit_index)))),
+                              format_func=unit_index.labels.__getitem__, key="history_districts")
+
+history_long, history_y = pd.DataFrame(), None
+if history_rows and history_var.startswith("NDVI"):
+    if ee_ready():
+        try:
+            history_long = get_ndvi_store().get(sindh_gdf, history_rows, *history_period, name_col=UNIT_COL)
+            history_y, history_label = "NDVI", "NDVI"
+        except Exception as e:
+            st.warning(f"NDVI history unavailable: {e}")
+elif history_rows:
+    # Archive rows are gdf rows of the same geometries, so join on the row index
+    rain = read_history("precipitation", sindh_geom_hash, history_period[0].year, history_period[1].year,
+                        name_col=UNIT_COL)
+    history_long = rain[rain["row"].isin(history_rows)
+                        & (rain["date"] >= pd.Timestamp(history_period[0]))
+                        & (rain["date"] < pd.Timestamp(history_period[1]))]
+    history_y, history_label = "value", "Rainfall (mm/month)"
+    if history_long.empty:
+        st.caption("No archived rainfall for this period — run `python archive.py ingest`.")
+
+if not history_long.empty:
+    history_long = history_long.assign(district=[unit_index.labels[r] for r in history_long["row"]])
+    st.plotly_chart(history_figure(
+        history_long, "date", history_y,
+        title=f"{history_var} {history_period[0]:%Y-%m} – {history_period[1]:%Y-%m}",
+        labels={history_y: history_label, "date": "Date", "district": "District"}
+    ), use_container_width=True)
+
+# -----------------------------
+# Debug: per-render timings
+# -----------------------------
+render_spans = finish_render()
+if show_timings:
+    st.subheader("🐞 Render Timings")
+    df_spans = pd.DataFrame([sp.as_dict() for sp in render_spans])
+    st.dataframe(df_spans[["name", "kind", "seconds", "bytes", "cache"]], use_container_width=True)
+    st.caption("Outbound calls per service (since process start)")
+    st.dataframe(pd.DataFrame({name: get_service(name).metrics() for name in SERVICES}).T,
+                 use_container_width=True)
+    st.caption("Span totals (since process start)")
+    st.dataframe(pd.DataFrame(span_totals()).T, use_container_width=True)
+    st.download_button("Download spans (JSONL)", to_jsonl(render_spans),
+                       file_name="render_spans.jsonl", mime="application/x-ndjson")
+    st.download_button("Download metrics (Prometheus)", prometheus_text(),
+                       file_name="metrics.prom", mime="text/plain")
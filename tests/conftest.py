@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The app is a flat set of modules at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import outbound  # noqa: E402
+from benchmark import StubForecastServer  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_services():
+    """Every test gets new outbound services (breaker closed, no last good values) that never sleep."""
+    outbound._services.clear()
+    for name in outbound.SERVICES:
+        outbound.get_service(name).sleep = lambda seconds: None
+    yield
+    outbound._services.clear()
+
+
+@pytest.fixture
+def stub():
+    with StubForecastServer(latency=0) as server:
+        yield server
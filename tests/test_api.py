@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from api import AdvisoryAPI
+
+
+class RecordingService:
+    """Advisory service that records which thread served each lookup."""
+
+    stats = {}
+
+    def __init__(self):
+        self.threads = []
+
+    def advisories_json(self, crop, district):
+        self.threads.append(threading.current_thread().name)
+        return b'{"ok": true}'
+
+
+async def exchange(api, request):
+    server = await asyncio.start_server(api.handle, "127.0.0.1", 0)
+    async with server:
+        reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+        writer.write(request)
+        await writer.drain()
+        status = (await reader.readline()).split()[1]
+        writer.close()
+    return int(status)
+
+
+def get(content_length=None):
+    head = "GET /health HTTP/1.1\r\nHost: x\r\n"
+    if content_length is not None:
+        head += f"Content-Length: {content_length}\r\n"
+    return (head + "Connection: close\r\n\r\n").encode()
+
+
+@pytest.mark.parametrize("value", ["abc", "-5", "1.5", "²", str(10 ** 9)])
+def test_bad_content_length_is_rejected(value):
+    api = AdvisoryAPI(SimpleNamespace(stats={}))
+    assert asyncio.run(exchange(api, get(value))) == 400
+    assert api.stats["errors"] == 0
+
+
+@pytest.mark.parametrize("value", [None, "0", ""])
+def test_bodyless_get_is_served(value):
+    assert asyncio.run(exchange(AdvisoryAPI(SimpleNamespace(stats={})), get(value))) == 200
+
+
+def test_request_body_is_read_and_discarded():
+    request = get(4).replace(b"\r\n\r\n", b"\r\n\r\nbody")
+    assert asyncio.run(exchange(AdvisoryAPI(SimpleNamespace(stats={})), request)) == 200
+
+
+def test_advisories_never_run_on_the_event_loop():
+    service = RecordingService()
+    api = AdvisoryAPI(service)
+    request = b"GET /advisories?crop=Rice HTTP/1.1\r\nConnection: close\r\n\r\n"
+    assert asyncio.run(exchange(api, request)) == 200
+    assert service.threads and all(name.startswith("advisory") for name in service.threads)
+
+
+def test_memo_is_keyed_by_canonical_district():
+    import pandas as pd
+
+    from core import AdvisoryService
+    from test_units import tehsils
+    from units import get_unit_index
+
+    service = AdvisoryService.__new__(AdvisoryService)
+    service.units = get_unit_index(tehsils())
+    service.ttl = 300
+    service.stats = {"snapshots": 0, "served": 0, "memo_hits": 0}
+    service._lock = threading.Lock()
+    service._responses = {}
+    service._snapshot = {"table": pd.DataFrame({"District": ["Keti Bandar"], "Crop": ["Rice"]}),
+                         "flood_error": None, "soil_period": None,
+                         "generated": "now", "built": float("inf")}
+    for spelling in ["Keti Bandar", "keti  bandar", "KETI BANDAR"]:
+        service.advisories_json(None, spelling)
+    assert len(service._responses) == 1 and service.stats["memo_hits"] == 2
+    with pytest.raises(LookupError):
+        service.advisories_json(None, "nowhere")
+    assert len(service._responses) == 1
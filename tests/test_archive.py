@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+import archive
+from test_units import tehsils
+
+
+def test_interrupted_ingest_keeps_fetched_months(tmp_path, monkeypatch):
+    gdf = tehsils()
+    calls = []
+
+    def district_means(gdf, collection, band, year, month, scale, name_col=None, fc=None, backend=None):
+        if len(calls) == 2:
+            raise RuntimeError("quota")
+        calls.append(month)
+        return pd.DataFrame({"row": range(len(gdf)), band: 1.0}, index=gdf[name_col].values)
+
+    monkeypatch.setattr(archive, "districts_fc", lambda gdf, name_col, backend=None: None)
+    monkeypatch.setattr(archive, "district_means", district_means)
+    with pytest.raises(RuntimeError):
+        archive.ingest(gdf, ["soil_moisture"], 2020, 2020, root=str(tmp_path), log=lambda line: None)
+
+    df = archive.read_year("soil_moisture", 2020, root=str(tmp_path))
+    assert sorted(set(df["month"])) == [1, 2] and len(df) == 2 * len(gdf)
+    assert archive.missing_months("soil_moisture", 2020, df["geom_hash"].iloc[0], str(tmp_path),
+                                  df["name_col"].iloc[0]) == list(range(3, 13))
@@ -0,0 +1,31 @@
+from details import DetailCache, clicked_unit, district_detail
+from test_units import tehsils
+from units import get_unit_index
+
+IN_DADU_MIRPUR = {"lat": 26.25, "lng": 67.25}
+IN_THATTA_MIRPUR = {"lat": 24.25, "lng": 67.75}
+
+
+def test_clicked_unit_prefers_the_clicked_position():
+    index = get_unit_index(tehsils())
+    stale_feature = {"properties": {"name": "Keti Bandar", "row": 2}}
+    assert clicked_unit({"last_clicked": IN_DADU_MIRPUR, "last_active_drawing": stale_feature}, index) == 0
+    outside = {"last_clicked": {"lat": 30.0, "lng": 70.0}, "last_active_drawing": stale_feature}
+    assert clicked_unit(outside, index) == 2
+    assert clicked_unit({"last_clicked": None, "last_active_drawing": None}, index) is None
+    assert clicked_unit(None, index) is None
+
+
+def test_duplicate_names_resolve_to_their_own_row():
+    index = get_unit_index(tehsils())
+    assert index.names[0] == index.names[1] == "Mirpur"
+    assert clicked_unit({"last_clicked": IN_THATTA_MIRPUR}, index) == 1
+
+    forecasts = {row: {"daily": {"temperature_2m_max": [10.0 * (row + 1)], "precipitation_sum": [row + 1.0]}}
+                 for row in range(3)}
+    cache = DetailCache()
+    details = [district_detail(index, row, 2025, 7, forecasts, lambda y, m: {0: 0.1, 1: 0.5, 2: 0.9},
+                               cache=cache) for row in (0, 1)]
+    assert details[0] == {"name": "Mirpur", "ndvi": 0.1, "avg_temp_max": 10.0, "rain_7d": 1.0}
+    assert details[1] == {"name": "Mirpur", "ndvi": 0.5, "avg_temp_max": 20.0, "rain_7d": 2.0}
+    assert cache.stats == {"hits": 0, "misses": 2}
@@ -0,0 +1,88 @@
+import pytest
+
+from benchmark import StubForecastServer, canned_forecast
+from forecast import FORECAST_DAYS, fetch_forecast, fetch_forecasts
+from outbound import OutboundError, RetryableStatus, StatusError, get_service
+
+LOCATIONS = {f"Unit-{i}": (24.0 + 0.5 * i, 67.0 + 0.25 * i) for i in range(6)}
+
+
+def test_batch_is_one_request(stub):
+    forecasts, timings = fetch_forecasts(LOCATIONS, url=stub.url)
+    assert stub.requests == 1
+    assert [t["request"] for t in timings] == ["batch"]
+    assert set(forecasts) == set(LOCATIONS)
+
+
+def test_batch_response_maps_back_by_position(stub):
+    forecasts, _ = fetch_forecasts(LOCATIONS, url=stub.url)
+    for name, (lat, lon) in LOCATIONS.items():
+        assert (forecasts[name]["latitude"], forecasts[name]["longitude"]) == (lat, lon)
+        assert forecasts[name] == canned_forecast(lat, lon, FORECAST_DAYS)
+
+
+def test_single_location_batch_unwraps_object(stub):
+    forecasts, _ = fetch_forecasts({"only": (25.0, 68.0)}, url=stub.url)
+    assert forecasts["only"]["latitude"] == 25.0
+
+
+def test_failed_batch_falls_back_to_single_requests():
+    with StubForecastServer(latency=0, batch_status=400) as stub:
+        forecasts, timings = fetch_forecasts(LOCATIONS, url=stub.url)
+        assert stub.requests == 1 + len(LOCATIONS)
+    assert sorted(t["request"] for t in timings[1:]) == sorted(LOCATIONS)
+    for name, (lat, lon) in LOCATIONS.items():
+        assert forecasts[name] == canned_forecast(lat, lon, FORECAST_DAYS)
+
+
+def test_fallback_leaves_failed_locations_empty():
+    with StubForecastServer(latency=0, error_rate=1.0, error_status=404) as stub:
+        forecasts, timings = fetch_forecasts(LOCATIONS, url=stub.url)
+    assert forecasts == {name: {} for name in LOCATIONS}
+    assert len(timings) == 1 + len(LOCATIONS)
+
+
+def test_empty_locations_make_no_request(stub):
+    assert fetch_forecasts({}, url=stub.url) == ({}, [])
+    assert stub.requests == 0
+
+
+def test_fetch_forecast_returns_payload(stub):
+    assert fetch_forecast(25.0, 68.0, url=stub.url) == canned_forecast(25.0, 68.0, FORECAST_DAYS)
+
+
+def test_fetch_forecast_raises_on_client_error():
+    with StubForecastServer(latency=0, error_rate=1.0, error_status=404) as stub:
+        with pytest.raises(StatusError) as info:
+            fetch_forecast(25.0, 68.0, url=stub.url)
+        assert stub.requests == 1
+    assert info.value.status == 404 and not isinstance(info.value, RetryableStatus)
+
+
+def test_fetch_forecast_raises_when_retries_run_out():
+    with StubForecastServer(latency=0, error_rate=1.0, error_status=503) as stub:
+        with pytest.raises(OutboundError):
+            fetch_forecast(25.0, 68.0, url=stub.url)
+
+
+def test_error_answers_are_never_served_as_last_good():
+    service = get_service("open-meteo")
+    with StubForecastServer(latency=0, error_rate=1.0, error_status=404) as stub:
+        with pytest.raises(StatusError):
+            fetch_forecast(25.0, 68.0, url=stub.url)
+        assert service.breaker.state == "closed" and not service._last_good
+
+        # upstream down afterwards: nothing to fall back to, so the outage surfaces
+        stub.error_status = 503
+        for _ in range(5):
+            with pytest.raises(OutboundError):
+                fetch_forecast(25.0, 68.0, url=stub.url)
+        assert service.breaker.state == "open" and service.stats["stale"] == 0
+
+
+def test_last_good_forecast_is_served_while_upstream_fails(stub):
+    good = fetch_forecast(25.0, 68.0, url=stub.url)
+    stub.error_rate = 1.0
+    for _ in range(6):
+        assert fetch_forecast(25.0, 68.0, url=stub.url) == good
+    assert get_service("open-meteo").breaker.state == "open"
@@ -0,0 +1,17 @@
+import time
+
+from instrument import finish_render, section, span, start_render, totals
+
+
+def test_sections_add_up_to_the_render_total():
+    start_render()
+    for name in ("a", "b", "c"):
+        section(name)
+        with span("upstream"):
+            time.sleep(0.01)
+    spans = finish_render()
+    sections = [sp for sp in spans if sp.kind == "section"]
+    total = next(sp for sp in spans if sp.kind == "render")
+    assert [sp.name for sp in sections] == ["a", "b", "c"]
+    assert abs(sum(sp.seconds for sp in sections) - total.seconds) < 0.005
+    assert totals()["upstream (external)"]["count"] >= 3
@@ -0,0 +1,64 @@
+import datetime
+
+import pandas as pd
+
+from ndvi_series import COMPOSITE_DAYS, NDVI_BAND, NDVISeriesStore, smooth_and_normalize
+from test_units import tehsils
+from units import get_unit_index
+
+START, END = datetime.date(2024, 1, 1), datetime.date(2024, 4, 1)
+
+
+class FakeFetch:
+    """Composites every 16 days with a per-row NDVI, recording what was asked for."""
+
+    def __init__(self, fail_after=None):
+        self.calls = []
+        self.fail_after = fail_after
+
+    def __call__(self, gdf, rows, start, end, backend=None):
+        if self.fail_after is not None and len(self.calls) >= self.fail_after:
+            raise RuntimeError("quota")
+        self.calls.append((tuple(rows), start, end))
+        dates = pd.date_range(start, end, freq=f"{COMPOSITE_DAYS}D", inclusive="left")
+        return pd.DataFrame([{"row": r, "date": d, NDVI_BAND: 0.1 * (r + 1)} for r in rows for d in dates])
+
+
+def test_duplicate_names_keep_separate_series(tmp_path):
+    gdf = tehsils()
+    store = NDVISeriesStore(path=str(tmp_path / "s.parquet"), fetch=FakeFetch())
+    df = store.get(gdf, [0, 1], START, END)
+    assert set(df["district"]) == {"Mirpur"}
+    assert df.groupby("row")[NDVI_BAND].mean().round(3).to_dict() == {0: 0.1, 1: 0.2}
+
+    labels = get_unit_index(gdf).labels
+    assert labels[:2] == ["Mirpur (Dadu)", "Mirpur (Thatta)"]
+    trends = smooth_and_normalize(df)
+    assert trends.groupby("row").size().to_dict() == {0: len(df) // 2, 1: len(df) // 2}
+
+
+def test_stored_rows_are_not_fetched_again(tmp_path):
+    fetch = FakeFetch()
+    store = NDVISeriesStore(path=str(tmp_path / "s.parquet"), fetch=fetch)
+    store.get(tehsils(), [0, 1], START, END)
+    again = NDVISeriesStore(path=str(tmp_path / "s.parquet"), fetch=fetch)
+    df = again.get(tehsils(), [1, 2], START, END)
+    assert fetch.calls[-1][0] == (2,)
+    assert df["row"].dtype == "int64" and sorted(df["row"].unique()) == [1, 2]
+
+
+def test_failed_chunk_keeps_the_chunks_fetched_before_it(tmp_path):
+    start, end = datetime.date(2016, 1, 1), datetime.date(2024, 1, 1)
+    path = str(tmp_path / "s.parquet")
+    store = NDVISeriesStore(path=path, fetch=FakeFetch(fail_after=1))
+    try:
+        store.get(tehsils(), [0], start, end)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("second chunk should have failed")
+
+    fetch = FakeFetch()
+    df = NDVISeriesStore(path=path, fetch=fetch).get(tehsils(), [0], start, end)
+    assert fetch.calls and all(lo > start for _, lo, _ in fetch.calls)
+    assert df["date"].min() == pd.Timestamp(start)
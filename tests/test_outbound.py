@@ -0,0 +1,163 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from benchmark import StubForecastServer
+from outbound import CircuitBreaker, CircuitOpen, RetryableStatus, Service, TokenBucket
+
+PARAMS = {"latitude": "25.0", "longitude": "68.0"}
+
+
+def make_service(**kwargs):
+    sleeps = []
+    kwargs.setdefault("breaker", CircuitBreaker(failures=3, reset=0.2))
+    service = Service("test", rate=1000, burst=1000, concurrency=8, sleep=sleeps.append, **kwargs)
+    return service, sleeps
+
+
+def get(stub, heal_after=None):
+    """One stub request as the forecast client makes it; optionally heal the stub after N failures."""
+    failures = [0]
+
+    def call():
+        r = requests.get(stub.url, params=PARAMS, timeout=5)
+        if r.status_code == 429 or r.status_code >= 500:
+            failures[0] += 1
+            if heal_after is not None and failures[0] >= heal_after:
+                stub.error_rate = 0.0
+            raise RetryableStatus(r.status_code, r.headers.get("Retry-After"))
+        r.raise_for_status()
+        return r.json()
+    return call
+
+
+@pytest.mark.parametrize("status", [429, 503])
+def test_retryable_status_is_retried_with_backoff(status):
+    service, sleeps = make_service()
+    with StubForecastServer(latency=0, error_rate=1.0, error_status=status) as stub:
+        result = service.call(None, get(stub, heal_after=2))
+        assert stub.requests == 3
+    assert result["latitude"] == 25.0
+    assert service.stats["retries"] == 2 and len(sleeps) == 2
+    assert service.breaker.state == "closed"
+
+
+def test_client_error_is_not_retried():
+    service, sleeps = make_service()
+    with StubForecastServer(latency=0, error_rate=1.0, error_status=404) as stub:
+        with pytest.raises(requests.HTTPError):
+            service.call(None, get(stub))
+        assert stub.requests == 1
+    assert sleeps == [] and service.breaker.state == "closed"
+
+
+def test_backoff_is_bounded_and_honours_retry_after():
+    service, _ = make_service(backoff=0.5, max_backoff=4.0)
+    for attempt in range(8):
+        assert 0 <= service.delay(attempt) <= min(4.0, 0.5 * 2 ** attempt)
+    assert service.delay(0, retry_after=3) >= 3
+    assert service.delay(0, retry_after=60) <= 4.0
+
+
+def test_identical_concurrent_calls_share_one_upstream_request():
+    service, _ = make_service()
+    callers = 10
+    barrier = threading.Barrier(callers)
+    results = []
+
+    with StubForecastServer(latency=0.3) as stub:
+        def one():
+            barrier.wait()
+            results.append(service.call(("forecast", 25.0, 68.0), get(stub)))
+
+        threads = [threading.Thread(target=one) for _ in range(callers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert stub.requests == 1
+    assert len(results) == callers and all(r == results[0] for r in results)
+    assert service.stats["coalesced"] == callers - 1
+
+
+def test_breaker_opens_after_failures_and_half_opens_after_cooldown():
+    service, _ = make_service(retries=0)
+    with StubForecastServer(latency=0, error_rate=1.0) as stub:
+        for _ in range(3):
+            with pytest.raises(RetryableStatus):
+                service.call(None, get(stub))
+        assert service.breaker.state == "open"
+
+        # open: rejected without reaching upstream
+        with pytest.raises(CircuitOpen):
+            service.call(None, get(stub))
+        assert stub.requests == 3 and service.stats["rejected"] == 1
+
+        # after the cooldown one trial call goes through; a failure re-opens
+        time.sleep(0.25)
+        with pytest.raises(RetryableStatus):
+            service.call(None, get(stub))
+        assert stub.requests == 4 and service.breaker.state == "open"
+
+        # and a successful trial closes it
+        time.sleep(0.25)
+        stub.error_rate = 0.0
+        assert service.call(None, get(stub))["latitude"] == 25.0
+        assert service.breaker.state == "closed"
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker(failures=1, reset=0.05)
+    breaker.record(False)
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == "half-open"
+    assert not breaker.allow()
+
+
+def test_last_good_value_is_served_while_upstream_fails():
+    service, _ = make_service(retries=1, breaker=CircuitBreaker(failures=3, reset=30))
+    key = ("forecast", 25.0, 68.0)
+    with StubForecastServer(latency=0) as stub:
+        good = service.call(key, get(stub))
+        stub.error_rate = 1.0
+
+        # failing upstream: retries run out, the last good value is returned
+        for _ in range(3):
+            assert service.call(key, get(stub)) == good
+        assert service.breaker.state == "open"
+
+        # open breaker: served without an upstream request
+        before = stub.requests
+        assert service.call(key, get(stub)) == good
+        assert stub.requests == before
+        assert service.stats["stale"] == 4
+
+        # a key that never succeeded has nothing to fall back to
+        with pytest.raises(CircuitOpen):
+            service.call(("forecast", 0.0, 0.0), get(stub))
+
+
+def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=50, burst=2)
+    t0 = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.perf_counter() - t0 >= 4 / 50 * 0.9
+
+
+def test_expired_last_good_value_is_not_served():
+    service, _ = make_service(retries=0, breaker=CircuitBreaker(failures=1, reset=30))
+    key = ("getMapId", "ndvi", 2025, 7)
+    assert service.call(key, lambda: {"token": "t1"}, max_age=0.05) == {"token": "t1"}
+
+    def down():
+        raise RetryableStatus(503)
+
+    # still fresh: the stored token is replayed while upstream fails
+    assert service.call(key, down, max_age=0.05) == {"token": "t1"}
+    time.sleep(0.06)
+    with pytest.raises(CircuitOpen):
+        service.call(key, down, max_age=0.05)
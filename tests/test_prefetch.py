@@ -0,0 +1,86 @@
+import threading
+import time
+
+from prefetch import NEIGHBOR, OTHER_OVERLAY, PrefetchScheduler
+
+
+def tasks(tag, n, fn=lambda: None):
+    return [(NEIGHBOR if i % 2 else OTHER_OVERLAY, (tag, i), fn) for i in range(n)]
+
+
+def test_queue_is_bounded_and_superseded_work_is_cancelled():
+    gate = threading.Event()
+    scheduler = PrefetchScheduler(workers=1, max_queue=4)
+    scheduler.reschedule([(NEIGHBOR, "block", gate.wait)])
+    time.sleep(0.05)                    # the worker is now busy on "block"
+
+    scheduler.reschedule(tasks("a", 6))
+    assert scheduler.metrics()["pending"] == 4 and scheduler.stats["dropped"] == 2
+    scheduler.reschedule(tasks("b", 3))
+    assert scheduler.metrics()["pending"] == 3 and scheduler.stats["cancelled"] == 4
+    gate.set()
+
+
+def test_concurrent_reschedules_never_overflow():
+    errors = []
+    scheduler = PrefetchScheduler(workers=2, max_queue=8)
+
+    def session(owner):
+        try:
+            for round_ in range(200):
+                scheduler.reschedule(tasks((owner, round_), 6), owner=owner)
+                assert scheduler.metrics()["pending"] <= 8
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=session, args=(f"s{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+
+    # every queued task is either run or cancelled once the workers drain the heap
+    deadline = time.time() + 5
+    stats = scheduler.stats
+    while stats["queued"] != stats["completed"] + stats["cancelled"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert stats["queued"] == stats["completed"] + stats["cancelled"]
+    assert scheduler.metrics()["pending"] == 0
+
+
+def wait_idle(scheduler, timeout=5):
+    deadline = time.time() + timeout
+    while (scheduler.metrics()["pending"] or scheduler._inflight) and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_prefetched_keys_expire_after_ttl():
+    calls = []
+    scheduler = PrefetchScheduler(workers=1, ttl=0.1)
+    task = [(NEIGHBOR, ("tile", "ndvi", 2025, 7), lambda: calls.append(1))]
+    scheduler.reschedule(task)
+    wait_idle(scheduler)
+    scheduler.reschedule(task)                  # still warm: not scheduled again
+    wait_idle(scheduler)
+    assert len(calls) == 1 and scheduler.stats["deduped"] == 1
+    assert scheduler.fetch(task[0][1], lambda: "url") == "url" and scheduler.stats["hits"] == 1
+
+    time.sleep(0.12)                            # token expired: a miss, and prefetched again
+    assert scheduler.fetch(task[0][1], lambda: "url") == "url" and scheduler.stats["misses"] == 1
+    scheduler.reschedule(task)
+    wait_idle(scheduler)
+    assert len(calls) == 2
+
+
+def test_duplicate_queued_work_is_counted():
+    gate = threading.Event()
+    scheduler = PrefetchScheduler(workers=1)
+    scheduler.reschedule([(NEIGHBOR, "block", gate.wait)], owner="a")
+    time.sleep(0.05)
+    # two sessions queue the same key; the second pop finds it prefetched
+    scheduler.reschedule([(NEIGHBOR, "k", lambda: None)], owner="b")
+    scheduler.reschedule([(NEIGHBOR, "k", lambda: None)], owner="c")
+    gate.set()
+    wait_idle(scheduler)
+    assert scheduler.stats["completed"] == 2 and scheduler.stats["deduped"] == 1
@@ -0,0 +1,44 @@
+import datetime
+import json
+import os
+import threading
+
+from raster_tiles import _paths, raster_key, render_tiles, synthetic_raster, tile_url
+
+BOUNDS = (67.0, 24.0, 68.0, 25.0)
+VIS = {"min": 0.0, "max": 1.0, "palette": ["brown", "yellow", "green"]}
+HASH = "0123456789abcdef"
+
+
+def age(root, name, year, month, seconds):
+    meta_path = _paths(raster_key(name, year, month, HASH), str(root))[1]
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta["created"] -= seconds
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+
+
+def test_render_uses_threads_not_forked_processes(tmp_path, monkeypatch):
+    synthetic_raster("ndvi", 2020, 1, HASH, BOUNDS, VIS, res=0.02, root=str(tmp_path / "r"))
+    monkeypatch.setattr(os, "fork", lambda: (_ for _ in ()).throw(AssertionError("forked")))
+    before = threading.active_count()
+    version, tiles = render_tiles("ndvi", 2020, 1, HASH, min_zoom=6, max_zoom=9, workers=2,
+                                  root=str(tmp_path / "r"), tile_root=str(tmp_path / "t"))
+    assert tiles > 0 and threading.active_count() == before
+
+
+def test_stale_open_month_tiles_are_not_served(tmp_path):
+    today = datetime.date.today()
+    roots = {"root": str(tmp_path / "r"), "tile_root": str(tmp_path / "t")}
+    for year, month in [(today.year, today.month), (2020, 1)]:
+        synthetic_raster("ndvi", year, month, HASH, BOUNDS, VIS, res=0.02, root=roots["root"])
+        assert tile_url("ndvi", year, month, HASH, **roots) is not None
+        age(tmp_path / "r", "ndvi", year, month, 7 * 3600)
+        tile_url("ndvi", year, month, HASH, **roots)           # re-render for the new created time
+
+    # the open month is past the TTL; the closed one never expires
+    assert tile_url("ndvi", today.year, today.month, HASH, render=False, ttl=6 * 3600, **roots) is None
+    assert tile_url("ndvi", 2020, 1, HASH, render=False, ttl=6 * 3600, **roots) is not None
+    # the last-resort fallback still serves the stale month
+    assert tile_url("ndvi", today.year, today.month, HASH, render=False, **roots) is not None
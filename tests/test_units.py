@@ -0,0 +1,49 @@
+import geopandas as gpd
+import pandas as pd
+from shapely.geometry import box
+
+from advisory import advisory_table, apply_grid_flood_risk, synthetic_forecasts
+from forecast_store import ForecastStore
+from units import get_unit_index, grid_forecasts
+
+
+def tehsils():
+    """Three tehsils, two of them sharing a name in different districts."""
+    return gpd.GeoDataFrame({
+        "NAME_2": ["Dadu", "Thatta", "Thatta"],
+        "NAME_3": ["Mirpur", "Mirpur", "Keti Bandar"],
+        "geometry": [box(67.0, 26.0, 67.5, 26.5), box(67.5, 24.0, 68.0, 24.5), box(67.0, 24.0, 67.5, 24.5)],
+    }, crs=4326)
+
+
+def test_duplicate_names_keep_separate_forecasts():
+    index = get_unit_index(tehsils())
+    fetched = synthetic_forecasts(len(index.cells))
+    by_cell = dict(zip(index.cells, fetched.values()))
+    forecasts = grid_forecasts(index, lambda cells: {cell: by_cell[cell] for cell in cells})
+    assert list(forecasts) == [0, 1, 2]
+    assert forecasts[0] is not forecasts[1]
+
+    store = ForecastStore(forecasts, names=index.names)
+    assert store.names == ["Mirpur", "Mirpur", "Keti Bandar"]
+    assert (store.series(0, "precipitation_sum") != store.series(1, "precipitation_sum")).any()
+
+
+def test_grid_flood_risk_is_matched_by_row():
+    index = get_unit_index(tehsils())
+    store = ForecastStore(synthetic_forecasts(3), names=None)
+    table = advisory_table(index.names, store.values, rows=[0, 1, 2])
+    flood = pd.DataFrame({"District": index.names, "Row": [0, 1, 2],
+                          "Flood Risk": ["Low", "High", "Low"], "Flood Score": [0.1, 1.5, 0.2]})
+    merged = apply_grid_flood_risk(table, flood)
+    assert merged.groupby("Row")["Flood Risk"].first().tolist() == ["Low", "High", "Low"]
+
+
+def test_index_cache_distinguishes_aliases():
+    gdf = tehsils()
+    plain = get_unit_index(gdf)
+    aliased = get_unit_index(gdf, aliases={"Ketibandar Port": "Keti Bandar"})
+    assert plain is not aliased
+    assert aliased.resolve("Ketibandar Port") == "Keti Bandar"
+    assert plain.resolve("Ketibandar Port") is None
+    assert get_unit_index(gdf, aliases={"Ketibandar Port": "Keti Bandar"}) is aliased
@@ -0,0 +1,155 @@
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+# -----------------------------
+# Administrative Units: centroids, spatial index, forecast grid
+# -----------------------------
+# Finest naming level present in the boundary file wins (tehsil, district, division)
+UNIT_COLUMNS = ("NAME_4", "NAME_3", "NAME_2")
+ALIAS_COLUMNS = ("VARNAME_4", "VARNAME_3")
+GRID_STEP = 0.1   # degrees; roughly the Open-Meteo model grid over Sindh
+
+
+def unit_column(gdf):
+    for col in UNIT_COLUMNS:
+        if col in gdf.columns and gdf[col].notna().all():
+            return col
+    raise KeyError(f"no unit name column among {UNIT_COLUMNS}")
+
+
+def normalize_name(name):
+    """'Nawab Shah' / 'Nawabshah' / 'nawab-shah' -> 'nawabshah'."""
+    return re.sub(r"[^a-z0-9]", "", str(name).lower())
+
+
+def interior_points(geoms):
+    """Centroid of every polygon, or a point on its surface where the centroid falls outside."""
+    import shapely
+
+    points = shapely.centroid(geoms)
+    outside = ~shapely.contains(geoms, points)
+    if outside.any():
+        points[outside] = shapely.point_on_surface(geoms[outside])
+    return points
+
+
+def snap_to_grid(lats, lons, step=GRID_STEP):
+    """Cell centre of each point on a regular lat/lon grid."""
+    lats = np.round(np.asarray(lats, dtype=float) / step) * step
+    lons = np.round(np.asarray(lons, dtype=float) / step) * step
+    return np.round(lats, 4), np.round(lons, 4)
+
+
+def unit_labels(gdf, name_col, names):
+    """Unit names made unique for legends and pickers: 'Mirpur (Thatta)' where a name repeats."""
+    counts = Counter(names)
+    coarser = UNIT_COLUMNS[UNIT_COLUMNS.index(name_col) + 1:] if name_col in UNIT_COLUMNS else ()
+    parents = next((gdf[col].astype(str).tolist() for col in coarser if col in gdf.columns), None)
+    labels = [name if counts[name] == 1 else f"{name} ({parents[row]})" if parents else f"{name} #{row}"
+              for row, name in enumerate(names)]
+    counts = Counter(labels)
+    return [label if counts[label] == 1 else f"{label} #{row}" for row, label in enumerate(labels)]
+
+
+class UnitIndex:
+    """
+    Point lookups and a deduplicated forecast grid for every polygon in `gdf`.
+
+    Built once per geometry set: representative points come from the
+    polygons themselves, an STRtree answers "which unit contains this point",
+    and units whose points snap to the same grid cell share one forecast.
+    """
+
+    def __init__(self, gdf, name_col=None, step=GRID_STEP, aliases=None):
+        import shapely
+
+        self.name_col = name_col or unit_column(gdf)
+        self.names = gdf[self.name_col].astype(str).tolist()
+        self.labels = unit_labels(gdf, self.name_col, self.names)
+        self.geoms = np.asarray(gdf.geometry.values)
+        self.tree = shapely.STRtree(self.geoms)
+
+        points = interior_points(self.geoms)
+        self.lats, self.lons = shapely.get_y(points), shapely.get_x(points)
+        cell_lats, cell_lons = snap_to_grid(self.lats, self.lons, step)
+        self.unit_cell = list(zip(cell_lats.tolist(), cell_lons.tolist()))
+        self.cells = list(dict.fromkeys(self.unit_cell))
+
+        # Any spelling found in the name/variant-name columns (plus explicit
+        # aliases for spellings that differ by more than spacing) -> unit name
+        self._by_alias = {}
+        for col in (self.name_col,) + ALIAS_COLUMNS:
+            if col in gdf.columns:
+                for name, alias in zip(self.names, gdf[col]):
+                    if isinstance(alias, str):
+                        for part in alias.split("|"):
+                            self._by_alias.setdefault(normalize_name(part), name)
+        for alias, name in (aliases or {}).items():
+            if normalize_name(name) in self._by_alias:
+                self._by_alias[normalize_name(alias)] = self._by_alias[normalize_name(name)]
+
+    def __len__(self):
+        return len(self.names)
+
+    def resolve(self, name):
+        """Unit name for any known spelling of it, or None."""
+        return self._by_alias.get(normalize_name(name))
+
+    def locations(self):
+        """{unit: (lat, lon)} of every unit's representative point."""
+        return {n: (lat, lon) for n, lat, lon in zip(self.names, self.lats.tolist(), self.lons.tolist())}
+
+    def grid_locations(self):
+        """{cell: (lat, lon)} — one forecast location per occupied grid cell."""
+        return {cell: cell for cell in self.cells}
+
+    def unit_forecasts(self, cell_forecasts):
+        """
+        Fan per-cell forecasts out to every unit in that cell, keyed by gdf
+        row: names repeat at the finer levels (two tehsils can share a name).
+        """
+        return {row: cell_forecasts.get(cell, {}) for row, cell in enumerate(self.unit_cell)}
+
+    def locate(self, lat, lon):
+        """Name of the unit containing (lat, lon), or None."""
+        import shapely
+
+        hits = self.tree.query(shapely.points(lon, lat), predicate="intersects")
+        return self.names[int(hits[0])] if len(hits) else None
+
+    def locate_rows(self, lats, lons):
+        """Row of the unit containing each point (-1 outside every unit), in one tree query."""
+        import shapely
+
+        rows = np.full(len(lats), -1, dtype=int)
+        point_idx, geom_idx = self.tree.query(shapely.points(lons, lats), predicate="intersects")
+        # reversed so the first matching unit wins where polygons touch
+        rows[point_idx[::-1]] = geom_idx[::-1]
+        return rows
+
+    def locate_many(self, lats, lons):
+        """Unit name (or None) for each point."""
+        return [self.names[r] if r >= 0 else None for r in self.locate_rows(lats, lons).tolist()]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_unit_index(gdf, name_col=None, step=GRID_STEP, aliases=None):
+    """Process-wide UnitIndex per geometry set, name column, grid step and aliases."""
+    from ee_cache import geometry_hash
+
+    key = (geometry_hash(gdf), name_col, step, frozenset((aliases or {}).items()))
+    with _lock:
+        if key not in _indexes:
+            _indexes[key] = UnitIndex(gdf, name_col, step, aliases)
+        return _indexes[key]
+
+
+def grid_forecasts(index, fetch):
+    """{gdf row: forecast} from one `fetch({cell: (lat, lon)})` over the deduplicated grid."""
+    return index.unit_forecasts(fetch(index.grid_locations()))